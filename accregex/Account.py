@@ -2,11 +2,14 @@ from .eprint import eprint
 
 import os
 import operator
-from gnucash import Session, GncNumeric, Split, GnuCashBackendException, ERR_BACKEND_LOCKED
-from datetime import datetime, date
-from accregex.AccountRule import AccountNotFoundException, get_most_urgent_priority_rule
-from decimal import Decimal
-from AccountUtil import gnc_numeric_to_python_Decimal
+from accregex.AccountRule import AccountNotFoundException
+from accregex.RuleSet import CompiledRuleSet, RulePlan
+from accregex.AccountIndex import AccountIndex
+from accregex.TransactionBatch import TransactionBatch
+from accregex.Stats import NO_STATS
+from accregex.SplitDateIndex import SplitDateIndex, SplitDateIndexCache, as_date, split_date
+from accregex.SplitSnapshot import SplitSnapshot
+from AccountUtil import gnc_numeric_sign
 
 
 #get the account from a colon separated account hierarchy
@@ -43,9 +46,39 @@ def get_account_fully_qualified_name(account, name = ""):
         #remove the last colon
         return new_name[:-1]
 
-def sessionForFile(input_file):
+#a read only session ignores (and doesn't take) the lock and can't be saved
+#backend is "gnucash" for the gnucash bindings, "xml" for XmlBackend or "sqlite" for SqliteBackend
+#which only load the transactions of the accounts named in source_accounts (if it isn't None)
+def sessionForFile(input_file, read_only=False, backend="gnucash", source_accounts=None):
+    if backend == "xml":
+        from .XmlBackend import XmlSession, XmlBookLockedException
+        try:
+            return XmlSession(input_file, read_only, source_accounts)
+        except XmlBookLockedException:
+            eprint("Cannot open %s, file is locked." % input_file)
+            raise
+    elif backend == "sqlite":
+        from .SqliteBackend import SqliteSession, SqliteBookLockedException
+        try:
+            return SqliteSession(input_file, read_only, source_accounts)
+        except SqliteBookLockedException:
+            eprint("Cannot open %s, file is locked." % input_file)
+            raise
+    elif backend != "gnucash":
+        raise ValueError("Unknown backend {}".format(backend))
+
+    #the gnucash bindings are only imported by the functions that need a live book
+    #so everything else here also works on other objects with the same interface
+    from gnucash import Session, GnuCashBackendException, ERR_BACKEND_LOCKED
     try:
-        return Session(os.path.abspath(input_file))
+        if not read_only:
+            return Session(os.path.abspath(input_file))
+        try:
+            #newer bindings have an explicit read only mode
+            from gnucash import SessionOpenMode
+            return Session(os.path.abspath(input_file), SessionOpenMode.SESSION_READ_ONLY)
+        except ImportError:
+            return Session(os.path.abspath(input_file), ignore_lock=True)
     except GnuCashBackendException, backend_exception:
         if ERR_BACKEND_LOCKED in backend_exception.errors:
             eprint("Cannot open %s, file is locked." % input_file)
@@ -53,16 +86,18 @@ def sessionForFile(input_file):
 
 #check that all dest and source accounts pointed to by the list of AccountRules are real
 #will throw an exception if any account in account_rules does not exist
-def check_accounts_exist(root_account, account_rules):
+def check_accounts_exist(root_account, account_rules, account_index=None):
+    if account_index is None:
+        account_index = AccountIndex(root_account)
+
     #exception formatting helper function
     def mk_account_exception(rule, which_account):
         return AccountNotFoundException("Invalid {} account found in rule: {} for rule {}" \
                     .format(which_account, getattr(rule, which_account), str(rule)))
 
+    #the index is keyed by fully qualified name so there's no need to check the name of what it returns
     def account_exists(rule, which_account):
-        account = get_account(root_account, getattr(rule, which_account))
-        return account is not None and \
-            get_account_fully_qualified_name(account) == getattr(rule, which_account)
+        return getattr(rule, which_account) in account_index
 
     #check every account in every rule (i.e. 2 accounts per rule)
     for this_rule in account_rules:
@@ -75,11 +110,16 @@ def check_accounts_exist(root_account, account_rules):
                 raise mk_account_exception(this_rule, which_account)
 
 #get the set of all source accounts in account_rules
-def get_source_account_set(root_account, account_rules):
+def get_source_account_set(root_account, account_rules, account_index=None):
+    if account_index is None:
+        account_index = AccountIndex(root_account)
+
     accounts = set()
 
     for this_rule in account_rules:
-        src_account = get_account(root_account, this_rule.src)
+        #the index always returns the same object for the same account
+        #so the set won't contain duplicates
+        src_account = account_index.lookup(this_rule.src)
         if src_account is None:
             eprint("Could not find account {}".format(this_rule.src))
             return None
@@ -92,43 +132,44 @@ def get_source_account_set(root_account, account_rules):
 
 #return splits based on the passed comparison function (INCLUSIVE)
 def _splits_comp_date(split_list, p_date, comparator):
+    p_date = as_date(p_date)
     matching_splits = []
     for this_split in split_list:
-        trans = this_split.parent
-        trans_date = date.fromtimestamp(trans.GetDate())
+        trans_date = split_date(this_split)
 
         if comparator(trans_date, p_date):
             matching_splits.append(this_split)
  
     return matching_splits
 
+#split_list can also be a SplitDateIndex, which answers with a binary search
 def splits_after_date(split_list, p_date):
+    if isinstance(split_list, SplitDateIndex):
+        return split_list.after(p_date)
     return _splits_comp_date(split_list, p_date, operator.ge)
 
 def splits_before_date(split_list, p_date):
+    if isinstance(split_list, SplitDateIndex):
+        return split_list.before(p_date)
     return _splits_comp_date(split_list, p_date, operator.le)
 
-#return only splits for which the comparator only its amount returns True
-def _splits_filter_amount(split_list, comparator):
-    matching_splits = []
-    for this_split in split_list:
-        split_amount = gnc_numeric_to_python_Decimal(this_split.GetAmount())
-
-        if comparator(split_amount):
-            matching_splits.append(this_split)
-
-    return matching_splits
-
-ZERO = Decimal(0)
+#the sign comes straight from the amount's numerator
+#so there's no need to convert every amount to a Decimal just to compare it with zero
+def _splits_filter_sign(split_list, sign):
+    return [s for s in split_list if gnc_numeric_sign(s.GetAmount()) == sign]
 
 def splits_filter_debits(split_list):
-    return _splits_filter_amount(split_list, lambda x: x < ZERO)
+    return _splits_filter_sign(split_list, -1)
 
 def splits_filter_credits(split_list):
-    return _splits_filter_amount(split_list, lambda x: x > ZERO)
+    return _splits_filter_sign(split_list, 1)
 
 #don't forget to handle splits that no rules match
 def get_matching_rules(description, rules):
+    #a compiled rule set can test all of its rules in one pass
+    if isinstance(rules, CompiledRuleSet):
+        return rules.matching_rules(description)
+
     matching_rules = []
     for this_rule in rules:
         if this_rule.regex.match(description) is not None:
@@ -138,17 +179,23 @@ def get_matching_rules(description, rules):
 
 def copy_split(a): 
     from .Reflect import chain_mutations
+    from gnucash import Split
     b = Split(a.GetBook())
     #hack to copy the data over since Split doesn't have Clone()
     chain_mutations(b, a)
     return b
 
+#the GUID of a split (or any other gnucash object) as a string
+#suitable for use as a dict key
+def guid_str(n):
+    return n.GetGUID().to_string()
+
 def splits_equal(a, b):
-    def guid_str(n):
-        return n.GetGUID().to_string()
     return guid_str(a) == guid_str(b)
 
-def modify_transaction(root_account, split, rule):
+#dest_account is the account rule.dest names
+#pass it if it's already known to avoid looking it up again
+def modify_transaction(root_account, split, rule, dest_account=None):
     trans = split.GetParent()
     from SplitTransactionsNotSupportedException import SplitTransactionsNotSupportedException
     #more than 2 splits means a "split" transaction
@@ -160,7 +207,8 @@ def modify_transaction(root_account, split, rule):
         undef_splits = get_undefined_splits(trans.GetSplitList()) 
         if len(undef_splits) == 1: 
             trans.BeginEdit()    
-            dest_account = get_account(root_account, rule.dest)
+            if dest_account is None:
+                dest_account = get_account(root_account, rule.dest)
             dest_account.BeginEdit()
 
             undef_splits[0].SetAccount(dest_account)
@@ -172,72 +220,350 @@ def modify_transaction(root_account, split, rule):
             trans.RollbackEdit()
         raise
     
-#can't use a set because we don't have access to Split.__eq__
-def get_unique_splits(splits):
-    unique_splits = []
+#can't put splits themselves in a set because we don't have access to Split.__eq__
+#so key them by GUID instead, computing each split's GUID once
+#yields splits in the order they were first seen
+def iter_unique_splits(splits):
+    seen = set()
     for i in splits:
-        found = False
-        for j in unique_splits:
-            #! don't use foo == bar for splits, use splits_equal
-            if splits_equal(i, j):
-                found = True
+        key = guid_str(i)
+        if key not in seen:
+            seen.add(key)
+            yield i
 
-        if not found:
-            unique_splits.append(i)
+def get_unique_splits(splits):
+    return list(iter_unique_splits(splits))
 
-    return unique_splits
 
+#yield this split and/or the other split in its transaction
+#if they're in the Undefined account
+def _undefined_sides(split):
+    if split is not None and split.GetAccount().name == "Undefined":
+        yield split
+    other = split.GetOtherSplit()
+    if other is not None and other.GetAccount().name == "Undefined":
+        yield other
 
 #get only (debit) splits where the destination account is Undefined
 def get_undefined_splits(splits):
-    undefined_splits = []
-    for i in splits:
-        if i is not None and i.GetAccount().name == "Undefined":
-            undefined_splits.append(i)
-        if i.GetOtherSplit() is not None and i.GetOtherSplit().GetAccount().name == "Undefined":
-            undefined_splits.append(i.GetOtherSplit())
-
-    return get_unique_splits(undefined_splits)
-    
-
-def process_source_account(src_acc, account_rules, start_date, end_date=None):
-    splits = src_acc.GetSplitList()
-
-    #the filters to apply:
-    #1. date range
-    #2. debits
-    #3. Undefined accounts
-
-    if end_date is not None:
-        splits = splits_before_date(splits, end_date)
-
-    splits = get_undefined_splits(splits_filter_debits(splits))
-
-    for this_split in splits:
-        matching_rules = get_matching_rules(this_split.GetParent().GetDescription(), account_rules)
-        if matching_rules is not []:
-            urgent_priority_rule = get_most_urgent_priority_rule(matching_rules)
-            assert urgent_priority_rule is not None
-            modify_transaction(src_acc.get_root(), this_split, urgent_priority_rule)
-
-
-def run(input_file, account_rules, start_date, end_date=None):
+    return get_unique_splits(s for i in splits for s in _undefined_sides(i))
+
+#the splits in account between start_date and end_date
+#that earlier runs haven't scanned if a Watermark is passed (and records them as scanned)
+#returns (splits, their posted dates as ordinals or None if they aren't known)
+def _splits_to_scan(account, start_date, end_date, date_indexes, stats, watermark):
+    #binary search for the date range first
+    with stats.timer("index_split_dates"):
+        date_index = date_indexes.for_account(account)
+    splits = date_index.between(start_date, end_date)
+    stats.count("splits_filtered_date_index", len(date_index) - len(splits))
+    if watermark is None:
+        return (splits, date_index.ordinals_between(start_date, end_date))
+
+    in_range = len(splits)
+    splits = watermark.unseen(date_index, start_date, end_date)
+    watermark.record(splits)
+    stats.count("splits_filtered_watermark", in_range - len(splits))
+    return (splits, None)
+
+#the splits in src_acc the rules should be applied to, read into a SplitSnapshot
+#pass a Watermark to skip the splits earlier runs have already scanned (and record the rest)
+#(use SplitSnapshot.candidates to find the debits with an Undefined side)
+def get_split_snapshot(src_acc, start_date, end_date=None, date_indexes=None, stats=NO_STATS, watermark=None):
+    if date_indexes is None:
+        date_indexes = SplitDateIndexCache()
+    splits, ordinals = _splits_to_scan(src_acc, start_date, end_date, date_indexes, stats, watermark)
+    with stats.timer("snapshot"):
+        return SplitSnapshot(splits, ordinals)
+
+#ways run can find the splits to classify
+#SCAN_SOURCE walks the history of every source account
+#SCAN_UNDEFINED walks the Undefined accounts and looks at the other side of each transaction
+#which is much less work when most of the book has already been classified
+SCAN_SOURCE = "source"
+SCAN_UNDEFINED = "undefined"
+SCANS = [SCAN_SOURCE, SCAN_UNDEFINED]
+
+#every account named Undefined, wherever it is in the tree
+#(the same accounts _undefined_sides recognizes)
+def find_undefined_accounts(account_index):
+    return [account_index.lookup(n) for n in sorted(account_index.names())
+            if n.rsplit(":", 1)[-1] == "Undefined"]
+
+#the same snapshots get_split_snapshot makes of source_accounts
+#but only holding the transactions with the other side in one of undefined_accounts,
+#found from the Undefined accounts' (much shorter) split lists
+#yields (source account, SplitSnapshot) for every source account with any such transactions
+def iter_undefined_snapshots(undefined_accounts, source_accounts, start_date, end_date=None,
+        date_indexes=None, stats=NO_STATS, watermark=None):
+    if date_indexes is None:
+        date_indexes = SplitDateIndexCache()
+    #accounts are compared by GUID rather than by name
+    sources = [(guid_str(a), a) for a in source_accounts]
+    #source account GUID -> ([the source side of each transaction], [their posted dates as ordinals])
+    by_source = dict((key, ([], [])) for key, _ in sources)
+
+    scanned, no_other, not_source = 0, 0, 0
+    ordinals_known = True
+    for undefined_account in undefined_accounts:
+        splits, ordinals = _splits_to_scan(undefined_account, start_date, end_date,
+                date_indexes, stats, watermark)
+        ordinals_known = ordinals_known and ordinals is not None
+        for i, undefined_split in enumerate(splits):
+            scanned += 1
+            #transactions between more than 2 accounts aren't supported
+            other = undefined_split.GetOtherSplit()
+            if other is None:
+                no_other += 1
+                continue
+            source_splits = by_source.get(guid_str(other.GetAccount()))
+            if source_splits is None:
+                not_source += 1
+                continue
+            source_splits[0].append(other)
+            if ordinals is not None:
+                #both sides of a transaction are posted on the same day
+                source_splits[1].append(ordinals[i])
+    stats.count("undefined_splits_scanned", scanned)
+    stats.count("splits_filtered_not_two_sided", no_other)
+    stats.count("splits_filtered_not_source", not_source)
+
+    #from here on it's the same debit and Undefined filtering as for a whole source account
+    for key, src_acc in sources:
+        splits, ordinals = by_source[key]
+        if splits:
+            with stats.timer("snapshot"):
+                yield (src_acc, SplitSnapshot(splits, ordinals if ordinals_known else None))
+
+#(source account, SplitSnapshot) for the source accounts, found the way scan says
+def iter_snapshots(scan, source_accounts, account_index, start_date, end_date=None,
+        date_indexes=None, stats=NO_STATS, watermark=None):
+    if date_indexes is None:
+        date_indexes = SplitDateIndexCache()
+    if scan == SCAN_UNDEFINED:
+        undefined_accounts = find_undefined_accounts(account_index)
+        stats.count("undefined_accounts", len(undefined_accounts))
+        return iter_undefined_snapshots(undefined_accounts, source_accounts, start_date, end_date,
+                date_indexes, stats, watermark)
+    elif scan == SCAN_SOURCE:
+        return ((src_acc, get_split_snapshot(src_acc, start_date, end_date, date_indexes, stats, watermark))
+                for src_acc in source_accounts)
+    else:
+        raise ValueError("Unknown scan {}".format(scan))
+
+#(source account, Undefined split) for every split the rules should be applied to
+def iter_candidates(scan, source_accounts, account_index, start_date, end_date=None,
+        date_indexes=None, stats=NO_STATS, watermark=None):
+    for src_acc, snapshot in iter_snapshots(scan, source_accounts, account_index, start_date, end_date,
+            date_indexes, stats, watermark):
+        for i in snapshot.candidates(stats=stats):
+            for undefined_split in snapshot.live_undefined_splits(i):
+                yield (src_acc, undefined_split)
+
+#apply the most urgent rule to every candidate of each (source account, SplitSnapshot) in snapshots
+#rule_set_for(source account) is the CompiledRuleSet to match that account's descriptions with
+#account_rules is every rule that can be chosen, for the counters and to look up destinations
+#changes are queued in batch if one is passed (and it's up to the caller to apply it)
+#otherwise they're committed before returning
+def _classify_candidates(snapshots, rule_set_for, account_rules, account_index, batch, stats):
+    own_batch = batch is None
+    if own_batch:
+        batch = TransactionBatch()
+
+    #resolve every rule's destination once instead of once per split
+    dest_accounts = dict((r.rule_name, account_index.lookup(r.dest)) for r in account_rules)
+
+    regex_evaluations = account_rules.regex_evaluations
+    cache_hits = account_rules.match_cache_hits
+    cache_misses = account_rules.match_cache_misses
+    candidates = 0
+    for src_acc, snapshot in snapshots:
+        with stats.timer("filter_and_match"):
+            positions = snapshot.candidates(stats=stats)
+            #same rule as get_most_urgent_priority_rule(get_matching_rules(...))
+            #but without running every regex, and only once per distinct description
+            urgent_priority_rules = snapshot.classify(positions, rule_set_for(src_acc))
+        candidates += len(positions)
+
+        for i, urgent_priority_rule in zip(positions, urgent_priority_rules):
+            #leave splits that no rules match alone
+            if urgent_priority_rule is None:
+                continue
+            for this_split in snapshot.live_undefined_splits(i):
+                stats.count_rule(urgent_priority_rule.rule_name)
+                batch.add(this_split, dest_accounts[urgent_priority_rule.rule_name], urgent_priority_rule)
+    stats.count("splits_candidates", candidates)
+    stats.count("regex_evaluations", account_rules.regex_evaluations - regex_evaluations)
+    stats.count("match_cache_hits", account_rules.match_cache_hits - cache_hits)
+    stats.count("match_cache_misses", account_rules.match_cache_misses - cache_misses)
+
+    if own_batch:
+        stats.count("edits_committed", batch.apply())
+
+#changes are queued in batch if one is passed (and it's up to the caller to apply it)
+#otherwise they're committed before returning
+#given a RulePlan only the rules whose src is src_acc are applied
+#otherwise every rule in account_rules is
+def process_source_account(src_acc, account_rules, start_date, end_date=None, account_index=None,
+        date_indexes=None, batch=None, stats=NO_STATS, watermark=None):
+    if account_index is None:
+        account_index = AccountIndex(src_acc.get_root())
+    if isinstance(account_rules, RulePlan):
+        account_rules = account_rules.for_source(account_index.fully_qualified_name(src_acc))
+    elif not isinstance(account_rules, CompiledRuleSet):
+        account_rules = CompiledRuleSet(account_rules)
+
+    #everything up to the writes works on a snapshot of the splits
+    #instead of going back to the live objects for every filter
+    snapshot = get_split_snapshot(src_acc, start_date, end_date, date_indexes, stats, watermark)
+    _classify_candidates([(src_acc, snapshot)], lambda src: account_rules, account_rules, account_index,
+            batch, stats)
+
+#same as calling process_source_account on every source account
+#but starting from the Undefined accounts (see iter_undefined_snapshots)
+def process_undefined_accounts(source_accounts, account_rules, start_date, end_date=None, account_index=None,
+        date_indexes=None, batch=None, stats=NO_STATS, watermark=None):
+    source_accounts = list(source_accounts)
+    if account_index is None:
+        account_index = AccountIndex(source_accounts[0].get_root())
+    if not isinstance(account_rules, (RulePlan, CompiledRuleSet)):
+        account_rules = CompiledRuleSet(account_rules)
+
+    #the rules for each source account, keyed by its GUID
+    if isinstance(account_rules, RulePlan):
+        rule_sets = dict((guid_str(a), account_rules.for_source(account_index.fully_qualified_name(a)))
+                for a in source_accounts)
+    else:
+        rule_sets = dict((guid_str(a), account_rules) for a in source_accounts)
+
+    snapshots = iter_snapshots(SCAN_UNDEFINED, source_accounts, account_index, start_date, end_date,
+            date_indexes, stats, watermark)
+    _classify_candidates(snapshots, lambda src: rule_sets[guid_str(src)], account_rules, account_index,
+            batch, stats)
+
+#same as calling process_source_account on every source account
+#but the descriptions are matched in a pool of jobs worker processes
+#only this process touches the session: the workers get (key, description) pairs
+#(or (key, source account, description) for a RulePlan), each distinct one only once,
+#and send back (key, rule name) pairs which are applied here
+#scan is SCAN_SOURCE or SCAN_UNDEFINED (see iter_snapshots)
+#chunk_size is how many descriptions a worker is handed at once, DEFAULT_CHUNK_SIZE if None
+def process_source_accounts_parallel(source_accounts, account_rules, start_date, end_date, account_index,
+        date_indexes, jobs, batch, stats=NO_STATS, watermark=None, scan=SCAN_SOURCE, chunk_size=None):
+    from .ParallelClassifier import classify_descriptions, DEFAULT_CHUNK_SIZE
+    if chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    by_source = isinstance(account_rules, RulePlan)
+
+    #(source account name, description) or description -> key
+    keys = {}
+    descriptions = []
+    #key -> [(snapshot, position) of every candidate with that description]
+    candidates = []
+    with stats.timer("filter"):
+        for src_acc, snapshot in iter_snapshots(scan, source_accounts, account_index,
+                start_date, end_date, date_indexes, stats, watermark):
+            src_name = account_index.fully_qualified_name(src_acc)
+            for i in snapshot.candidates(stats=stats):
+                description = snapshot.descriptions[snapshot.description[i]]
+                item = (src_name, description) if by_source else description
+                key = keys.get(item)
+                if key is None:
+                    key = keys[item] = len(descriptions)
+                    if by_source:
+                        descriptions.append((key, src_name, description))
+                    else:
+                        descriptions.append((key, description))
+                    candidates.append([])
+                candidates[key].append((snapshot, i))
+    stats.count("splits_candidates", sum(len(c) for c in candidates))
+
+    rules_by_name = dict((r.rule_name, r) for r in account_rules)
+    dest_accounts = dict((r.rule_name, account_index.lookup(r.dest)) for r in account_rules)
+    with stats.timer("match"):
+        classified = classify_descriptions(descriptions, account_rules, jobs, chunk_size)
+    for key, rule_name in classified:
+        for snapshot, i in candidates[key]:
+            for this_split in snapshot.live_undefined_splits(i):
+                stats.count_rule(rule_name)
+                batch.add(this_split, dest_accounts[rule_name], rules_by_name[rule_name])
+
+
+#jobs is the number of processes to match descriptions with (1 means don't start any)
+#pass a Stats object to record where the time goes
+#and a Watermark to only look at splits added since the run it was loaded from
+#(it's up to the caller to save watermark.advanced() once this returns)
+#passing a report (see Report.open_report) makes this a dry run: the book is opened read only
+#and every change that would have been made is written to the report instead
+#backend is passed to sessionForFile
+#backup is called (with no arguments) once the book is open, so a book that can't be opened is left alone
+#with backup_if_changed it waits until right before the first change is made, if there are any
+#scan is how the splits to classify are found, SCAN_SOURCE or SCAN_UNDEFINED (see iter_snapshots)
+#returns the number of splits changed (or that would be, for a dry run)
+def run(input_file, account_rules, start_date, end_date=None, jobs=1, stats=NO_STATS, watermark=None,
+        report=None, backend="gnucash", backup=None, scan=SCAN_SOURCE, backup_if_changed=True):
+    dry_run = report is not None
+    changes = 0
     try:
-        session = sessionForFile(input_file)
+        with stats.timer("open_session"):
+            session = sessionForFile(input_file, dry_run, backend, set(r.src for r in account_rules))
+        if backup is not None and not backup_if_changed and not dry_run:
+            with stats.timer("backup"):
+                backup()
         root_account = session.book.get_root_account()
+        #walk the account tree once for every lookup in this session
+        with stats.timer("index_accounts"):
+            account_index = AccountIndex(root_account)
+        date_indexes = SplitDateIndexCache()
 
         #make sure all accounts exist before running any rules
-        check_accounts_exist(root_account, account_rules) 
-
-        source_account_set = get_source_account_set(root_account, account_rules)
+        with stats.timer("check_accounts_exist"):
+            check_accounts_exist(root_account, account_rules, account_index)
+
+        #compile the rules for each source account once
+        if isinstance(account_rules, RulePlan):
+            rule_set = account_rules
+        else:
+            with stats.timer("compile_rules"):
+                rule_set = RulePlan(account_rules)
+        stats.count("rules_unreachable", len(rule_set.shadowed))
+
+        source_account_set = get_source_account_set(root_account, account_rules, account_index)
         if source_account_set is not None:
             assert source_account_set != []
-            for src_acc in source_account_set:
-                process_source_account(src_acc, account_rules, start_date, end_date)
-            #only save if we've made changes
-            session.save()
-            if session.book.session_not_saved():
-                raise "Session book was not saved!"
+            stats.count("source_accounts", len(source_account_set))
+            #every change is committed together once all the accounts have been matched
+            if dry_run:
+                from accregex.Report import DryRunBatch
+                batch = DryRunBatch(report)
+            else:
+                batch = TransactionBatch()
+            if jobs > 1:
+                process_source_accounts_parallel(source_account_set, rule_set, start_date, end_date,
+                        account_index, date_indexes, jobs, batch, stats, watermark, scan)
+            elif scan == SCAN_UNDEFINED:
+                process_undefined_accounts(source_account_set, rule_set, start_date, end_date, account_index,
+                        date_indexes, batch, stats, watermark)
+            else:
+                for src_acc in source_account_set:
+                    process_source_account(src_acc, rule_set, start_date, end_date, account_index,
+                            date_indexes, batch, stats, watermark)
+            stats.count("rules_matched", len(batch))
+            if dry_run:
+                changes = batch.apply()
+                stats.count("edits_reported", changes)
+            else:
+                if backup is not None and backup_if_changed and len(batch) > 0:
+                    with stats.timer("backup"):
+                        backup()
+                with stats.timer("commit_edits"):
+                    changes = batch.apply()
+                stats.count("edits_committed", changes)
+                #only save if we've made changes
+                with stats.timer("save"):
+                    session.save()
+                if session.book.session_not_saved():
+                    raise "Session book was not saved!"
 
 
         session.end()
@@ -245,3 +571,4 @@ def run(input_file, account_rules, start_date, end_date=None):
         if "session" in locals():
             session.end()
         raise
+    return changes
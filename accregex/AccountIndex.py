@@ -0,0 +1,50 @@
+from collections import deque
+
+"""
+Every account in a book keyed by its fully qualified (colon separated) name
+e.g. "Expenses:Auto:Gas"
+
+Built with one walk of the account tree so lookups don't have to call
+lookup_by_name once per level (see Account.get_account) or climb back up the tree
+(see Account.get_account_fully_qualified_name)
+"""
+class AccountIndex(object):
+    def __init__(self, root_account):
+        self.root = root_account
+        self._by_name = {}
+        #fully qualified names keyed by account GUID string
+        #(the SWIG account objects can't be used as keys)
+        self._names = {}
+
+        #breadth first so the first of two accounts with the same name wins
+        #which is what lookup_by_name does
+        #skip the root account--it isn't part of any name
+        queue = deque((child, child.GetName()) for child in root_account.get_children())
+        while queue:
+            account, name = queue.popleft()
+            if name in self._by_name:
+                continue
+            self._by_name[name] = account
+            self._names[account.GetGUID().to_string()] = name
+
+            for child in account.get_children():
+                queue.append((child, name + ":" + child.GetName()))
+
+    #returns None if no account has that name
+    def lookup(self, acc_name):
+        if acc_name is None:
+            return None
+        return self._by_name.get(acc_name)
+
+    #returns None for accounts that aren't in this index (e.g. the root account)
+    def fully_qualified_name(self, account):
+        return self._names.get(account.GetGUID().to_string())
+
+    def __contains__(self, acc_name):
+        return acc_name in self._by_name
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def names(self):
+        return self._by_name.keys()
@@ -1,8 +1,10 @@
-import json
 import re
 from .eprint import eprint
 
-class AccountRule:
+#__slots__ so a file with thousands of rules doesn't carry a dict per rule
+class AccountRule(object):
+    __slots__ = ("rule_name", "regex", "priority", "dest", "src")
+
     def __init__(self, rule_name, regex_str, priority, dest, src):
        self.rule_name = rule_name
        self.regex = re.compile(regex_str)
@@ -15,9 +17,17 @@ class AccountRule:
     def __lt__(self, other):
         return self.priority < other.priority
 
+    #rules are pickled to send them to worker processes (see ParallelClassifier)
+    #and objects with __slots__ have no __dict__ for pickle to use
+    def __getstate__(self):
+        return _account_rule_to_tuple(self)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
     #see http://stackoverflow.com/questions/1535327/how-to-print-a-class-or-objects-of-class-using-print
     def __str__(self):
-        return str(self.__class__) + ": " + str(self.__dict__)
+        return str(self.__class__) + ": " + str(dict((k, getattr(self, k)) for k in self.__slots__))
 
 #has an awkward name intentionally to avoid calling it the
 #"highest priority rule" since priority 1 is the most important
@@ -54,18 +64,11 @@ def _json_obj_to_account_rule(rule_name, global_src_account, obj):
         eprint("error compiling regex expression in AccountRule from json object {}".format(str(obj)))
         raise
 
-#read account rules from a JSON file
-#next need to make sure the named destination accounts correspond to actual accounts
-def read_account_rules(json_file_name):
-    with open(json_file_name, 'r') as json_file:
-        from .json_minify import json_minify
-        #this workaround allows comments in JSON
-        #which the standard does not require
-        #see http://stackoverflow.com/questions/244777/can-i-use-comments-inside-a-json-file
-        stripped_json = json_minify(json_file.read(), False)
-        #see http://stackoverflow.com/questions/19483351/converting-json-string-to-dictionary-not-list-python
-        json_data = json.loads(stripped_json)
+#the fields needed to rebuild an AccountRule (see RuleCache)
+def _account_rule_to_tuple(rule):
+    return (rule.rule_name, rule.regex.pattern, rule.priority, rule.dest, rule.src)
 
+def _account_rules_from_json(json_data):
     all_rules = []
 
     #can optionally specify a "src" element as the default source account
@@ -91,3 +94,34 @@ def read_account_rules(json_file_name):
             raise
 
     return all_rules 
+
+#read account rules from a JSON file
+#next need to make sure the named destination accounts correspond to actual accounts
+#pass a RuleCache to reuse the rules parsed the last time a file with the same contents was read
+def read_account_rules(json_file_name, cache=None):
+    from .JsonComments import loads_with_comments, map_file
+    with open(json_file_name, 'rb') as json_file:
+        #mapped rather than read so large rule files aren't copied before the comments are stripped
+        contents = map_file(json_file)
+    try:
+        if cache is not None:
+            key = cache.key(contents)
+            rule_tuples = cache.load(key)
+            if rule_tuples is not None:
+                return [AccountRule(*t) for t in rule_tuples]
+
+        #comments are allowed in JSON rule files
+        #which the standard does not require
+        #see http://stackoverflow.com/questions/244777/can-i-use-comments-inside-a-json-file
+        #see http://stackoverflow.com/questions/19483351/converting-json-string-to-dictionary-not-list-python
+        json_data = loads_with_comments(contents)
+    finally:
+        if hasattr(contents, "close"):
+            contents.close()
+
+    all_rules = _account_rules_from_json(json_data)
+
+    if cache is not None:
+        cache.store(key, [_account_rule_to_tuple(r) for r in all_rules])
+
+    return all_rules
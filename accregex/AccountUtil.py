@@ -1,4 +1,4 @@
-#the following code is taken from account_analysis.py of the python-gnucash Ubuntu repository.
+#gnc_numeric_to_python_Decimal was originally taken from account_analysis.py of the python-gnucash Ubuntu repository.
 #original license text follows.
 
 # account_analysis.py -- Output all the credits and debits on an account
@@ -24,26 +24,70 @@
 
 
 from decimal import Decimal
-from math import log10
-from gnucash import Session, GncNumeric, Split
+from fractions import Fraction
 
-def gnc_numeric_to_python_Decimal(numeric):
-    negative = numeric.negative_p()
-    if negative:
-        sign = 1
-    else:
-        sign = 0
-    copy = GncNumeric(numeric.num(), numeric.denom())
-    result = copy.to_decimal(None)
-    if not result:
-        raise Exception("gnc numeric value %s can't be converted to decimal" %
-                        copy.to_string() )
-    digit_tuple = tuple( int(char)
-                         for char in str(copy.num())
-                         if char != '-' )
-    denominator = copy.denom()
-    exponent = int(log10(denominator))
-    assert( (10 ** exponent) == denominator )
-    return Decimal( (sign, digit_tuple, -exponent) )
+#these work directly on num() and denom() as python integers
+#so they don't need to copy the numeric or go through strings
+
+#gnucash uses a negative denominator to mean num * |denom|
+def _num_denom(num, denom):
+    if denom < 0:
+        return (num * -denom, 1)
+    return (num, denom)
+
+#-1, 0 or 1
+#the denominator is never needed since it can't change the sign
+def gnc_numeric_sign(numeric):
+    num = numeric.num()
+    return (num > 0) - (num < 0)
+
+def gnc_numeric_is_negative(numeric):
+    return numeric.num() < 0
+
+def gnc_numeric_is_positive(numeric):
+    return numeric.num() > 0
 
+#exact comparison of two gnc_numerics, returns -1, 0 or 1 like cmp
+def gnc_numeric_compare(a, b):
+    a_num, a_denom = _num_denom(a.num(), a.denom())
+    b_num, b_denom = _num_denom(b.num(), b.denom())
+    #both denominators are positive so cross multiplying keeps the order
+    lhs = a_num * b_denom
+    rhs = b_num * a_denom
+    return (lhs > rhs) - (lhs < rhs)
 
+def gnc_numeric_to_Fraction(numeric):
+    num, denom = _num_denom(numeric.num(), numeric.denom())
+    return Fraction(num, denom)
+
+#returns k if denom divides 10**k, otherwise None
+#denom has already been through _num_denom, so it's only ever 0 in a malformed book
+def _decimal_places(denom):
+    if denom <= 0:
+        raise ValueError("Invalid gnc_numeric denominator {}".format(denom))
+    twos, fives = 0, 0
+    while denom % 2 == 0:
+        denom //= 2
+        twos += 1
+    while denom % 5 == 0:
+        denom //= 5
+        fives += 1
+    if denom != 1:
+        return None
+    return max(twos, fives)
+
+def _num_denom_to_Decimal(num, denom):
+    places = _decimal_places(denom)
+    if places is None:
+        #e.g. 1/3 has no exact decimal representation
+        #so this is rounded to the current decimal context
+        return Decimal(num) / Decimal(denom)
+
+    #scale up to a power of ten denominator and build the Decimal from its digits
+    #so the result keeps the same exponent as the old conversion (e.g. 25.00 for 2500/100)
+    scaled = Decimal(num * (10 ** places // denom)).as_tuple()
+    return Decimal((scaled.sign, scaled.digits, -places))
+
+#exact for any denominator of the form 2**a * 5**b (which includes every power of ten)
+def gnc_numeric_to_python_Decimal(numeric):
+    return _num_denom_to_Decimal(*_num_denom(numeric.num(), numeric.denom()))
@@ -1,59 +1,146 @@
 #!/usr/bin/env python2
 
+from __future__ import print_function
 import sys
-import csv
-import shutil
 import os
-from gnucash import Session, GncNumeric, Split
 from .Logger import Logger
-from .Args import get_cli_arg_parser
-from .Account import run
-from .AccountRule import read_account_rules
+from .Args import parse_cli_args
+from .Stats import Stats, NO_STATS
 
 #create the global logger
 global_logger = Logger()
 
 
 
-#copy the input file and return the name of the destination file
-def copy_input(input_file):
-   new_file = input_file + ".bak"
-   shutil.copy(input_file, new_file)
-   return new_file
+#run without changing the book, writing what would have changed to args.report
+def dry_run(args, options, stats):
+    from .BatchRun import run_book
+    from .Report import open_report, report_format_for
+    fmt = args.reportformat or report_format_for(args.report)
+    if args.report is None:
+        out = sys.stdout
+    else:
+        out = open(args.report, "w")
+    try:
+        report = open_report(out, fmt)
+        run_book(args.file, options, stats, report, args.statefile, global_logger.write)
+        report.close()
+        global_logger.write("Dry run: {} splits would be changed".format(report.rows))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+#read in account rules and compile them into a matcher per source account
+#reusing the parsed rules from an earlier run if the file hasn't changed
+def read_rules(args, stats):
+    from .RuleSet import read_rule_plan
+    from .eprint import eprint
+    from .RuleCache import RuleCache
+
+    if args.norulecache:
+        rule_cache = None
+    else:
+        rule_cache = RuleCache()
+    with stats.timer("read_rules"):
+        account_rules = read_rule_plan(args.rulefile, rule_cache, args.matchcachesize)
+    for shadowed in account_rules.shadowed:
+        message = "Rule {} can never be chosen, {} rule {} always wins over it".format(
+                shadowed.rule.rule_name, shadowed.reason, shadowed.by.rule_name)
+        eprint(message)
+        global_logger.write(message)
+    return account_rules
+
+#everything run_book needs from args other than the book
+#jobs is the number of processes each book's descriptions are matched with
+def book_options(args, account_rules, jobs):
+    from .BatchRun import BatchOptions
+    from .Watermark import rule_file_hash
+    return BatchOptions(rule_plan=account_rules,
+            rule_hash=rule_file_hash(args.rulefile) if args.incremental else None,
+            start_date=args.startdate,
+            end_date=args.enddate,
+            backend=args.backend,
+            scan=args.scan,
+            dry_run=args.dryrun,
+            backups=0 if args.inplace else args.backups,
+            backup_if_changed=args.backupifchanged,
+            incremental=args.incremental,
+            jobs=jobs)
+
+#run the rules over every book in args.books
+#returns the number of books that couldn't be processed
+def batch_main(args):
+    import json
+    from .BatchRun import find_books, run_batch, summary, summary_to_dict
+    from .eprint import eprint
+
+    #both are per book
+    if args.report is not None or args.statefile is not None:
+        eprint("--report and --state-file can't be used with --books")
+        sys.exit(1)
+
+    books = find_books(args.books)
+    if not books:
+        eprint("No books found in {}".format(" ".join(args.books)))
+        sys.exit(1)
+
+    #parsed and compiled once for every book
+    account_rules = read_rules(args, NO_STATS)
+    #args.jobs is spent on books, not on the descriptions within each one
+    options = book_options(args, account_rules, 1)
+    results = run_batch(books, options, args.jobs)
 
-def accregex_main(argv=None):
+    text = summary(results)
+    global_logger.write(text)
+    if not args.quiet:
+        print(text)
+    if args.stats:
+        for r in results:
+            print("{}:".format(r.book))
+            print(json.dumps(r.stats, indent=4))
+    if args.statsjson is not None:
+        with open(args.statsjson, "w") as f:
+            f.write(json.dumps(summary_to_dict(results), indent=4))
+            f.write("\n")
+    return summary_to_dict(results)["failed"]
+
+#pass args if argv has already been parsed
+def accregex_main(argv=None, args=None):
     if argv == None:
-        argv = sys.argv
+        argv = sys.argv[1:]
 
     #parse cli args
-    parser = get_cli_arg_parser()
-    
-
-    try:
-        #print help and exit if no arguments were passed
-        if not len(argv) > 1:
-            raise InputError("No arguments passed!")
-
-        args = parser.parse_args(argv)
-    except:
-        parser.print_help()
-        sys.exit(0)
+    if args is None:
+        args = parse_cli_args(argv)
     
     #done with argument parsing
 
-    #make file backup if necessary
-    if not args.inplace:
-        res_file = copy_input(args.file)
-        global_logger.write("Copied gnucash input file: {} to {}".format(args.file, res_file))
+    if args.books is not None:
+        if batch_main(args) > 0:
+            sys.exit(1)
+        return
 
-    #read in account rules
-    account_rules = read_account_rules(args.rulefile)
-   
-    #enddate argument is optional
-    try:
-        enddate = args.enddate
-    except:
-        enddate = None
+    #only pay for timing if someone is going to look at it
+    if args.stats or args.statsjson is not None:
+        stats = Stats()
+    else:
+        stats = NO_STATS
+
+    #the rest of accregex is only loaded once the arguments are known to be good
+    from .BatchRun import run_book
+
+    account_rules = read_rules(args, stats)
+    options = book_options(args, account_rules, args.jobs)
 
     #do the actual work
-    run(args.file, account_rules, args.startdate, enddate)
+    if args.dryrun:
+        dry_run(args, options, stats)
+    else:
+        run_book(args.file, options, stats, state_file=args.statefile, log=global_logger.write)
+
+    if stats.enabled:
+        global_logger.write(stats.summary())
+        if args.stats:
+            print(stats.summary())
+        if args.statsjson is not None:
+            stats.write_json(args.statsjson)
@@ -1,5 +1,7 @@
 import argparse
 import datetime
+import sys
+from .LruCache import DEFAULT_MATCH_CACHE_SIZE
 
 #see http://stackoverflow.com/questions/25470844/specify-format-for-input-arguments-argparse-python
 def _valid_date(s):
@@ -17,9 +19,26 @@ def get_cli_arg_parser():
     group.add_argument('-q', '--quiet', dest='quiet', help='Suppress output', action="store_true")
     group.add_argument('-v', '--verbose', dest='verbose', help='Verbose output', action="store_true")
 
-    parser.add_argument('-f', '--input-file', dest='file', required=True, help='Gnucash input file')
+    #either one book or a batch of them
+    books = parser.add_mutually_exclusive_group(required=True)
+    books.add_argument('-f', '--input-file', dest='file', help='Gnucash input file')
+    books.add_argument('-b', '--books', dest='books', nargs='+', metavar='BOOK', help='Run the rules over every BOOK, which can each be a Gnucash file, a directory (every *.gnucash file in it) or a glob, with up to --jobs books processed at once (the rules are only read and compiled once)')
     parser.add_argument('-r', '--rule-file', dest='rulefile', required=True, help='JSON rule file')
     parser.add_argument('--inplace', dest='inplace', help='Don\'t create a backup of the Gnucash file', action="store_true")
+    parser.add_argument('--backups', dest='backups', type=int, default=1, metavar='N', help='Number of backups of the Gnucash file to keep (default: 1, written to FILE.bak; more are numbered FILE.bak.1 (newest) to FILE.bak.N)')
+    parser.add_argument('--backup-if-changed', dest='backupifchanged', help="Only back up the Gnucash file if the run is going to change it", action="store_true")
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='Number of processes to match transaction descriptions with, or with --books the number of books to process at once (default: 1)')
+    parser.add_argument('--no-rule-cache', dest='norulecache', help="Don't read or write the cache of parsed rule files", action="store_true")
+    parser.add_argument('--match-cache-size', dest='matchcachesize', type=int, default=DEFAULT_MATCH_CACHE_SIZE, metavar='N', help='Number of transaction descriptions to remember the matching rule for (default: {}, 0 turns the cache off)'.format(DEFAULT_MATCH_CACHE_SIZE))
+    parser.add_argument('--stats', dest='stats', help='Print timers and counters for each stage when finished', action="store_true")
+    parser.add_argument('--stats-json', dest='statsjson', metavar='FILE', help='Write timers and counters for each stage to FILE as JSON (with --books, the result of every book)')
+    parser.add_argument('--incremental', dest='incremental', help='Only look at transactions added since the last incremental run with the same rules and dates', action="store_true")
+    parser.add_argument('--state-file', dest='statefile', metavar='FILE', help='Where --incremental keeps its state (default: next to the Gnucash file)')
+    parser.add_argument('--dry-run', dest='dryrun', help="Open the Gnucash file read only and report the changes that would be made instead of making them", action="store_true")
+    parser.add_argument('--report', dest='report', metavar='FILE', help='Where --dry-run writes its report (default: stdout)')
+    parser.add_argument('--report-format', dest='reportformat', choices=['csv', 'json'], help='Format of the --dry-run report (default: json if FILE ends in .json, csv otherwise)')
+    parser.add_argument('--scan', dest='scan', choices=['source', 'undefined'], default='source', help="Find the transactions to classify by reading the history of every source account, or by starting from the Undefined accounts, which is faster when most of the book is already classified (default: source)")
+    parser.add_argument('--backend', dest='backend', choices=['gnucash', 'xml', 'sqlite'], default='gnucash', help="How to read the Gnucash file: with the gnucash python bindings, or (for XML and SQLite files) with accregex's own readers, which don't need gnucash-env (default: gnucash)")
     parser.add_argument('--no-relaunch', dest='norelaunch', help="Don't relaunch with gnucash-env (should not be passed except for debugging)", action="store_true")
 
     #date range
@@ -30,8 +49,21 @@ def get_cli_arg_parser():
 
     return parser
 
-def need_relaunch(argv):
-    return get_cli_arg_parser().parse_args(argv).norelaunch == False
+#print help and exit if argv can't be parsed (or is empty)
+def parse_cli_args(argv):
+    parser = get_cli_arg_parser()
+    try:
+        if not len(argv) > 0:
+            raise ValueError("No arguments passed!")
+
+        return parser.parse_args(argv)
+    except:
+        parser.print_help()
+        sys.exit(0)
+
+#only the gnucash bindings need the environment gnucash-env sets up
+def need_relaunch(args):
+    return args.norelaunch == False and args.backend == "gnucash"
 
 def verbose_enabled(argv):
     #manually search the argv array for "-v" because argparse will call _sys.exit if it doesn't
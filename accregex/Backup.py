@@ -0,0 +1,127 @@
+import errno
+import os
+import shutil
+
+"""
+Backups of the book taken before a run changes it
+
+A backup is made with the cheapest method that works:
+    reflink: a copy on write clone (FICLONE) that shares the original's blocks, so it's near instant
+             and takes no space until one of the files changes (btrfs, xfs, ...)
+    hardlink: a second name for the same file, which is only safe if whatever saves the book
+              writes a new file and renames it over the old one (as gnucash's XML backend and
+              XmlBackend do) instead of changing it in place (as a SQLite book is)
+    copy: a streamed copy of the whole file
+"""
+
+REFLINK = "reflink"
+HARDLINK = "hardlink"
+COPY = "copy"
+METHODS = [REFLINK, HARDLINK, COPY]
+
+#from linux/fs.h, _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+_COPY_BUFFER_SIZE = 1 << 20
+
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+
+#SQLite books are written in place so a hard link would change along with them
+def saved_by_replacing(book_file):
+    with open(book_file, "rb") as f:
+        return f.read(len(_SQLITE_MAGIC)) != _SQLITE_MAGIC
+
+def _reflink(src, dest):
+    import fcntl
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+
+def _hardlink(src, dest):
+    os.link(src, dest)
+
+def _copy(src, dest):
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        shutil.copyfileobj(s, d, _COPY_BUFFER_SIZE)
+
+_CLONE_FUNCTIONS = {REFLINK: _reflink, HARDLINK: _hardlink, COPY: _copy}
+
+#an open SQLite book has its session's row in the gnclock table (see SqliteSession._lock)
+#a copy that kept it would be locked for good once it's restored
+def _unlock_sqlite_copy(path):
+    import sqlite3
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'gnclock'").fetchone()[0]:
+            conn.execute("DELETE FROM gnclock")
+    finally:
+        conn.close()
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+#make dest a copy of src with the first of methods that works and return the method used
+#finish is called with the path of the copy before it becomes dest (never with a hard link)
+#dest only appears once it's complete
+def clone_file(src, dest, methods=METHODS, finish=None):
+    tmp_path = dest + ".tmp"
+    last_error = None
+    for method in methods:
+        _remove_if_exists(tmp_path)
+        try:
+            _CLONE_FUNCTIONS[method](src, tmp_path)
+        except (IOError, OSError, ImportError) as e:
+            #e.g. the filesystem doesn't support reflinks or the backup is on another device
+            last_error = e
+            continue
+
+        if method != HARDLINK:
+            if finish is not None:
+                finish(tmp_path)
+            shutil.copystat(src, tmp_path)
+        os.rename(tmp_path, dest)
+        #renaming a link over another link to the same file does nothing
+        _remove_if_exists(tmp_path)
+        return method
+
+    _remove_if_exists(tmp_path)
+    raise last_error
+
+def numbered_backup(book_file, n):
+    return "{}.bak.{}".format(book_file, n)
+
+#move book.bak.1 to book.bak.2 and so on, deleting whatever would end up past keep
+def _rotate(book_file, keep):
+    n = keep
+    while os.path.exists(numbered_backup(book_file, n)):
+        os.remove(numbered_backup(book_file, n))
+        n += 1
+    for n in range(keep - 1, 0, -1):
+        if os.path.exists(numbered_backup(book_file, n)):
+            os.rename(numbered_backup(book_file, n), numbered_backup(book_file, n + 1))
+
+"""
+Back up book_file before it's changed and return (backup file, method used)
+
+Keeping 1 backup writes <book>.bak like earlier versions of accregex
+keeping more writes <book>.bak.1 (the newest) through <book>.bak.<keep>
+The book can already be open: a SQLite book's lock isn't copied into the backup
+"""
+def backup_book(book_file, keep=1, allow_hardlink=None):
+    if keep < 1:
+        raise ValueError("Must keep at least 1 backup")
+    replaced = saved_by_replacing(book_file)
+    if allow_hardlink is None:
+        allow_hardlink = replaced
+    methods = [m for m in METHODS if allow_hardlink or m != HARDLINK]
+
+    if keep == 1:
+        dest = book_file + ".bak"
+    else:
+        _rotate(book_file, keep)
+        dest = numbered_backup(book_file, 1)
+    finish = None if replaced else _unlock_sqlite_copy
+    return (dest, clone_file(book_file, dest, methods, finish))
@@ -0,0 +1,194 @@
+import glob
+import multiprocessing
+import os
+from collections import namedtuple
+from timeit import default_timer
+from .Stats import Stats, NO_STATS
+
+"""
+Runs the same rules over many books
+
+The rule file is read and compiled once, before any book is opened
+then the books are handed out to a pool of worker processes, each opening its own session
+The workers are forked so they share the compiled rules instead of each compiling a copy
+
+Every book gets a BookResult whatever happens to it: a book that's locked by another program
+(or fails in any other way) is recorded and the rest of the batch carries on
+"""
+
+#GnuCash's own extension for both XML and SQLite books
+BOOK_EXTENSION = ".gnucash"
+
+#what happened to a book
+OK = "ok"
+LOCKED = "locked"
+FAILED = "failed"
+
+#changes is the number of splits moved (or that would be moved, for a dry run)
+#error is the message of whatever stopped the book from being processed, None if it was
+BookResult = namedtuple("BookResult", ["book", "status", "seconds", "changes", "error", "stats"])
+
+#each argument can be a book, a directory (every *.gnucash file directly in it) or a glob pattern
+#returns the books in the order they were given, each only once
+def find_books(paths):
+    books = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(os.path.join(path, f) for f in os.listdir(path)
+                    if f.endswith(BOOK_EXTENSION) and os.path.isfile(os.path.join(path, f)))
+        elif glob.has_magic(path):
+            found = sorted(glob.glob(path))
+        else:
+            #a missing book is reported along with the rest rather than stopping the batch here
+            found = [path]
+        books.extend(found)
+
+    seen = set()
+    unique = []
+    for book in books:
+        key = os.path.abspath(book)
+        if key not in seen:
+            seen.add(key)
+            unique.append(book)
+    return unique
+
+#whether e means someone else has the book open
+def is_lock_error(e):
+    from .XmlBackend import XmlBookLockedException
+    from .SqliteBackend import SqliteBookLockedException
+    if isinstance(e, (XmlBookLockedException, SqliteBookLockedException)):
+        return True
+    try:
+        from gnucash import GnuCashBackendException, ERR_BACKEND_LOCKED
+    except ImportError:
+        return False
+    return isinstance(e, GnuCashBackendException) and ERR_BACKEND_LOCKED in e.errors
+
+"""
+A report that only counts the changes a dry run would make
+(a batch has no single place to write every book's changes to)
+"""
+class _CountingReport(object):
+    def __init__(self):
+        self.rows = 0
+
+    def write(self, row):
+        self.rows += 1
+
+    def close(self):
+        pass
+
+"""
+Everything needed to run the rules over a book other than the book itself
+rule_plan is the compiled RulePlan shared by every book
+backups is the number of backups to keep, 0 for none (--inplace)
+jobs is the number of processes each book's descriptions are matched with
+"""
+BatchOptions = namedtuple("BatchOptions", ["rule_plan", "rule_hash", "start_date", "end_date", "backend",
+        "scan", "dry_run", "backups", "backup_if_changed", "incremental", "jobs"])
+
+#run the rules over one book, the same way for a single book and for each book of a batch
+#report is where a dry run writes its changes, they're only counted if it's None
+#state_file is where --incremental keeps its state, next to the book if it's None
+#log is called with each message worth keeping
+#returns the number of splits changed (or that would be, for a dry run)
+def run_book(book, options, stats=NO_STATS, report=None, state_file=None, log=None):
+    from .Account import run
+    from .Backup import backup_book
+    from .Watermark import load_watermark, state_file_for
+
+    if log is None:
+        log = lambda message: None
+
+    #pick up where the last incremental run left off
+    #unless the rules or dates have changed since
+    watermark = None
+    if options.incremental:
+        if state_file is None:
+            state_file = state_file_for(book)
+        watermark = load_watermark(state_file, options.rule_hash, options.start_date, options.end_date)
+        if watermark.is_full_scan():
+            log("No usable state in {}, scanning every transaction".format(state_file))
+
+    if options.dry_run:
+        if report is None:
+            report = _CountingReport()
+        return run(book, options.rule_plan, options.start_date, options.end_date, options.jobs, stats,
+                watermark, report, options.backend, scan=options.scan)
+
+    #run only calls this once the book is open, so a locked or missing book is never backed up
+    backup = None
+    if options.backups > 0:
+        def backup():
+            dest, method = backup_book(book, options.backups)
+            log("Copied gnucash input file: {} to {} ({})".format(book, dest, method))
+    changes = run(book, options.rule_plan, options.start_date, options.end_date, options.jobs, stats,
+            watermark, backend=options.backend, backup=backup, scan=options.scan,
+            backup_if_changed=options.backup_if_changed)
+
+    #only written once the book has been saved
+    if watermark is not None:
+        watermark.advanced().save(state_file)
+    return changes
+
+#run the rules over one book of a batch, never raising (except to stop the whole batch, e.g. KeyboardInterrupt)
+def process_book(book, options):
+    stats = Stats()
+    start = default_timer()
+    try:
+        changes = run_book(book, options, stats)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    #the backends' exceptions derive from BaseException
+    except BaseException as e:
+        status = LOCKED if is_lock_error(e) else FAILED
+        return BookResult(book, status, default_timer() - start, 0, "{}: {}".format(type(e).__name__, e),
+                stats.to_dict())
+    return BookResult(book, OK, default_timer() - start, changes, None, stats.to_dict())
+
+#set in each worker before it's forked, see run_batch
+_worker_options = None
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+
+def _process_book_in_worker(book):
+    return process_book(book, _worker_options)
+
+#process every book with up to jobs worker processes
+#returns a BookResult for each book, in the same order as books
+def run_batch(books, options, jobs=1):
+    #not worth starting any processes
+    if jobs <= 1 or len(books) <= 1:
+        return [process_book(book, options) for book in books]
+
+    #the options (and the compiled rules in them) are inherited by the forked workers, not pickled
+    pool = multiprocessing.Pool(min(jobs, len(books)), _init_worker, (options,))
+    try:
+        #chunks of 1 so one slow book doesn't hold up the ones queued behind it
+        results = pool.map(_process_book_in_worker, books, 1)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+#one line per book and the totals
+def summary(results):
+    lines = ["{:<8}{:>10}{:>10}  {}".format("status", "changes", "seconds", "book")]
+    for r in results:
+        lines.append("{:<8}{:>10}{:>10.3f}  {}".format(r.status, r.changes, r.seconds, r.book))
+        if r.error is not None:
+            lines.append("{:<28}  {}".format("", r.error))
+    failed = sum(1 for r in results if r.status != OK)
+    lines.append("{} books, {} changes, {} not processed".format(len(results),
+            sum(r.changes for r in results), failed))
+    return "\n".join(lines)
+
+def summary_to_dict(results):
+    return {"books": [r._asdict() for r in results],
+            "changes": sum(r.changes for r in results),
+            "failed": sum(1 for r in results if r.status != OK)}
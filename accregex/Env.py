@@ -2,10 +2,11 @@ from __future__ import print_function
 import sys
 import os
 import shlex
-from subprocess import Popen
 from eprint import eprint
-from Args import need_relaunch, verbose_enabled
-from Accregex import accregex_main
+from Args import parse_cli_args, need_relaunch, verbose_enabled
+
+#everything else is imported by the code that needs it
+#so --help and argument errors don't pay for loading the rest of accregex (or gnucash)
 
 #search environment for executable
 #see http://stackoverflow.com/questions/377017/test-if-executable-exists-in-python
@@ -31,41 +32,50 @@ def find_prog(program):
 
     return None
 
+#returns the exit status of the relaunched process
 def relaunch(gnucash_env, argv):
     if(verbose_enabled(argv)):
         print("Env.relaunch called with {}".format(str(argv)))
 
+    from subprocess import Popen
     ccwd = os.getcwd()
 
     gnucash_env_path = os.path.abspath(gnucash_env)
     #Popen expects the program path to be the first item in argv if you pass a sequence
     accregex_proc = Popen([gnucash_env_path] + argv, bufsize=-1, executable=gnucash_env, cwd=ccwd)
-    accregex_proc.wait()
+    return accregex_proc.wait()
+
+#find gnucash-env, fail if we can't find it
+def find_gnucash_env():
+    gnucash_env = find_prog("gnucash-env")
+    if gnucash_env == None:
+        eprint("Could not find gnucash-env!  Is GnuCash correctly installed?")
+        sys.exit(1)
+    return gnucash_env
 
-def relauncher_main(argv=None):
+#returns the exit status of the relaunched process
+def relauncher_main(argv=None, gnucash_env=None):
     if argv == None:
         argv = sys.argv
 
     if(verbose_enabled(argv)):
         print("Env.relauncher_main called with {}".format(str(argv)))
 
-    #find gnucash-env, fail if we can't find it
-    gnucash_env = find_prog("gnucash-env")
     if gnucash_env == None:
-        eprint("Could not find gnucash-env!  Is GnuCash correctly installed?")
-        sys.exit(1)
+        gnucash_env = find_gnucash_env()
 
     #need to pass the --no-relaunch flag to make sure we don't get stuck in an infinite loop
     #this will make choose_main run accregex_main instead of relauncher_main
     additional_args = shlex.split("python2 -maccregex --no-relaunch")
     new_argv = additional_args + argv
 
-    relaunch(gnucash_env, new_argv)
-    
+    return relaunch(gnucash_env, new_argv)
+
 
 #this is where program execution actually starts
-#if --no-relaunch was passed, run Accregex.accregex_main
-#otherwise, run Env.relauncher_main
+#if --no-relaunch was passed (or the bindings aren't needed), run Accregex.accregex_main
+#otherwise set up the environment gnucash-env would in this process and run Accregex.accregex_main,
+#falling back to Env.relauncher_main if the bindings still can't be loaded
 def choose_main(argv=None):
     if argv == None:
         argv = sys.argv
@@ -77,8 +87,19 @@ def choose_main(argv=None):
     if len(argv) > 0 and "__main__.py" in argv[0]:
         del argv[0]
 
-    #if no args are passed we need to relaunch
-    if len(argv) == 0 or need_relaunch(argv):
-        relauncher_main(argv)
-    else:
-        accregex_main(argv)
+    #prints help and exits if there's nothing to run
+    args = parse_cli_args(argv)
+
+    if need_relaunch(args):
+        from GnucashEnv import bootstrap_gnucash
+        gnucash_env = find_gnucash_env()
+        if not bootstrap_gnucash(gnucash_env):
+            if(verbose_enabled(argv)):
+                print("Could not load the gnucash bindings in this process, relaunching with gnucash-env")
+            status = relauncher_main(argv, gnucash_env)
+            if status != 0:
+                sys.exit(status)
+            return
+
+    from Accregex import accregex_main
+    accregex_main(argv, args)
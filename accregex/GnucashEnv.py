@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from .eprint import eprint
+from .RuleCache import accregex_cache_dir
+
+#variables that differ between any two processes and have nothing to do with gnucash
+_IGNORED_VARIABLES = set(["_", "PWD", "OLDPWD", "SHLVL"])
+
+#prints the environment of the process it runs in as JSON
+_PRINT_ENVIRONMENT = "import json, os, sys; json.dump(dict(os.environ), sys.stdout)"
+
+def env_cache_file():
+    return os.path.join(accregex_cache_dir(), "gnucash-env.json")
+
+#a cached environment is only used with the gnucash-env it came from
+def _cache_key(gnucash_env):
+    path = os.path.realpath(gnucash_env)
+    st = os.stat(path)
+    return [path, int(st.st_mtime), st.st_size]
+
+#what gnucash-env did to one variable, given its value before (old) and after (new)
+#a path list it added entries to is kept as the entries before and after the old value
+#so they can be put around whatever the variable is in a later run
+#anything else is kept as the value it was set to
+def _change(old, new):
+    if old:
+        start = new.find(old)
+        if start >= 0:
+            before, after = new[:start], new[start + len(old):]
+            if before[-1:] in ("", os.pathsep) and after[:1] in ("", os.pathsep):
+                return {"before": before, "after": after}
+    return {"value": new}
+
+#the value a variable should have now, given its current value and what gnucash-env did to it
+def _apply_change(current, change):
+    if "value" in change:
+        return change["value"]
+    if current:
+        return change["before"] + current + change["after"]
+    #no empty entry, which would mean the current directory
+    return os.pathsep.join(p for p in [change["before"].rstrip(os.pathsep), change["after"].lstrip(os.pathsep)] if p)
+
+#run gnucash-env once and return what it did to each variable it sets or changes (see _change)
+def capture_environment(gnucash_env):
+    output = subprocess.check_output([gnucash_env, sys.executable, "-c", _PRINT_ENVIRONMENT])
+    child_environment = json.loads(output.decode("utf-8"))
+    return dict((k, _change(os.environ.get(k), v)) for k, v in child_environment.items()
+            if k not in _IGNORED_VARIABLES and os.environ.get(k) != v)
+
+def _valid_change(change):
+    return isinstance(change, dict) and ("value" in change or ("before" in change and "after" in change))
+
+def _load_cached_changes(cache_file, key):
+    try:
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key or not isinstance(cached.get("changes"), dict):
+        return None
+    if not all(_valid_change(c) for c in cached["changes"].values()):
+        return None
+    return cached["changes"]
+
+#failing to write the cache isn't an error--gnucash-env will just be run again next time
+def _store_cached_changes(cache_file, key, changes):
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"key": key, "changes": changes}, f)
+            os.rename(tmp_path, cache_file)
+        except:
+            os.remove(tmp_path)
+            raise
+    except (IOError, OSError) as e:
+        eprint("Could not cache the gnucash-env environment: {}".format(e))
+
+#the variables gnucash-env would set in this process's environment
+#what it does to them comes from the cache if gnucash-env hasn't changed since it was captured
+#and is applied to the current values, so a run from another shell keeps its own PATH and so on
+def gnucash_environment(gnucash_env, cache_file=None):
+    if cache_file is None:
+        cache_file = env_cache_file()
+    key = _cache_key(gnucash_env)
+    changes = _load_cached_changes(cache_file, key)
+    if changes is None:
+        changes = capture_environment(gnucash_env)
+        _store_cached_changes(cache_file, key, changes)
+    return dict((k, _apply_change(os.environ.get(k), c)) for k, c in changes.items())
+
+def apply_environment(environment):
+    for k, v in environment.items():
+        os.environ[k] = v
+    #the interpreter only reads PYTHONPATH when it starts
+    python_path = [p for p in environment.get("PYTHONPATH", "").split(os.pathsep) if p]
+    for p in reversed(python_path):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+"""
+Set up what gnucash-env would in this process and load the gnucash bindings
+so accregex doesn't have to start a second python through gnucash-env
+
+Returns False if the bindings still can't be imported, e.g. because the library search path
+(which the dynamic linker only reads at startup) is part of what gnucash-env changes,
+in which case the caller should fall back to relaunching
+"""
+def bootstrap_gnucash(gnucash_env, cache_file=None):
+    #even if the bindings can already be imported their engine modules are found through the environment
+    try:
+        environment = gnucash_environment(gnucash_env, cache_file)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        eprint("Could not capture the gnucash-env environment: {}".format(e))
+        return False
+
+    apply_environment(environment)
+    try:
+        import gnucash
+        return True
+    except ImportError:
+        return False
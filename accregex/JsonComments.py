@@ -0,0 +1,241 @@
+import json
+import mmap
+from bisect import bisect_right
+
+"""
+Strips // and /* */ comments out of a rule file in one linear pass
+
+Gives exactly the same output as json_minify(text, False) (including its quirks,
+e.g. the newline ending a // comment is dropped and an unterminated comment at the end of the file is kept)
+but jumps between the characters that matter with str.find instead of running a regex per token
+and counting backslashes from the start of the file for every quote
+
+Works on str, unicode, bytes and mmap objects
+and remembers where each piece of the output came from so JSON errors can be reported
+at their line and column in the original file
+"""
+
+def _tokens(text):
+    if isinstance(text, type(u"")):
+        return (u'"', u"/", u"*", u"\\", u"\n", u"\r", u"")
+    return (b'"', b"/", b"*", b"\\", b"\n", b"\r", b"")
+
+class StrippedJson(object):
+    def __init__(self, text, chunks, segments):
+        self.source = text
+        self.text = chunks
+        #(output offset, source offset) at the start of every piece copied from the source
+        self._segments = segments
+        self._out_starts = [s[0] for s in segments]
+
+    #the offset in the source that produced the character at offset in the output
+    def source_offset(self, offset):
+        i = bisect_right(self._out_starts, offset) - 1
+        if i < 0:
+            return offset
+        out_start, src_start = self._segments[i]
+        return src_start + (offset - out_start)
+
+    #1-based (line, column) in the source of the character at offset in the output
+    def source_position(self, offset):
+        src = min(self.source_offset(offset), len(self.source))
+        _, _, _, _, nl, _, _ = _tokens(self.source)
+        line = self.source[:src].count(nl) + 1
+        column = src - (self.source.rfind(nl, 0, src) + 1) + 1
+        return (line, column)
+
+#tokens json_minify recognizes that are two characters long
+def _is_pair(text, i, slash, star):
+    a = text[i:i + 1]
+    b = text[i + 1:i + 2]
+    return (a == slash and (b == star or b == slash)) or (a == star and b == slash)
+
+#where the last token json_minify would find in text[start:] ends
+#start has to be a token boundary
+#only used for comments that are still open at the end of the file
+def _last_token_end(text, start):
+    quote, slash, star, _, nl, cr, _ = _tokens(text)
+    last = start
+    i = start
+    n = len(text)
+    while i < n:
+        if _is_pair(text, i, slash, star):
+            i += 2
+            last = i
+        else:
+            c = text[i:i + 1]
+            i += 1
+            if c == quote or c == nl or c == cr:
+                last = i
+    return last
+
+"""
+The next position of token in text at or after some position
+Positions only ever move forward so every character is searched at most once
+"""
+class _Finder(object):
+    def __init__(self, text, token):
+        self._text = text
+        self._token = token
+        self._n = len(text)
+        self._next = -1
+
+    def next(self, start):
+        if self._next < start:
+            found = self._text.find(self._token, start)
+            self._next = self._n if found == -1 else found
+        return self._next
+
+def strip_json_comments(text):
+    quote, slash, star, backslash, nl, cr, empty = _tokens(text)
+    n = len(text)
+    chunks = []
+    segments = []
+    out_len = [0]
+
+    def copy(start, end):
+        if end > start:
+            segments.append((out_len[0], start))
+            chunks.append(text[start:end])
+            out_len[0] += end - start
+
+    quotes = _Finder(text, quote)
+    slashes = _Finder(text, slash)
+    newlines = _Finder(text, nl)
+    returns = _Finder(text, cr)
+    comment_ends = _Finder(text, star + slash)
+
+    #start of the text that hasn't been copied yet
+    copy_start = 0
+    #every position before boundary has been split into tokens already
+    #and boundary itself starts a new token
+    boundary = 0
+    pos = 0
+
+    while pos < n:
+        #outside of strings and comments json_minify copies everything
+        #except newlines and a */ that isn't closing anything
+        q = quotes.next(pos)
+        s = slashes.next(pos)
+        line_end = min(newlines.next(pos), returns.next(pos))
+        e = min(q, s, line_end)
+        if e == n:
+            break
+
+        if e == line_end:
+            copy(copy_start, e)
+            pos = boundary = copy_start = e + 1
+            continue
+
+        if e == q:
+            #inside a string: copy up to the closing quote
+            #a quote preceded by an odd number of backslashes is escaped
+            #json_minify counts them with a regex ending in $ which also matches before a final newline
+            #so backslashes followed by a newline escape the quote after it too
+            c = quotes.next(q + 1)
+            while c < n:
+                end = c - 1 if text[c - 1:c] == nl else c
+                escapes = 0
+                while text[end - 1 - escapes:end - escapes] == backslash:
+                    escapes += 1
+                if escapes % 2 == 0:
+                    break
+                c = quotes.next(c + 1)
+
+            #an unterminated string runs to the end of the file
+            pos = boundary = c + 1
+            continue
+
+        if s - 1 >= boundary and text[s - 1:s] == star:
+            #a */ that isn't closing anything
+            copy(copy_start, s - 1)
+            pos = boundary = copy_start = s + 1
+            continue
+
+        kind = text[s + 1:s + 2]
+        if kind != star and kind != slash:
+            pos = boundary = s + 1
+            continue
+
+        #copy everything up to the comment and skip the comment itself
+        copy(copy_start, s)
+        body = s + 2
+
+        if kind == slash:
+            #ends at (and drops) the next newline
+            c = min(newlines.next(body), returns.next(body))
+            if c == n:
+                #unterminated comment--json_minify keeps whatever follows its last token
+                copy_start = _last_token_end(text, body)
+                break
+            pos = boundary = copy_start = c + 1
+            continue
+
+        #a block comment ends at the first */ that starts on a token boundary
+        #(the * in /*/ belongs to the /*)
+        comment_boundary = body
+        c = comment_ends.next(body)
+        while c < n:
+            r = c
+            while r > comment_boundary and text[r - 1:r] in (slash, star):
+                r -= 1
+            j = r
+            while j < c:
+                j += 2 if _is_pair(text, j, slash, star) else 1
+            if j == c:
+                break
+            comment_boundary = c + 1
+            c = comment_ends.next(c + 1)
+
+        if c == n:
+            copy_start = _last_token_end(text, comment_boundary)
+            break
+        pos = boundary = copy_start = c + 2
+
+    copy(copy_start, n)
+    return StrippedJson(text, empty.join(chunks), segments)
+
+"""
+Thrown for a rule file that isn't valid JSON once comments are removed
+line and column refer to the original file
+"""
+class RuleFileSyntaxError(ValueError):
+    def __init__(self, message, line, column):
+        ValueError.__init__(self, "{} (line {} column {} of the rule file)".format(message, line, column))
+        self.line = line
+        self.column = column
+
+#the output offset of a json error: python 3 stores it, python 2 only puts it in the message
+def _json_error_offset(e):
+    offset = getattr(e, "pos", None)
+    if offset is not None:
+        return offset
+    message = str(e)
+    marker = message.rfind("(char ")
+    if marker == -1:
+        return None
+    digits = message[marker + len("(char "):].split(")")[0].split(" ")[0]
+    try:
+        return int(digits)
+    except ValueError:
+        return None
+
+def loads_with_comments(text):
+    stripped = strip_json_comments(text)
+    try:
+        return json.loads(stripped.text)
+    except ValueError as e:
+        offset = _json_error_offset(e)
+        if offset is None:
+            raise
+        line, column = stripped.source_position(offset)
+        raise RuleFileSyntaxError(str(e), line, column)
+
+#map a file into memory instead of reading it if possible
+#the caller should close the result if it has a close method
+def map_file(f):
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError, AttributeError):
+        #empty files can't be mapped, and neither can pipes
+        return f.read()
@@ -9,4 +9,4 @@ class Logger:
         self._log_string += '\n'
 
     def get_log(self):
-        return _log_string
+        return self._log_string
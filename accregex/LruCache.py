@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+#how many descriptions each CompiledRuleSet remembers the most urgent rule for
+#0 turns the cache off
+#(kept here rather than in RuleSet so Args can use it without loading the regex machinery)
+DEFAULT_MATCH_CACHE_SIZE = 4096
+
+"""
+A dict that holds at most size items, forgetting the least recently used one to make room
+
+Counts hits and misses so callers can tell whether the cache is earning its keep
+"""
+class LruCache(object):
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("An LruCache must hold at least 1 item")
+        self.size = size
+        #least recently used first
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    #returns default (and counts a miss) if key isn't cached
+    def get(self, key, default=None):
+        try:
+            #move key to the end (python 2's OrderedDict has no move_to_end)
+            value = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()
@@ -0,0 +1,68 @@
+import multiprocessing
+from .RuleSet import CompiledRuleSet, RulePlan, DEFAULT_MATCH_CACHE_SIZE
+
+#descriptions are sent to the workers in chunks this big
+#to keep the per-message overhead small compared to the regex work
+DEFAULT_CHUNK_SIZE = 2000
+
+#each worker compiles its own copy of the rules once, in _init_worker
+_worker_rule_set = None
+
+def _init_worker(rules, by_source=False, match_cache_size=DEFAULT_MATCH_CACHE_SIZE):
+    global _worker_rule_set
+    if by_source:
+        _worker_rule_set = RulePlan(rules, match_cache_size)
+    else:
+        _worker_rule_set = CompiledRuleSet(rules, match_cache_size)
+
+#returns (key, rule name) for every description in chunk that a rule matches
+def _classify_chunk(chunk):
+    return _classify_with(_worker_rule_set, chunk)
+
+def _classify_with(rule_set, chunk):
+    results = []
+    if isinstance(rule_set, RulePlan):
+        for key, src, description in chunk:
+            rule = rule_set.most_urgent_rule(src, description)
+            if rule is not None:
+                results.append((key, rule.rule_name))
+        return results
+
+    for key, description in chunk:
+        rule = rule_set.most_urgent_rule(description)
+        if rule is not None:
+            results.append((key, rule.rule_name))
+    return results
+
+def _chunks(items, chunk_size):
+    for i in range(0, len(items), chunk_size):
+        yield items[i:i + chunk_size]
+
+#find the most urgent rule for each (key, description) pair using a pool of jobs worker processes
+#the keys are passed through untouched (e.g. split GUIDs) so the workers never see any gnucash objects
+#returns a list of (key, rule name) pairs in the same order as descriptions
+#leaving out descriptions that no rule matches
+#given a RulePlan descriptions are (key, source account, description) triples
+#and each is only matched against the rules for its source account
+def classify_descriptions(descriptions, rules, jobs, chunk_size=DEFAULT_CHUNK_SIZE):
+    by_source = isinstance(rules, RulePlan)
+    if not by_source and not isinstance(rules, CompiledRuleSet):
+        rules = CompiledRuleSet(rules)
+
+    #not worth starting any processes
+    if jobs <= 1 or len(descriptions) <= chunk_size:
+        return _classify_with(rules, descriptions)
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (rules.rules, by_source, rules.match_cache_size))
+    try:
+        results = []
+        for chunk_results in pool.imap(_classify_chunk, _chunks(descriptions, chunk_size)):
+            results.extend(chunk_results)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return results
@@ -0,0 +1,97 @@
+import csv
+import json
+from collections import OrderedDict
+from .AccountUtil import gnc_numeric_to_python_Decimal
+from .SplitDateIndex import split_date
+from .TransactionBatch import TransactionBatch
+
+#the columns of a dry run report, in order
+REPORT_FIELDS = ["split", "date", "description", "amount", "rule", "dest"]
+
+def report_row(split, rule_name, dest_name):
+    trans = split.GetParent()
+    return OrderedDict([("split", split.GetGUID().to_string()),
+            ("date", split_date(split).isoformat()),
+            ("description", trans.GetDescription()),
+            ("amount", str(gnc_numeric_to_python_Decimal(split.GetAmount()))),
+            ("rule", rule_name),
+            ("dest", dest_name)])
+
+"""
+Writes one CSV line per change as soon as it's known
+"""
+class CsvReport(object):
+    def __init__(self, out):
+        self._writer = csv.writer(out)
+        self._writer.writerow(REPORT_FIELDS)
+        self.rows = 0
+
+    def write(self, row):
+        self._writer.writerow(list(row.values()))
+        self.rows += 1
+
+    def close(self):
+        pass
+
+"""
+Writes a JSON array of changes one element at a time
+so the report never has to be held in memory
+"""
+class JsonReport(object):
+    def __init__(self, out):
+        self._out = out
+        self._out.write("[")
+        self.rows = 0
+
+    def write(self, row):
+        if self.rows > 0:
+            self._out.write(",")
+        self._out.write("\n    ")
+        self._out.write(json.dumps(row))
+        self.rows += 1
+
+    def close(self):
+        self._out.write("\n]\n" if self.rows > 0 else "]\n")
+
+#fmt is "csv" or "json"
+def open_report(out, fmt):
+    if fmt == "json":
+        return JsonReport(out)
+    elif fmt == "csv":
+        return CsvReport(out)
+    else:
+        raise ValueError("Unknown report format {}".format(fmt))
+
+#report files ending in .json are JSON, anything else is CSV
+def report_format_for(file_name):
+    if file_name is not None and file_name.lower().endswith(".json"):
+        return "json"
+    return "csv"
+
+"""
+A TransactionBatch that reports the changes it would make instead of making them
+
+Goes through the same checks as TransactionBatch.add so the report
+has exactly the splits a real run would move, but never calls BeginEdit
+"""
+class DryRunBatch(TransactionBatch):
+    def __init__(self, report):
+        TransactionBatch.__init__(self)
+        self.report = report
+
+    def add(self, split, dest_account, rule=None):
+        if not TransactionBatch.add(self, split, dest_account, rule):
+            return False
+        #the split that was queued is the Undefined one, which isn't necessarily split
+        undefined_split = self._by_dest[dest_account.GetGUID().to_string()][1][-1][0]
+        if rule is None:
+            self.report.write(report_row(undefined_split, None, dest_account.GetName()))
+        else:
+            self.report.write(report_row(undefined_split, rule.rule_name, rule.dest))
+        return True
+
+    #nothing to commit--returns the number of splits that would have been moved
+    def apply(self):
+        would_move = len(self)
+        TransactionBatch.__init__(self)
+        return would_move
@@ -0,0 +1,81 @@
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from .eprint import eprint
+
+#bump this whenever the layout of a cache entry changes
+_FORMAT = 1
+
+#where everything accregex caches goes
+def accregex_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "accregex")
+
+def default_cache_dir():
+    return os.path.join(accregex_cache_dir(), "rules")
+
+"""
+Parsed rule files stored on disk keyed by a hash of the file's contents
+
+An entry holds a (rule name, regex, priority, dest, src) tuple for every rule
+already validated by read_account_rules, so a warm start doesn't have to strip comments,
+parse JSON or work out each rule's source account
+The key also covers the accregex version, the entry format and the python version
+(marshal's format depends on it), so anything that could change the result gets a new entry
+"""
+class RuleCache(object):
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self.cache_dir = cache_dir
+
+    def key(self, contents):
+        from . import __version__
+        h = hashlib.sha1()
+        h.update("{}:{}:{}:".format(__version__, _FORMAT, sys.version_info[:2]).encode("utf-8"))
+        h.update(contents)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".rules")
+
+    #returns the list of rule tuples stored for key or None if there isn't a usable entry
+    def load(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        try:
+            stored_key, rule_tuples = marshal.loads(data)
+        except (ValueError, EOFError, TypeError):
+            eprint("Ignoring corrupt rule cache entry {}".format(self._path(key)))
+            return None
+
+        #a truncated or overwritten file can still unmarshal to something
+        if stored_key != key or not isinstance(rule_tuples, list) or \
+                not all(isinstance(t, tuple) and len(t) == 5 for t in rule_tuples):
+            eprint("Ignoring invalid rule cache entry {}".format(self._path(key)))
+            return None
+
+        return rule_tuples
+
+    #failing to write the cache isn't an error--the next run will just parse the file again
+    def store(self, key, rule_tuples):
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            #write to a temporary file and rename it so a reader never sees half an entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(marshal.dumps((key, rule_tuples)))
+                os.rename(tmp_path, self._path(key))
+            except:
+                os.remove(tmp_path)
+                raise
+        except (IOError, OSError) as e:
+            eprint("Could not write rule cache entry: {}".format(e))
@@ -0,0 +1,386 @@
+import re
+from collections import namedtuple
+from .AccountRule import read_account_rules
+from .LruCache import LruCache, DEFAULT_MATCH_CACHE_SIZE
+
+try:
+    import sre_parse
+    from sre_constants import GROUPREF, GROUPREF_EXISTS, AT, ASSERT, ASSERT_NOT, \
+            AT_BEGINNING, AT_BEGINNING_LINE, AT_BEGINNING_STRING
+except ImportError:
+    #python 3.11 moved these into the re package
+    from re import _parser as sre_parse
+    from re._constants import GROUPREF, GROUPREF_EXISTS, AT, ASSERT, ASSERT_NOT, \
+            AT_BEGINNING, AT_BEGINNING_LINE, AT_BEGINNING_STRING
+
+#python 2's re module refuses to compile patterns with more than 99 groups
+#so the combined alternations are split into chunks that stay under the limit
+_MAX_GROUPS = 99
+
+#cached for descriptions no rule matches (None means not cached)
+_NO_MATCH = object()
+
+#a global inline flag group like the (?i) in "^parking.*(?i)"
+_inline_flags_re = re.compile(r"\(\?[aiLmsux]+\)")
+
+def _parse_tree(x):
+    #turn an sre_parse result into nested tuples so two parses can be compared with ==
+    if isinstance(x, sre_parse.SubPattern):
+        return tuple(_parse_tree(i) for i in x.data)
+    elif isinstance(x, (list, tuple)):
+        return tuple(_parse_tree(i) for i in x)
+    else:
+        return x
+
+def _has_group_references(tree):
+    for node in tree:
+        if isinstance(node, tuple):
+            if len(node) > 0 and node[0] in (GROUPREF, GROUPREF_EXISTS):
+                return True
+            if _has_group_references(node):
+                return True
+    return False
+
+#return the pattern text of this rule with its inline flags removed
+#or None if the pattern can't safely be embedded in a larger alternation
+#(the inline flags are moved to the flags argument of the combined pattern instead)
+def _embeddable_pattern(regex):
+    #a comment in a verbose pattern would swallow the rest of the alternation
+    #and named groups or backreferences would break once the groups are renumbered
+    if regex.flags & re.VERBOSE or regex.groupindex:
+        return None
+
+    stripped = _inline_flags_re.sub("", regex.pattern)
+    try:
+        original_tree = _parse_tree(sre_parse.parse(regex.pattern))
+        stripped_tree = _parse_tree(sre_parse.parse(stripped, regex.flags))
+    except (re.error, AssertionError):
+        return None
+
+    #only accept the rewrite if it parses to exactly the same program
+    if original_tree != stripped_tree or _has_group_references(original_tree):
+        return None
+    return stripped
+
+#a run of rules (in urgency order) that are tested with a single regex
+class _Alternation(object):
+    def __init__(self, rules, regex, rule_groups=None):
+        self.rules = rules
+        self.regex = regex
+        #maps the group number wrapping each alternative to that rule's position in self.rules
+        #None if this is a single rule matched with its own regex
+        self._rule_groups = rule_groups
+
+    #return the position in self.rules of the first rule that matches, or None
+    def first_match(self, description):
+        m = self.regex.match(description)
+        if m is None:
+            return None
+        elif self._rule_groups is None:
+            return 0
+        else:
+            #the group wrapping an alternative closes after any groups inside it
+            #so lastindex is always the wrapper of the alternative that matched
+            return self._rule_groups[m.lastindex]
+
+def _mk_alternation(rules, patterns, flags):
+    if len(rules) == 1:
+        return _Alternation(rules, rules[0].regex)
+
+    rule_groups = {}
+    group = 1
+    for i, this_rule in enumerate(rules):
+        rule_groups[group] = i
+        group += 1 + this_rule.regex.groups
+
+    combined = "|".join("({})".format(p) for p in patterns)
+    return _Alternation(rules, re.compile(combined, flags), rule_groups)
+
+#split rules (which all share the same flags) into alternations
+def _mk_alternations(rules, flags):
+    alternations = []
+    chunk_rules, chunk_patterns, chunk_groups = [], [], 0
+
+    def flush():
+        if chunk_rules:
+            alternations.append(_mk_alternation(chunk_rules, chunk_patterns, flags))
+
+    for this_rule in rules:
+        pattern = _embeddable_pattern(this_rule.regex)
+        if pattern is None:
+            #can't be combined--match it on its own
+            flush()
+            chunk_rules, chunk_patterns, chunk_groups = [], [], 0
+            alternations.append(_Alternation([this_rule], this_rule.regex))
+            continue
+
+        groups_needed = 1 + this_rule.regex.groups
+        if chunk_groups + groups_needed > _MAX_GROUPS:
+            flush()
+            chunk_rules, chunk_patterns, chunk_groups = [], [], 0
+
+        chunk_rules.append(this_rule)
+        chunk_patterns.append(pattern)
+        chunk_groups += groups_needed
+
+    flush()
+    return alternations
+
+"""
+A list of AccountRules compiled into a few combined regular expressions
+so each description is scanned once per group of rules instead of once per rule.
+
+Gives the same answers as calling rule.regex.match on every rule:
+matching_rules is equivalent to Account.get_matching_rules and
+most_urgent_rule to get_most_urgent_priority_rule(get_matching_rules(...))
+
+Bank imports repeat the same descriptions over and over (recurring payees, subscriptions)
+so most_urgent_rule remembers its answers for the last match_cache_size descriptions
+The rules can't change once compiled, so the cache never has to be invalidated:
+new rules mean a new CompiledRuleSet with an empty cache
+"""
+class CompiledRuleSet(object):
+    def __init__(self, rules, match_cache_size=DEFAULT_MATCH_CACHE_SIZE):
+        self.rules = list(rules)
+        self._position = dict((id(r), i) for i, r in enumerate(self.rules))
+
+        #get_most_urgent_priority_rule picks the largest priority
+        #and the last rule in file order if several share it
+        by_urgency = sorted(self.rules, key=self._urgency, reverse=True)
+
+        #rules can only share a pattern if they have the same flags
+        #(including inline flags like (?i))
+        flag_groups = []
+        rules_by_flags = {}
+        for this_rule in by_urgency:
+            flags = this_rule.regex.flags
+            if flags not in rules_by_flags:
+                rules_by_flags[flags] = []
+                flag_groups.append(flags)
+            rules_by_flags[flags].append(this_rule)
+
+        #each inner list is in urgency order
+        self._alternations = [_mk_alternations(rules_by_flags[f], f) for f in flag_groups]
+        #number of times a (combined or single) regex has been run
+        self.regex_evaluations = 0
+
+        self.match_cache_size = match_cache_size
+        if match_cache_size > 0:
+            self._match_cache = LruCache(match_cache_size)
+        else:
+            self._match_cache = None
+
+    @property
+    def match_cache_hits(self):
+        return 0 if self._match_cache is None else self._match_cache.hits
+
+    @property
+    def match_cache_misses(self):
+        return 0 if self._match_cache is None else self._match_cache.misses
+
+    def _urgency(self, rule):
+        return (rule.priority, self._position[id(rule)])
+
+    #the most urgent rule in a list of alternations
+    def _top_urgency(self, alternations):
+        return self._urgency(alternations[0].rules[0])
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    #all rules matching description in the order they were passed in
+    def matching_rules(self, description):
+        matches = []
+        evaluations = 0
+        for alternations in self._alternations:
+            for alt in alternations:
+                evaluations += 1
+                first = alt.first_match(description)
+                if first is None:
+                    continue
+                matches.append(alt.rules[first])
+                #the alternatives before the one that matched can't match
+                #but the ones after it still need to be checked
+                for this_rule in alt.rules[first + 1:]:
+                    evaluations += 1
+                    if this_rule.regex.match(description) is not None:
+                        matches.append(this_rule)
+        self.regex_evaluations += evaluations
+
+        matches.sort(key=lambda r: self._position[id(r)])
+        return matches
+
+    #the rule get_most_urgent_priority_rule would choose, or None if no rule matches
+    def most_urgent_rule(self, description):
+        if self._match_cache is None:
+            return self._find_most_urgent_rule(description)
+
+        cached = self._match_cache.get(description)
+        if cached is not None:
+            return None if cached is _NO_MATCH else cached
+
+        best = self._find_most_urgent_rule(description)
+        self._match_cache.put(description, _NO_MATCH if best is None else best)
+        return best
+
+    def _find_most_urgent_rule(self, description):
+        best = None
+        evaluations = 0
+        for alternations in self._alternations:
+            #the groups are ordered by their most urgent rule
+            #so once a match beats that nothing in the remaining groups can win
+            if best is not None and self._urgency(best) > self._top_urgency(alternations):
+                break
+            #alternations are in urgency order so the first match is the best in this group
+            for alt in alternations:
+                evaluations += 1
+                first = alt.first_match(description)
+                if first is not None:
+                    candidate = alt.rules[first]
+                    if best is None or self._urgency(candidate) > self._urgency(best):
+                        best = candidate
+                    break
+        self.regex_evaluations += evaluations
+        return best
+
+def read_compiled_rules(json_file_name, cache=None):
+    return CompiledRuleSet(read_account_rules(json_file_name, cache))
+
+#assertions that always hold at the start of the description, where match() starts
+_START_ASSERTIONS = (AT_BEGINNING, AT_BEGINNING_LINE, AT_BEGINNING_STRING)
+
+def _depends_on_context(tree):
+    for node in tree:
+        if isinstance(node, tuple):
+            if len(node) > 0:
+                if node[0] in (GROUPREF, GROUPREF_EXISTS, ASSERT, ASSERT_NOT):
+                    return True
+                if node[0] == AT and node[1] not in _START_ASSERTIONS:
+                    return True
+            if _depends_on_context(node):
+                return True
+    return False
+
+#a regex that matches the start of every description, e.g. .* or ^
+#if it can match an empty description without looking at what comes after it
+#then it can match the start of any description
+def is_catch_all(regex):
+    if regex.match("") is None:
+        return False
+    try:
+        tree = _parse_tree(sre_parse.parse(regex.pattern, regex.flags))
+    except (re.error, AssertionError):
+        return False
+    return not _depends_on_context(tree)
+
+#two regexes match exactly the same descriptions if they compile to the same program
+def _equivalence_key(regex):
+    try:
+        return (regex.flags, _parse_tree(sre_parse.parse(regex.pattern, regex.flags)))
+    except (re.error, AssertionError):
+        return (regex.flags, regex.pattern)
+
+CATCH_ALL = "catch-all"
+DUPLICATE = "duplicate"
+
+#rule can never be chosen because by (a more urgent rule for the same source account) always wins
+#reason is CATCH_ALL or DUPLICATE
+ShadowedRule = namedtuple("ShadowedRule", ["rule", "by", "reason"])
+
+"""
+AccountRules split up by source account, each part compiled into its own CompiledRuleSet
+
+A split is only ever matched against the rules for the account it's in
+so the cost per split depends on how many rules that account has, not on the size of the rule file
+
+Rules that can never be chosen are left out of the compiled rule sets and listed in shadowed:
+    every rule less urgent than a catch-all (a regex like .* that matches every description)
+    and every rule with the same regex as a more urgent one
+"""
+class RulePlan(object):
+    def __init__(self, rules, match_cache_size=DEFAULT_MATCH_CACHE_SIZE):
+        self.rules = list(rules)
+        self.match_cache_size = match_cache_size
+        self.shadowed = []
+
+        by_source = {}
+        for this_rule in self.rules:
+            by_source.setdefault(this_rule.src, []).append(this_rule)
+
+        self._rule_sets = {}
+        for src, rules in by_source.items():
+            self._rule_sets[src] = CompiledRuleSet(self._reachable(rules), match_cache_size)
+
+    #the rules that can be chosen, in file order
+    #adds the others to self.shadowed
+    def _reachable(self, rules):
+        position = dict((id(r), i) for i, r in enumerate(rules))
+        #same order as CompiledRuleSet: the rule get_most_urgent_priority_rule prefers first
+        by_urgency = sorted(rules, key=lambda r: (r.priority, position[id(r)]), reverse=True)
+
+        reachable = []
+        first_with = {}
+        catch_all = None
+        for this_rule in by_urgency:
+            if catch_all is not None:
+                self.shadowed.append(ShadowedRule(this_rule, catch_all, CATCH_ALL))
+                continue
+
+            key = _equivalence_key(this_rule.regex)
+            if key in first_with:
+                self.shadowed.append(ShadowedRule(this_rule, first_with[key], DUPLICATE))
+                continue
+            first_with[key] = this_rule
+            reachable.append(this_rule)
+
+            if is_catch_all(this_rule.regex):
+                catch_all = this_rule
+
+        reachable.sort(key=lambda r: position[id(r)])
+        return reachable
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    #the fully qualified names of every source account
+    def sources(self):
+        return self._rule_sets.keys()
+
+    #the compiled rules for the source account with this fully qualified name
+    #an account no rule names gets an empty rule set
+    def for_source(self, src):
+        rule_set = self._rule_sets.get(src)
+        if rule_set is None:
+            return CompiledRuleSet([])
+        return rule_set
+
+    #the rules that can never be chosen
+    def unreachable_rules(self):
+        return [s.rule for s in self.shadowed]
+
+    #the rule get_most_urgent_priority_rule would choose from the rules for src
+    #or None if none of them match
+    def most_urgent_rule(self, src, description):
+        return self.for_source(src).most_urgent_rule(description)
+
+    #total number of times a regex has been run by any of the rule sets
+    @property
+    def regex_evaluations(self):
+        return sum(r.regex_evaluations for r in self._rule_sets.values())
+
+    @property
+    def match_cache_hits(self):
+        return sum(r.match_cache_hits for r in self._rule_sets.values())
+
+    @property
+    def match_cache_misses(self):
+        return sum(r.match_cache_misses for r in self._rule_sets.values())
+
+def read_rule_plan(json_file_name, cache=None, match_cache_size=DEFAULT_MATCH_CACHE_SIZE):
+    return RulePlan(read_account_rules(json_file_name, cache), match_cache_size)
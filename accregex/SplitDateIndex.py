@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date
+
+#the date arguments from Args are datetimes but transaction dates are dates
+#and python won't compare the two
+def as_date(d):
+    if isinstance(d, datetime):
+        return d.date()
+    return d
+
+#the posted date of the transaction a split belongs to
+def split_date(split):
+    return date.fromtimestamp(split.parent.GetDate())
+
+"""
+A list of splits sorted by the posted date of their transaction
+so date range queries are a pair of binary searches instead of a scan over every split
+"""
+class SplitDateIndex(object):
+    def __init__(self, splits):
+        splits = list(splits)
+        ordinals = [split_date(s).toordinal() for s in splits]
+        #gnucash usually returns splits in date order already, which python's sort handles in linear time
+        #the sort is stable so splits on the same day keep their original order
+        order = sorted(range(len(splits)), key=ordinals.__getitem__)
+
+        self._ordinals = [ordinals[i] for i in order]
+        self._splits = [splits[i] for i in order]
+
+    def __len__(self):
+        return len(self._splits)
+
+    def __iter__(self):
+        return iter(self._splits)
+
+    #the slice of the index between start_date and end_date
+    def _range(self, start_date, end_date):
+        if start_date is None:
+            lo = 0
+        else:
+            lo = bisect_left(self._ordinals, as_date(start_date).toordinal())
+
+        if end_date is None:
+            hi = len(self._ordinals)
+        else:
+            hi = bisect_right(self._ordinals, as_date(end_date).toordinal())
+        return (lo, hi)
+
+    #splits posted between start_date and end_date (INCLUSIVE)
+    #either end can be None to leave that end of the range open
+    def between(self, start_date=None, end_date=None):
+        lo, hi = self._range(start_date, end_date)
+        return self._splits[lo:hi]
+
+    #the posted dates (as ordinals) of the splits between returns
+    def ordinals_between(self, start_date=None, end_date=None):
+        lo, hi = self._range(start_date, end_date)
+        return self._ordinals[lo:hi]
+
+    def after(self, p_date):
+        return self.between(start_date=p_date)
+
+    def before(self, p_date):
+        return self.between(end_date=p_date)
+
+"""
+One SplitDateIndex per account, built the first time it's asked for
+Only valid for as long as the session the accounts came from is open and unchanged
+"""
+class SplitDateIndexCache(object):
+    def __init__(self):
+        self._indexes = {}
+
+    def for_account(self, account):
+        key = account.GetGUID().to_string()
+        index = self._indexes.get(key)
+        if index is None:
+            index = SplitDateIndex(account.GetSplitList())
+            self._indexes[key] = index
+        return index
@@ -0,0 +1,194 @@
+from array import array
+from .AccountUtil import gnc_numeric_sign
+from .SplitDateIndex import as_date, split_date
+
+try:
+    import numpy
+except ImportError:
+    #filtering falls back to plain python (see _python_candidates)
+    numpy = None
+
+#python 2's array has no 'q'; 'l' is 64 bits everywhere that matters (LP64)
+try:
+    array("q")
+    _INT64 = "q"
+except ValueError:
+    _INT64 = "l"
+
+#no description
+NONE = -1
+
+#which side of a transaction is in an Undefined account (bit flags, see Account._undefined_sides)
+SELF = 1
+OTHER = 2
+#not looked at any further
+NOT_DEBIT = -1
+
+#ways SplitSnapshot.candidates can filter the arrays, both give identical results
+PYTHON = "python"
+NUMPY = "numpy"
+FILTER_ENGINES = [PYTHON, NUMPY]
+
+def available_filter_engines():
+    return [e for e in FILTER_ENGINES if e != NUMPY or numpy is not None]
+
+DEFAULT_FILTER_ENGINE = NUMPY if numpy is not None else PYTHON
+
+#each filter returns (positions of the candidates, not debits, outside the dates, no Undefined side)
+#start and end are ordinals or None
+#a split is a debit if its amount's numerator is negative, like AccountUtil.gnc_numeric_sign
+def _python_candidates(snapshot, start, end):
+    found = []
+    not_debits, outside_dates, defined = 0, 0, 0
+    amount_num = snapshot.amount_num
+    undefined_side = snapshot.undefined_side
+    posted = snapshot.posted
+    for i in range(len(snapshot)):
+        if amount_num[i] >= 0:
+            not_debits += 1
+        elif undefined_side[i] == 0:
+            defined += 1
+        elif (start is not None and posted[i] < start) or (end is not None and posted[i] > end):
+            outside_dates += 1
+        else:
+            found.append(i)
+    return (found, not_debits, outside_dates, defined)
+
+#a view of an array.array without copying it (the typecodes are the same in both)
+def _as_numpy(a):
+    return numpy.frombuffer(a, dtype=numpy.dtype(a.typecode))
+
+#the same filter as _python_candidates as a few operations over whole arrays
+def _numpy_candidates(snapshot, start, end):
+    n = len(snapshot)
+    if n == 0:
+        return ([], 0, 0, 0)
+    debit = _as_numpy(snapshot.amount_num) < 0
+    undefined_side = _as_numpy(snapshot.undefined_side)
+    undefined = debit & (undefined_side > 0)
+
+    posted = _as_numpy(snapshot.posted)
+    in_dates = numpy.ones(n, dtype=bool)
+    if start is not None:
+        in_dates &= posted >= start
+    if end is not None:
+        in_dates &= posted <= end
+
+    found = numpy.flatnonzero(undefined & in_dates)
+    not_debits = n - int(numpy.count_nonzero(debit))
+    defined = int(numpy.count_nonzero(debit & (undefined_side == 0)))
+    outside_dates = int(numpy.count_nonzero(undefined & ~in_dates))
+    return (found.tolist(), not_debits, outside_dates, defined)
+
+_FILTERS = {PYTHON: _python_candidates, NUMPY: _numpy_candidates}
+
+"""
+The parts of a list of splits that classifying them needs, read out of the live objects once
+and kept in parallel arrays (one entry per split, in the order the splits were passed in):
+    amount_num: the amount's numerator, negative for a debit
+    undefined_side: SELF and/or OTHER if that side is in an Undefined account, NOT_DEBIT for anything but a debit
+    posted: ordinal of the posted date
+    description: index into descriptions, which holds every distinct description once
+
+Only debits can be classified, so for every other split only the amount is read
+and only splits with an Undefined side have their posted date and description read
+
+Filtering and matching then run on plain integers (with numpy if it's installed)
+and each distinct description is matched against the rules once, however many splits share it
+The live split is only needed again to change it (see live_undefined_splits)
+"""
+class SplitSnapshot(object):
+    __slots__ = ("amount_num", "undefined_side", "posted", "description", "descriptions", "_splits")
+
+    #ordinals are the posted dates of splits if they're already known (see SplitDateIndex.ordinals_between)
+    def __init__(self, splits, ordinals=None):
+        self.amount_num = array(_INT64)
+        self.undefined_side = array("b")
+        self.posted = array("l")
+        self.description = array("l")
+        self.descriptions = []
+        #the splits themselves are only kept to hand them back for the final writes
+        self._splits = splits
+
+        description_ids = {}
+        #this loop touches every split so the attribute lookups are done once up front
+        add_num = self.amount_num.append
+        add_side = self.undefined_side.append
+        add_posted = self.posted.append
+        add_description = self.description.append
+
+        for i, this_split in enumerate(splits):
+            amount = this_split.GetAmount()
+            add_num(amount.num())
+            if gnc_numeric_sign(amount) != -1:
+                add_side(NOT_DEBIT)
+                add_posted(0)
+                add_description(NONE)
+                continue
+
+            side = SELF if this_split.GetAccount().name == "Undefined" else 0
+            other = this_split.GetOtherSplit()
+            if other is not None and other.GetAccount().name == "Undefined":
+                side |= OTHER
+            add_side(side)
+
+            if side == 0:
+                add_posted(0)
+                add_description(NONE)
+                continue
+            add_posted(split_date(this_split).toordinal() if ordinals is None else ordinals[i])
+            description = this_split.GetParent().GetDescription()
+            description_id = description_ids.get(description)
+            if description_id is None:
+                description_id = description_ids[description] = len(self.descriptions)
+                self.descriptions.append(description)
+            add_description(description_id)
+
+    def __len__(self):
+        return len(self.amount_num)
+
+    #positions of the debits between start_date and end_date (INCLUSIVE, either can be None)
+    #with an Undefined side
+    #(a debit without an Undefined side is counted as that whatever its date, since its date isn't read)
+    #engine is one of FILTER_ENGINES, DEFAULT_FILTER_ENGINE if None
+    def candidates(self, start_date=None, end_date=None, stats=None, engine=None):
+        if engine is None:
+            engine = DEFAULT_FILTER_ENGINE
+        if engine not in available_filter_engines():
+            raise ValueError("Filter engine {} isn't available (have {})"
+                    .format(engine, ", ".join(available_filter_engines())))
+        start = as_date(start_date)
+        end = as_date(end_date)
+        start = None if start is None else start.toordinal()
+        end = None if end is None else end.toordinal()
+
+        found, not_debits, outside_dates, defined = _FILTERS[engine](self, start, end)
+        if stats is not None:
+            stats.count("splits_scanned", len(self))
+            stats.count("splits_filtered_not_debit", not_debits)
+            stats.count("splits_filtered_date", outside_dates)
+            stats.count("splits_filtered_not_undefined", defined)
+        return found
+
+    #the most urgent rule for each of positions (None if no rule matches)
+    #rule_set.most_urgent_rule is only called once per distinct description
+    def classify(self, positions, rule_set):
+        by_description = {}
+        rules = []
+        for i in positions:
+            d = self.description[i]
+            if d in by_description:
+                rules.append(by_description[d])
+            else:
+                rule = by_description[d] = rule_set.most_urgent_rule(self.descriptions[d])
+                rules.append(rule)
+        return rules
+
+    #the live Undefined split(s) of the split at position, like Account._undefined_sides
+    def live_undefined_splits(self, position):
+        this_split = self._splits[position]
+        side = self.undefined_side[position]
+        if side & SELF:
+            yield this_split
+        if side & OTHER:
+            yield this_split.GetOtherSplit()
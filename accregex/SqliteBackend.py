@@ -0,0 +1,187 @@
+import os
+import socket
+import sqlite3
+from .AccountIndex import AccountIndex
+from .XmlBackend import XmlAccount, XmlTransaction, XmlSplit, XmlBook, XmlNumeric, _parse_timestamp
+
+"""
+Reads and writes GnuCash books stored in SQLite without going through the gnucash bindings
+
+The book is read with a few set based queries: every account (the tree is small)
+and only the transactions and splits that touch one of the requested source accounts
+The accounts, transactions and splits are the same objects XmlBackend builds,
+so accregex.Account can't tell the two apart
+
+Saving doesn't rewrite anything: every moved split is updated with one executemany
+inside a single database transaction, so only the changed rows are touched
+and either every change is written or none are
+"""
+
+"""Thrown if the book is locked by another program (a row in gnucash's gnclock table)"""
+class SqliteBookLockedException(BaseException):
+    def __init__(self,*args,**kwargs):
+        BaseException.__init__(self,*args,**kwargs)
+
+"""Thrown if the book can't be read or the changes can't be written back"""
+class SqliteBackendException(BaseException):
+    def __init__(self,*args,**kwargs):
+        BaseException.__init__(self,*args,**kwargs)
+
+#gnucash 2.6 and later write "2016-05-29 10:59:00", earlier versions "20160529105900"
+def _parse_sql_timestamp(s):
+    if s is None:
+        return None
+    s = str(s).strip()
+    if len(s) == 14 and s.isdigit():
+        s = "{}-{}-{} {}:{}:{}".format(s[0:4], s[4:6], s[6:8], s[8:10], s[10:12], s[12:14])
+    return _parse_timestamp(s)
+
+#seconds is what sqlite's strftime('%s', ...) made of s, None if it couldn't read it
+def _sql_timestamp(s, seconds):
+    if seconds is not None:
+        return int(seconds)
+    return _parse_sql_timestamp(s)
+
+#?, ?, ? for n parameters
+def _placeholders(n):
+    return ", ".join(["?"] * n)
+
+"""
+A session on a GnuCash SQLite file
+
+Pass the fully qualified names of the accounts whose transactions are needed as source_accounts
+to skip every other transaction while reading (None loads them all)
+Unless read_only, the book is locked the same way gnucash does it (a row in the gnclock table)
+"""
+class SqliteSession(object):
+    def __init__(self, file_name, read_only=False, source_accounts=None):
+        self.file_name = os.path.abspath(file_name)
+        self.read_only = read_only
+        self._locked = False
+        if not os.path.exists(self.file_name):
+            #sqlite3.connect would quietly create an empty database
+            raise SqliteBackendException("No such book {}".format(file_name))
+        #transactions are started and ended explicitly (see _transaction)
+        #python 2's sqlite3 would otherwise commit on its own before the CREATE TABLE in _lock
+        self._conn = sqlite3.connect(self.file_name, isolation_level=None)
+        #text columns come back as str on python 2 too
+        self._conn.text_factory = str
+
+        try:
+            if not read_only:
+                self._lock()
+            self.book = self._read(source_accounts)
+        except:
+            self.end()
+            raise
+
+    #run f(cursor) in a database transaction that holds the write lock from the start
+    #committed if f returns, rolled back if it raises
+    def _transaction(self, f):
+        cursor = self._conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            result = f(cursor)
+        except:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+        return result
+
+    def _lock(self):
+        #the write lock is taken first so two runs can't both see an empty gnclock
+        self._transaction(self._take_lock)
+        self._locked = True
+
+    def _take_lock(self, cursor):
+        cursor.execute("CREATE TABLE IF NOT EXISTS gnclock (Hostname varchar(255), PID int)")
+        if cursor.execute("SELECT COUNT(*) FROM gnclock").fetchone()[0] > 0:
+            raise SqliteBookLockedException("Cannot open {}, file is locked.".format(self.file_name))
+        cursor.execute("INSERT INTO gnclock (Hostname, PID) VALUES (?, ?)", (socket.gethostname(), os.getpid()))
+
+    def _unlock(self):
+        if self._locked:
+            self._conn.execute("DELETE FROM gnclock WHERE Hostname = ? AND PID = ?",
+                    (socket.gethostname(), os.getpid()))
+            self._locked = False
+
+    def _read(self, source_accounts):
+        book = XmlBook()
+        cursor = self._conn.cursor()
+        try:
+            for guid, name, account_type, parent_guid in cursor.execute(
+                    "SELECT guid, name, account_type, parent_guid FROM accounts"):
+                book._accounts[guid] = XmlAccount(guid, name or "", account_type, parent_guid)
+        except sqlite3.DatabaseError as e:
+            raise SqliteBackendException("Cannot read accounts from {}: {}".format(self.file_name, e))
+        book._link_accounts()
+
+        #the transactions with a split in one of the source accounts
+        if source_accounts is None:
+            wanted, params = "", ()
+        else:
+            index = AccountIndex(book._root)
+            source_guids = [index.lookup(n).GetGUID().to_string()
+                    for n in sorted(set(source_accounts)) if index.lookup(n) is not None]
+            wanted = " WHERE {} IN (SELECT tx_guid FROM splits WHERE account_guid IN ({}))" \
+                    .format("{}", _placeholders(len(source_guids)))
+            params = tuple(source_guids)
+
+        #sqlite turns the dates into seconds much faster than strptime can
+        transactions = {}
+        for guid, post_date, posted, enter_date, entered, description in cursor.execute(
+                "SELECT guid, post_date, strftime('%s', post_date), enter_date, strftime('%s', enter_date), "
+                "description FROM transactions" + wanted.format("guid"), params):
+            transactions[guid] = XmlTransaction(guid, _sql_timestamp(post_date, posted),
+                    _sql_timestamp(enter_date, entered), description or "")
+
+        #ordered by rowid so each transaction's splits are in the order gnucash wrote them
+        for guid, tx_guid, account_guid, value_num, value_denom, quantity_num, quantity_denom in cursor.execute(
+                "SELECT guid, tx_guid, account_guid, value_num, value_denom, quantity_num, quantity_denom "
+                "FROM splits" + wanted.format("tx_guid") + " ORDER BY rowid", params):
+            trans = transactions.get(tx_guid)
+            if trans is None:
+                continue
+            account = book._accounts.get(account_guid)
+            if account is None:
+                raise SqliteBackendException("Split in transaction {} refers to unknown account {}"
+                        .format(tx_guid, account_guid))
+            XmlSplit(book, trans, guid, account, XmlNumeric(value_num, value_denom),
+                    XmlNumeric(quantity_num, quantity_denom))
+        return book
+
+    #write every moved split back in one database transaction
+    #a row is only updated if it's still in the account it was read from
+    #so a book changed by someone else since it was read is left alone
+    def save(self):
+        if self.read_only:
+            raise SqliteBackendException("Cannot save a read only session")
+        changes = self.book.changes()
+        if not changes:
+            return
+
+        rows = [(new_guid, split_guid, self.book._moves[split_guid]._original_account.GetGUID().to_string())
+                for split_guid, new_guid in changes.items()]
+        def update(cursor):
+            cursor.executemany("UPDATE splits SET account_guid = ? WHERE guid = ? AND account_guid = ?", rows)
+            if cursor.rowcount != len(rows):
+                #raising rolls every update back
+                raise SqliteBackendException("Could only write {} of {} changes to {}"
+                        .format(cursor.rowcount, len(rows), self.file_name))
+        try:
+            self._transaction(update)
+        except sqlite3.DatabaseError as e:
+            raise SqliteBackendException("Cannot write changes to {}: {}".format(self.file_name, e))
+
+        #the database now matches the book
+        for this_split in self.book._moves.values():
+            this_split._original_account = this_split.GetAccount()
+        self.book._moves = {}
+
+    def end(self):
+        if self._conn is not None:
+            try:
+                self._unlock()
+            finally:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,99 @@
+import json
+from collections import OrderedDict
+from timeit import default_timer
+
+class _Timer(object):
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stats.add_time(self._name, default_timer() - self._start)
+        return False
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+"""
+Timers and counters for one run
+
+Timers are used as context managers:
+    with stats.timer("check_accounts_exist"):
+        ...
+Counters are meant to be bumped once per stage with a total
+rather than once per split, so the cost is the same whether stats are enabled or not
+"""
+class Stats(object):
+    enabled = True
+
+    def __init__(self):
+        #both keep the order stages were first seen in
+        self.timers = OrderedDict()
+        self.counters = OrderedDict()
+        #number of splits each rule was applied to
+        self.rule_matches = OrderedDict()
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def count_rule(self, rule_name, n=1):
+        self.rule_matches[rule_name] = self.rule_matches.get(rule_name, 0) + n
+
+    def to_dict(self):
+        return OrderedDict([("timers", self.timers),
+                ("counters", self.counters),
+                ("rule_matches", self.rule_matches)])
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def write_json(self, file_name):
+        with open(file_name, "w") as f:
+            f.write(self.to_json())
+            f.write("\n")
+
+    #human readable summary
+    def summary(self):
+        lines = ["Timers (seconds):"]
+        lines += ["    {:<32}{:>12.6f}".format(k, v) for k, v in self.timers.items()]
+        lines.append("Counters:")
+        lines += ["    {:<32}{:>12}".format(k, v) for k, v in self.counters.items()]
+        if self.rule_matches:
+            lines.append("Rule matches:")
+            lines += ["    {:<32}{:>12}".format(k, v) for k, v in self.rule_matches.items()]
+        return "\n".join(lines)
+
+"""
+Stats that don't record anything, used when stats are disabled
+"""
+class _NullStats(Stats):
+    enabled = False
+    _timer = _NullTimer()
+
+    def timer(self, name):
+        return self._timer
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def count_rule(self, rule_name, n=1):
+        pass
+
+NO_STATS = _NullStats()
@@ -0,0 +1,133 @@
+from .SplitTransactionsNotSupportedException import SplitTransactionsNotSupportedException
+
+#qof_event_suspend/qof_event_resume stop gnucash from emitting (and handling) an event for every edit
+#not every version of the python bindings exposes them, in which case events are left alone
+def _event_functions():
+    try:
+        from gnucash import gnucash_core_c
+    except ImportError:
+        return (None, None)
+    suspend = getattr(gnucash_core_c, "qof_event_suspend", None)
+    resume = getattr(gnucash_core_c, "qof_event_resume", None)
+    if suspend is None or resume is None:
+        return (None, None)
+    return (suspend, resume)
+
+def _guid(obj):
+    return obj.GetGUID().to_string()
+
+#move each split of moves back into the account it came from, committing each of transactions
+def _restore(transactions, moves):
+    accounts = []
+    seen = set()
+    for _, original_account in moves:
+        if _guid(original_account) not in seen:
+            seen.add(_guid(original_account))
+            original_account.BeginEdit()
+            accounts.append(original_account)
+    try:
+        for trans, (this_split, original_account) in zip(transactions, moves):
+            trans.BeginEdit()
+            this_split.SetAccount(original_account)
+            trans.CommitEdit()
+    finally:
+        for account in accounts:
+            account.CommitEdit()
+
+"""
+Split reassignments that are queued up and then committed together
+
+Each destination account is opened for editing once for the whole batch
+instead of once per split (every account commit makes gnucash rebalance the account)
+If anything fails the whole batch is undone: transactions that haven't been committed yet are rolled back
+and the splits of the ones that have are moved back to the accounts they came from
+"""
+class TransactionBatch(object):
+    def __init__(self):
+        #dest account GUID -> (dest account, [(Undefined split to move into it, the account it's in now)])
+        self._by_dest = {}
+        #dest account GUIDs in the order they were first used
+        self._dest_order = []
+        #GUIDs of splits already queued
+        self._queued = set()
+
+    def __len__(self):
+        return len(self._queued)
+
+    #queue moving the Undefined side of split's transaction into dest_account
+    #follows the same rules as Account.modify_transaction:
+    #only 2-split transactions are supported and nothing happens unless exactly one split is Undefined
+    #returns True if a change was queued
+    #rule is the AccountRule that chose dest_account, for subclasses that report changes
+    def add(self, split, dest_account, rule=None):
+        trans = split.GetParent()
+        trans_splits = trans.GetSplitList()
+        #more than 2 splits means a "split" transaction
+        #i.e. between 3 or more accounts
+        if len(trans_splits) != 2:
+            raise SplitTransactionsNotSupportedException()
+
+        undef_splits = [s for s in trans_splits if s.GetAccount().name == "Undefined"]
+        if len(undef_splits) != 1:
+            return False
+
+        split_key = _guid(undef_splits[0])
+        if split_key in self._queued:
+            return False
+        self._queued.add(split_key)
+
+        dest_key = _guid(dest_account)
+        if dest_key not in self._by_dest:
+            self._by_dest[dest_key] = (dest_account, [])
+            self._dest_order.append(dest_key)
+        self._by_dest[dest_key][1].append((undef_splits[0], undef_splits[0].GetAccount()))
+        return True
+
+    #make every queued change, returns the number of splits that were moved
+    def apply(self):
+        suspend_events, resume_events = _event_functions()
+        open_accounts = []
+        open_transactions = []
+        #(split, account it came from) in the same order as open_transactions
+        moves = []
+        committed = 0
+
+        if suspend_events is not None:
+            suspend_events()
+        try:
+            try:
+                for dest_key in self._dest_order:
+                    dest_account, splits = self._by_dest[dest_key]
+                    dest_account.BeginEdit()
+                    open_accounts.append(dest_account)
+
+                    for this_split, original_account in splits:
+                        trans = this_split.GetParent()
+                        trans.BeginEdit()
+                        open_transactions.append(trans)
+                        moves.append((this_split, original_account))
+                        this_split.SetAccount(dest_account)
+
+                for trans in open_transactions:
+                    trans.CommitEdit()
+                    committed += 1
+            except:
+                #put every split that hasn't been committed yet back where it was
+                for trans in open_transactions[committed:]:
+                    trans.RollbackEdit()
+                #and move the ones that have back by hand
+                _restore(open_transactions[:committed], moves[:committed])
+                raise
+            finally:
+                #accounts can't be rolled back, but once their transactions are
+                #they have nothing left to commit
+                for dest_account in open_accounts:
+                    dest_account.CommitEdit()
+        finally:
+            if resume_events is not None:
+                resume_events()
+
+        self._by_dest = {}
+        self._dest_order = []
+        self._queued = set()
+        return committed
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from .eprint import eprint
+from .SplitDateIndex import as_date, split_date
+
+#bump this whenever the layout of the state file changes
+_FORMAT = 1
+
+#the state of incremental runs is kept next to the book
+def state_file_for(book_file):
+    return book_file + ".accregex-state"
+
+#changing the rules (or upgrading accregex) means every split has to be looked at again
+def rule_file_hash(rule_file):
+    from . import __version__
+    h = hashlib.sha1()
+    h.update("{}:{}:".format(__version__, _FORMAT).encode("utf-8"))
+    with open(rule_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+#when the transaction a split belongs to was entered (not posted), in seconds
+def split_entered(split):
+    return split.parent.GetDateEntered()
+
+def _date_str(d):
+    d = as_date(d)
+    return None if d is None else d.isoformat()
+
+def _parse_date(s):
+    if s is None:
+        return None
+    return date(*[int(x) for x in s.split("-")])
+
+def _trans_guid(split):
+    return split.parent.GetGUID().to_string()
+
+"""
+How far earlier runs on a book got, so the next run only has to look at splits added since
+
+Every split in the date range a run scanned was handled by it, whether a rule matched or not
+(one that didn't match won't match the same rules the next night either)
+A split is new to the next run if its transaction was
+    posted after the latest posted date scanned,
+    or entered after the latest entry time scanned (an import of old transactions)
+Transactions on those two boundaries are told apart by GUID, so only their GUIDs are stored
+
+The watermark only applies to runs with the same rules and date range,
+anything else starts over with a full scan
+"""
+class Watermark(object):
+    def __init__(self, rule_hash=None, start_date=None, end_date=None,
+            posted=None, posted_guids=(), entered=None, entered_guids=()):
+        self.rule_hash = rule_hash
+        self.start_date = as_date(start_date)
+        self.end_date = as_date(end_date)
+        #None means nothing has been scanned yet
+        self.posted = posted
+        self.posted_guids = frozenset(posted_guids)
+        self.entered = entered
+        self.entered_guids = frozenset(entered_guids)
+
+        #how far this run got, see record
+        self._next_posted = posted
+        self._next_posted_guids = set(posted_guids)
+        self._next_entered = entered
+        self._next_entered_guids = set(entered_guids)
+
+    def is_full_scan(self):
+        return self.posted is None
+
+    def applies_to(self, rule_hash, start_date, end_date):
+        return self.rule_hash == rule_hash and \
+                self.start_date == as_date(start_date) and \
+                self.end_date == as_date(end_date)
+
+    def _seen_older(self, split):
+        entered = split_entered(split)
+        return entered < self.entered or \
+                (entered == self.entered and _trans_guid(split) in self.entered_guids)
+
+    #the splits of a SplitDateIndex between start_date and end_date that earlier runs haven't scanned
+    def unseen(self, date_index, start_date, end_date):
+        if self.is_full_scan():
+            return date_index.between(start_date, end_date)
+
+        start_date = as_date(start_date)
+        end_date = as_date(end_date)
+
+        #everything posted after the watermark is new
+        day_after = self.posted + timedelta(days=1)
+        if start_date is None or start_date < day_after:
+            newer = date_index.between(day_after, end_date)
+        else:
+            newer = date_index.between(start_date, end_date)
+
+        #only the splits the last run didn't see on the boundary day
+        if (start_date is None or start_date <= self.posted) and (end_date is None or self.posted <= end_date):
+            boundary = [s for s in date_index.between(self.posted, self.posted)
+                    if _trans_guid(s) not in self.posted_guids]
+        else:
+            boundary = []
+
+        #anything earlier is only new if it was entered after the last run
+        day_before = self.posted - timedelta(days=1)
+        if end_date is None or end_date > day_before:
+            older = date_index.between(start_date, day_before)
+        else:
+            older = date_index.between(start_date, end_date)
+        older = [s for s in older if not self._seen_older(s)]
+
+        return older + boundary + newer
+
+    #remember that splits have been scanned by this run
+    def record(self, splits):
+        for this_split in splits:
+            posted = split_date(this_split)
+            if self._next_posted is None or posted > self._next_posted:
+                self._next_posted = posted
+                self._next_posted_guids = set()
+            if posted == self._next_posted:
+                self._next_posted_guids.add(_trans_guid(this_split))
+
+            entered = split_entered(this_split)
+            if self._next_entered is None or entered > self._next_entered:
+                self._next_entered = entered
+                self._next_entered_guids = set()
+            if entered == self._next_entered:
+                self._next_entered_guids.add(_trans_guid(this_split))
+
+    #the watermark the next run should start from
+    def advanced(self):
+        return Watermark(self.rule_hash, self.start_date, self.end_date,
+                self._next_posted, self._next_posted_guids,
+                self._next_entered, self._next_entered_guids)
+
+    def to_dict(self):
+        return {"format": _FORMAT,
+                "rule_hash": self.rule_hash,
+                "start_date": _date_str(self.start_date),
+                "end_date": _date_str(self.end_date),
+                "posted": _date_str(self.posted),
+                "posted_guids": sorted(self.posted_guids),
+                "entered": self.entered,
+                "entered_guids": sorted(self.entered_guids)}
+
+    @staticmethod
+    def from_dict(d):
+        return Watermark(d["rule_hash"], _parse_date(d["start_date"]), _parse_date(d["end_date"]),
+                _parse_date(d["posted"]), d["posted_guids"], d["entered"], d["entered_guids"])
+
+    #write to a temporary file and rename it so an interrupted run never leaves half a state file
+    def save(self, state_file):
+        state_dir = os.path.dirname(os.path.abspath(state_file))
+        fd, tmp_path = tempfile.mkstemp(dir=state_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.to_dict(), f, indent=4, sort_keys=True)
+            os.rename(tmp_path, state_file)
+        except:
+            os.remove(tmp_path)
+            raise
+
+#the watermark to use for a run with these rules and dates
+#a missing, unreadable or outdated state file means a full scan
+def load_watermark(state_file, rule_hash, start_date, end_date=None):
+    fresh = Watermark(rule_hash, start_date, end_date)
+    try:
+        with open(state_file, "r") as f:
+            d = json.load(f)
+    except (IOError, OSError):
+        return fresh
+    except ValueError:
+        eprint("Ignoring corrupt state file {}".format(state_file))
+        return fresh
+
+    try:
+        if d.get("format") != _FORMAT:
+            return fresh
+        watermark = Watermark.from_dict(d)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        eprint("Ignoring invalid state file {}".format(state_file))
+        return fresh
+
+    if not watermark.applies_to(rule_hash, start_date, end_date):
+        return fresh
+    return watermark
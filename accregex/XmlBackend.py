@@ -0,0 +1,453 @@
+import calendar
+import gzip
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from .AccountIndex import AccountIndex
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+"""
+A pure python reader and writer for GnuCash's (usually gzipped) XML files
+
+Implements the parts of the gnucash bindings' Session, Book, Account, Transaction, Split
+and GncNumeric interfaces that accregex.Account uses, so a run doesn't need python-gnucash
+or gnucash-env at all
+
+The file is read with iterparse: the whole account tree is kept but only the transactions
+that touch one of the requested source accounts are, everything else is thrown away as it's read
+Saving streams the original file to a new one, only changing the split:account
+of splits that were moved to another account
+"""
+
+_GNC = "{http://www.gnucash.org/XML/gnc}"
+_ACT = "{http://www.gnucash.org/XML/act}"
+_TRN = "{http://www.gnucash.org/XML/trn}"
+_SPLIT = "{http://www.gnucash.org/XML/split}"
+_TS = "{http://www.gnucash.org/XML/ts}"
+
+_BOOK_TAG = _GNC + "book"
+_ACCOUNT_TAG = _GNC + "account"
+_TRANSACTION_TAG = _GNC + "transaction"
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+"""Thrown if the book is locked by another program (a <file>.LCK file exists)"""
+class XmlBookLockedException(BaseException):
+    def __init__(self,*args,**kwargs):
+        BaseException.__init__(self,*args,**kwargs)
+
+"""Thrown if the book can't be read or the changes can't be written back"""
+class XmlBackendException(BaseException):
+    def __init__(self,*args,**kwargs):
+        BaseException.__init__(self,*args,**kwargs)
+
+class XmlGUID(object):
+    def __init__(self, guid):
+        self._guid = guid
+
+    def to_string(self):
+        return self._guid
+
+class XmlNumeric(object):
+    def __init__(self, num=0, denom=1):
+        self._num = num
+        self._denom = denom
+
+    def num(self):
+        return self._num
+
+    def denom(self):
+        return self._denom
+
+    def negative_p(self):
+        return self._num < 0
+
+#"500000/100" -> XmlNumeric(500000, 100)
+def _parse_numeric(s):
+    num, _, denom = s.strip().partition("/")
+    return XmlNumeric(int(num), int(denom or 1))
+
+#"2001-05-27 00:00:00 -0700" -> seconds since the epoch
+def _parse_timestamp(s):
+    s = s.strip()
+    seconds = calendar.timegm(datetime.strptime(s[:19], "%Y-%m-%d %H:%M:%S").timetuple())
+    offset = s[19:].strip()
+    if offset:
+        sign = -1 if offset[0] == "-" else 1
+        seconds -= sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    return seconds
+
+#ElementTree gives unicode for text that isn't ASCII
+#the gnucash bindings and SqliteBackend give UTF-8 str, so this does too
+def _text(elem, path, default=None):
+    child = elem.find(path)
+    if child is None or child.text is None:
+        return default
+    if isinstance(child.text, unicode):
+        return child.text.encode("utf-8")
+    return child.text
+
+class XmlAccount(object):
+    def __init__(self, guid, name, account_type, parent_guid):
+        self._guid = XmlGUID(guid)
+        self.name = name
+        self.account_type = account_type
+        self.parent_guid = parent_guid
+        self._parent = None
+        self._children = []
+        #keyed by split GUID so moving a split out of an account doesn't have to search a list
+        self._splits = OrderedDict()
+
+    def GetName(self):
+        return self.name
+
+    def GetGUID(self):
+        return self._guid
+
+    def GetType(self):
+        return self.account_type
+
+    def get_children(self):
+        return list(self._children)
+
+    def get_parent(self):
+        return self._parent
+
+    def get_root(self):
+        account = self
+        while account._parent is not None:
+            account = account._parent
+        return account
+
+    def get_current_depth(self):
+        depth = 0
+        account = self._parent
+        while account is not None:
+            depth += 1
+            account = account._parent
+        return depth
+
+    #like the bindings this only searches the direct children
+    def lookup_by_name(self, name):
+        for child in self._children:
+            if child.name == name:
+                return child
+        return None
+
+    #in posted date order, like gnucash
+    #only has the splits of transactions that were loaded (see XmlSession)
+    def GetSplitList(self):
+        return sorted(self._splits.values(), key=lambda s: (s.parent.GetDate(), s.parent.GetDateEntered()))
+
+    def GetBalance(self):
+        total = 0
+        denom = 1
+        for this_split in self._splits.values():
+            amount = this_split.GetAmount()
+            #bring everything to the largest denominator
+            if amount.denom() > denom:
+                total *= amount.denom() // denom
+                denom = amount.denom()
+            total += amount.num() * (denom // amount.denom())
+        return XmlNumeric(total, denom)
+
+    def BeginEdit(self):
+        pass
+
+    def CommitEdit(self):
+        pass
+
+class XmlTransaction(object):
+    def __init__(self, guid, posted, entered, description):
+        self._guid = XmlGUID(guid)
+        self._posted = posted
+        self._entered = entered
+        self._description = description
+        self._splits = []
+        #split -> account it was in when the edit started
+        self._saved_accounts = None
+
+    def GetGUID(self):
+        return self._guid
+
+    def GetDate(self):
+        return self._posted
+
+    def GetDateEntered(self):
+        return self._entered
+
+    def GetDescription(self):
+        return self._description
+
+    def GetSplitList(self):
+        return list(self._splits)
+
+    def BeginEdit(self):
+        if self._saved_accounts is None:
+            self._saved_accounts = [(s, s.GetAccount()) for s in self._splits]
+
+    def CommitEdit(self):
+        self._saved_accounts = None
+
+    def RollbackEdit(self):
+        if self._saved_accounts is not None:
+            for s, account in self._saved_accounts:
+                s.SetAccount(account)
+        self._saved_accounts = None
+
+class XmlSplit(object):
+    def __init__(self, book, trans, guid, account, value, amount):
+        self._book = book
+        self.parent = trans
+        self._guid = XmlGUID(guid)
+        self._account = account
+        #where the file says it is
+        self._original_account = account
+        self._value = value
+        self._amount = amount
+        trans._splits.append(self)
+        account._splits[guid] = self
+
+    def GetGUID(self):
+        return self._guid
+
+    def GetParent(self):
+        return self.parent
+
+    def GetAccount(self):
+        return self._account
+
+    def SetAccount(self, account):
+        guid = self._guid.to_string()
+        del self._account._splits[guid]
+        account._splits[guid] = self
+        self._account = account
+        self._book._moved(self)
+
+    def GetValue(self):
+        return self._value
+
+    def GetAmount(self):
+        return self._amount
+
+    def GetOtherSplit(self):
+        splits = self.parent._splits
+        if len(splits) != 2:
+            return None
+        return splits[1] if splits[0] is self else splits[0]
+
+class XmlBook(object):
+    def __init__(self):
+        self._root = None
+        self._accounts = OrderedDict()
+        #split GUID -> split for every split that has been moved
+        self._moves = {}
+
+    def get_root_account(self):
+        return self._root
+
+    def _moved(self, split):
+        self._moves[split.GetGUID().to_string()] = split
+
+    #split GUID -> new account GUID for every split that isn't where it was read from
+    #(a split that was moved and then rolled back isn't a change)
+    def changes(self):
+        return dict((guid, split.GetAccount().GetGUID().to_string())
+                for guid, split in self._moves.items()
+                if split.GetAccount() is not split._original_account)
+
+    def session_not_saved(self):
+        return len(self.changes()) > 0
+
+    def _link_accounts(self):
+        for account in self._accounts.values():
+            parent = self._accounts.get(account.parent_guid) if account.parent_guid else None
+            if parent is None:
+                if account.account_type == "ROOT" and self._root is None:
+                    self._root = account
+            else:
+                account._parent = parent
+                parent._children.append(account)
+        if self._root is None:
+            raise XmlBackendException("No root account in book")
+
+def _is_gzip(file_name):
+    with open(file_name, "rb") as f:
+        return f.read(2) == _GZIP_MAGIC
+
+def _open_book_file(file_name, mode, compressed):
+    if compressed:
+        return gzip.open(file_name, mode)
+    return open(file_name, mode)
+
+#the text between the first > and the following </ on a line like
+#    <split:id type="guid">b044243f0fbfa5447eefc0414373fbdd</split:id>
+def _element_text(line, open_tag):
+    start = line.find(b">", line.find(open_tag)) + 1
+    end = line.find(b"</", start)
+    if start == 0 or end == -1:
+        return None
+    return line[start:end].strip()
+
+#mkstemp creates files only their owner can read
+#so give the file that replaces the book the book's permissions (and owner and group if allowed to)
+def _copy_ownership(src, dest):
+    shutil.copymode(src, dest)
+    if hasattr(os, "chown"):
+        st = os.stat(src)
+        try:
+            os.chown(dest, st.st_uid, st.st_gid)
+        except OSError:
+            #only root can give a file away
+            pass
+
+"""
+A session on a GnuCash XML file
+
+Pass the fully qualified names of the accounts whose transactions are needed as source_accounts
+to skip every other transaction while reading (None loads them all)
+Unless read_only, the book is locked the same way gnucash does it (a <file>.LCK file)
+"""
+class XmlSession(object):
+    def __init__(self, file_name, read_only=False, source_accounts=None):
+        self.file_name = os.path.abspath(file_name)
+        self.read_only = read_only
+        self._lock_file = None
+
+        if not read_only:
+            lock_file = self.file_name + ".LCK"
+            try:
+                fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                raise XmlBookLockedException("Cannot open {}, file is locked.".format(file_name))
+            os.close(fd)
+            self._lock_file = lock_file
+
+        try:
+            self._compressed = _is_gzip(self.file_name)
+            self.book = self._read(source_accounts)
+        except:
+            self._unlock()
+            raise
+
+    def _read(self, source_accounts):
+        book = XmlBook()
+        source_guids = None
+        #the tags of the elements the parser is currently inside of
+        #so accounts and transactions in scheduled transaction templates can be skipped
+        path = []
+        book_elem = None
+
+        with _open_book_file(self.file_name, "rb", self._compressed) as f:
+            for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    path.append(elem.tag)
+                    if elem.tag == _BOOK_TAG and book_elem is None:
+                        book_elem = elem
+                    continue
+
+                path.pop()
+                if not path or path[-1] != _BOOK_TAG:
+                    continue
+
+                if elem.tag == _ACCOUNT_TAG:
+                    self._read_account(book, elem)
+                elif elem.tag == _TRANSACTION_TAG:
+                    if book._root is None:
+                        #every account comes before the first transaction
+                        book._link_accounts()
+                        if source_accounts is not None:
+                            index = AccountIndex(book._root)
+                            source_guids = set(index.lookup(n).GetGUID().to_string()
+                                    for n in source_accounts if index.lookup(n) is not None)
+                    self._read_transaction(book, elem, source_guids)
+                else:
+                    continue
+                #only the objects built from them are kept
+                book_elem.clear()
+
+        if book._root is None:
+            book._link_accounts()
+        return book
+
+    def _read_account(self, book, elem):
+        guid = _text(elem, _ACT + "id")
+        book._accounts[guid] = XmlAccount(guid, _text(elem, _ACT + "name", ""),
+                _text(elem, _ACT + "type"), _text(elem, _ACT + "parent"))
+
+    def _read_transaction(self, book, elem, source_guids):
+        split_elems = elem.findall(_TRN + "splits/" + _TRN + "split")
+        account_guids = [_text(s, _SPLIT + "account") for s in split_elems]
+        if source_guids is not None and not any(g in source_guids for g in account_guids):
+            return
+
+        entered = _text(elem, _TRN + "date-entered/" + _TS + "date")
+        trans = XmlTransaction(_text(elem, _TRN + "id"),
+                _parse_timestamp(_text(elem, _TRN + "date-posted/" + _TS + "date")),
+                _parse_timestamp(entered) if entered is not None else None,
+                _text(elem, _TRN + "description", ""))
+        for split_elem, account_guid in zip(split_elems, account_guids):
+            account = book._accounts.get(account_guid)
+            if account is None:
+                raise XmlBackendException("Split in transaction {} refers to unknown account {}"
+                        .format(trans.GetGUID().to_string(), account_guid))
+            XmlSplit(book, trans, _text(split_elem, _SPLIT + "id"), account,
+                    _parse_numeric(_text(split_elem, _SPLIT + "value", "0")),
+                    _parse_numeric(_text(split_elem, _SPLIT + "quantity", "0")))
+
+    #write every moved split back to the file
+    #the file is copied line by line into a temporary file that replaces it once every change is written
+    #so an error part way through leaves the original alone
+    def save(self):
+        if self.read_only:
+            raise XmlBackendException("Cannot save a read only session")
+        changes = self.book.changes()
+        if not changes:
+            return
+
+        changes = dict((k.encode("ascii"), v.encode("ascii")) for k, v in changes.items())
+        directory = os.path.dirname(self.file_name)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            written = 0
+            with _open_book_file(self.file_name, "rb", self._compressed) as src, \
+                    _open_book_file(tmp_path, "wb", self._compressed) as dest:
+                current_split = None
+                for line in src:
+                    if b"<split:id" in line:
+                        current_split = _element_text(line, b"<split:id")
+                    elif b"<split:account" in line and current_split in changes:
+                        old_guid = _element_text(line, b"<split:account")
+                        line = line.replace(old_guid, changes[current_split], 1)
+                        current_split = None
+                        written += 1
+                    dest.write(line)
+
+            if written != len(changes):
+                raise XmlBackendException("Could only write {} of {} changes to {}"
+                        .format(written, len(changes), self.file_name))
+            _copy_ownership(self.file_name, tmp_path)
+            os.rename(tmp_path, self.file_name)
+        except:
+            os.remove(tmp_path)
+            raise
+
+        #the file now matches the book
+        for this_split in self.book._moves.values():
+            this_split._original_account = this_split.GetAccount()
+        self.book._moves = {}
+
+    def _unlock(self):
+        if self._lock_file is not None:
+            os.remove(self._lock_file)
+            self._lock_file = None
+
+    def end(self):
+        self._unlock()
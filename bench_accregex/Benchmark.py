@@ -0,0 +1,212 @@
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from timeit import default_timer
+from accregex import Account
+from accregex.AccountIndex import AccountIndex
+from accregex.AccountRule import read_account_rules, get_most_urgent_priority_rule
+from accregex.RuleSet import CompiledRuleSet, RulePlan
+from accregex.SplitSnapshot import SplitSnapshot
+from .SyntheticBook import BookParameters, generate_book, generate_rules, write_rules
+
+#the stages of a run, in the order they happen
+STAGES = ["read_account_rules",
+        "compile_rules",
+        "check_accounts_exist",
+        "filter_dates",
+        "filter_amounts",
+        "filter_snapshot",
+        "get_undefined_splits",
+        "get_matching_rules",
+        "modify_transaction",
+        "process_source_account"]
+
+"""
+Collects the times (in seconds) of every repeat of every stage
+along with how many items (rules or splits) each stage handled
+"""
+class StageTimes(object):
+    def __init__(self):
+        self.seconds = dict((s, []) for s in STAGES)
+        self.items = {}
+
+    def time(self, stage, f, *args):
+        start = default_timer()
+        result = f(*args)
+        self.seconds[stage].append(default_timer() - start)
+        return result
+
+    def to_dict(self):
+        stages = {}
+        for stage in STAGES:
+            times = sorted(self.seconds[stage])
+            if not times:
+                continue
+            stages[stage] = {"seconds": self.seconds[stage],
+                    "min": times[0],
+                    "median": times[len(times) // 2],
+                    "items": self.items.get(stage)}
+        return stages
+
+#run every stage once against a freshly generated book
+def _run_stages(params, rule_file, start_date, times):
+    rules = times.time("read_account_rules", read_account_rules, rule_file)
+    rule_set = times.time("compile_rules", CompiledRuleSet, rules)
+    times.items["read_account_rules"] = times.items["compile_rules"] = len(rules)
+
+    session = generate_book(params)
+    root = session.book.get_root_account()
+    times.time("check_accounts_exist", Account.check_accounts_exist, root, rules)
+    times.items["check_accounts_exist"] = len(rules)
+
+    sources = Account.get_source_account_set(root, rules)
+    split_lists = [src.GetSplitList() for src in sources]
+    times.items["filter_dates"] = sum(len(l) for l in split_lists)
+
+    def filter_dates():
+        return [Account.splits_after_date(l, start_date) for l in split_lists]
+    dated = times.time("filter_dates", filter_dates)
+    times.items["filter_amounts"] = sum(len(l) for l in dated)
+
+    def filter_amounts():
+        return [Account.splits_filter_debits(l) for l in dated]
+    debits = times.time("filter_amounts", filter_amounts)
+
+    #the same filters (and the Undefined one) over snapshots of the splits instead
+    snapshots = [SplitSnapshot(l) for l in split_lists]
+    times.items["filter_snapshot"] = sum(len(s) for s in snapshots)
+    def filter_snapshots():
+        return [s.candidates(start_date) for s in snapshots]
+    times.time("filter_snapshot", filter_snapshots)
+    times.items["get_undefined_splits"] = sum(len(l) for l in debits)
+
+    def undefined_splits():
+        return [Account.get_undefined_splits(l) for l in debits]
+    undefined = [s for l in times.time("get_undefined_splits", undefined_splits) for s in l]
+    times.items["get_matching_rules"] = len(undefined)
+
+    def matching_rules():
+        return [(s, Account.get_matching_rules(s.GetParent().GetDescription(), rule_set)) for s in undefined]
+    matches = times.time("get_matching_rules", matching_rules)
+
+    index = AccountIndex(root)
+    changes = [(s, get_most_urgent_priority_rule(m)) for s, m in matches if m]
+    times.items["modify_transaction"] = len(changes)
+
+    def modify_transactions():
+        for s, rule in changes:
+            Account.modify_transaction(root, s, rule, index.lookup(rule.dest))
+    times.time("modify_transaction", modify_transactions)
+
+    #the whole pipeline again on an untouched book
+    session = generate_book(params)
+    root = session.book.get_root_account()
+    sources = Account.get_source_account_set(root, rules)
+    times.items["process_source_account"] = sum(len(src.GetSplitList()) for src in sources)
+
+    def process_source_accounts():
+        index = AccountIndex(root)
+        #like Account.run, only match each account's splits against its own rules
+        plan = RulePlan(rules)
+        for src in sources:
+            Account.process_source_account(src, plan, start_date, None, index)
+    times.time("process_source_account", process_source_accounts)
+
+def run_benchmark(params, repeat=3, start_days_ago=None):
+    if start_days_ago is None:
+        start_days_ago = params.days
+    start_date = date.today() - timedelta(days=start_days_ago)
+
+    rule_dir = tempfile.mkdtemp(prefix="bench_accregex")
+    try:
+        rule_file = os.path.join(rule_dir, "rules.json")
+        write_rules(generate_rules(params), rule_file)
+
+        times = StageTimes()
+        for _ in range(repeat):
+            _run_stages(params, rule_file, start_date, times)
+    finally:
+        shutil.rmtree(rule_dir)
+
+    return {"parameters": params.to_dict(),
+            "repeat": repeat,
+            "start_date": start_date.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "stages": times.to_dict()}
+
+#print how the median of every stage changed compared to an earlier result
+def print_comparison(old, new, out=sys.stdout):
+    print("{:<24}{:>12}{:>12}{:>9}".format("stage", "old (s)", "new (s)", "ratio"), file=out)
+    for stage in STAGES:
+        if stage not in old["stages"] or stage not in new["stages"]:
+            continue
+        old_median = old["stages"][stage]["median"]
+        new_median = new["stages"][stage]["median"]
+        if old_median > 0:
+            ratio = "{:.2f}".format(new_median / old_median)
+        else:
+            ratio = "-"
+        print("{:<24}{:>12.6f}{:>12.6f}{:>9}".format(stage, old_median, new_median, ratio), file=out)
+
+def get_bench_arg_parser():
+    defaults = BookParameters()
+    parser = argparse.ArgumentParser(description="Time each stage of accregex against a generated book")
+    parser.add_argument("--accounts", dest="expense_accounts", type=int, default=defaults.expense_accounts,
+            help="Number of expense accounts")
+    parser.add_argument("--source-accounts", dest="source_accounts", type=int, default=defaults.source_accounts,
+            help="Number of source (checking) accounts")
+    parser.add_argument("--splits", dest="splits", type=int, default=defaults.splits,
+            help="Number of transactions")
+    parser.add_argument("--rules", dest="rules", type=int, default=defaults.rules, help="Number of rules")
+    parser.add_argument("--payees", dest="payees", type=int, default=defaults.payees,
+            help="Number of distinct payees in the descriptions")
+    parser.add_argument("--undefined-fraction", dest="undefined_fraction", type=float,
+            default=defaults.undefined_fraction, help="Fraction of transactions with an Undefined side")
+    parser.add_argument("--recurring-fraction", dest="recurring_fraction", type=float,
+            default=defaults.recurring_fraction,
+            help="Fraction of transactions whose description repeats exactly (no reference number)")
+    parser.add_argument("--days", dest="days", type=int, default=defaults.days,
+            help="Number of days the transactions are spread over")
+    parser.add_argument("--start-days-ago", dest="start_days_ago", type=int, default=None,
+            help="Start date of the run, in days before today (default: the whole book)")
+    parser.add_argument("--seed", dest="seed", type=int, default=defaults.seed, help="Random seed")
+    parser.add_argument("--repeat", dest="repeat", type=int, default=3, help="Number of times to run each stage")
+    parser.add_argument("-o", "--output", dest="output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--compare", dest="compare", help="Earlier JSON results to compare against")
+    return parser
+
+def bench_main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = get_bench_arg_parser().parse_args(argv)
+
+    params = BookParameters(expense_accounts=args.expense_accounts,
+            source_accounts=args.source_accounts,
+            splits=args.splits,
+            rules=args.rules,
+            payees=args.payees,
+            undefined_fraction=args.undefined_fraction,
+            recurring_fraction=args.recurring_fraction,
+            days=args.days,
+            seed=args.seed)
+    results = run_benchmark(params, args.repeat, args.start_days_ago)
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=4, sort_keys=True)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            print_comparison(json.load(f), results, sys.stderr)
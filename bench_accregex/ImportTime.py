@@ -0,0 +1,90 @@
+from __future__ import print_function
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+"""
+Measures how long importing a module takes in a fresh interpreter
+and which modules it drags in along the way
+
+The CLI's entry point (accregex.Env) has to stay cheap to import:
+--help, argument errors and the process that relaunches through gnucash-env
+shouldn't load gnucash or the parts of accregex that only a run needs
+"""
+
+#the modules accregex's entry point must not load until a run actually needs them
+HEAVY_MODULES = ["gnucash",
+        "csv",
+        "decimal",
+        "numpy",
+        "subprocess",
+        "accregex.Accregex",
+        "accregex.Account",
+        "accregex.RuleSet"]
+
+DEFAULT_MODULES = ["accregex.Env"]
+DEFAULT_BUDGET_MS = 150.0
+
+#run in the child: time the import and report sys.modules afterwards
+_MEASURE = """import sys, time
+start = time.time()
+import {module}
+seconds = time.time() - start
+import json
+json.dump({{"seconds": seconds, "modules": sorted(sys.modules)}}, sys.stdout)
+"""
+
+def _repo_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#import module in repeat new interpreters
+#returns the fastest import time (in seconds) and the heavy modules it loaded
+def measure_import(module, repeat=5, python=None):
+    if python is None:
+        python = sys.executable
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([_repo_root()] +
+            [p for p in environment.get("PYTHONPATH", "").split(os.pathsep) if p])
+
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.check_output([python, "-c", _MEASURE.format(module=module)],
+                env=environment, cwd=_repo_root())
+        result = json.loads(output.decode("utf-8"))
+        if best is None or result["seconds"] < best:
+            best = result["seconds"]
+        loaded = [m for m in HEAVY_MODULES if m in result["modules"] and m != module]
+    return {"module": module, "seconds": best, "heavy_modules": loaded}
+
+def get_import_time_arg_parser():
+    parser = argparse.ArgumentParser(description="Time importing accregex's entry points in a fresh interpreter")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import (default: accregex.Env)")
+    parser.add_argument("--budget-ms", dest="budget_ms", type=float, default=DEFAULT_BUDGET_MS,
+            help="Fail if an import takes longer than this many milliseconds")
+    parser.add_argument("--repeat", dest="repeat", type=int, default=5, help="Number of interpreters to time each import in")
+    return parser
+
+#exits with status 1 if any module is over budget or loads a heavy module
+def import_time_main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = get_import_time_arg_parser().parse_args(argv)
+
+    ok = True
+    for module in args.modules:
+        result = measure_import(module, args.repeat)
+        ms = result["seconds"] * 1000
+        over_budget = ms > args.budget_ms
+        print("{:<24}{:>10.1f} ms{}".format(module, ms, "  OVER BUDGET" if over_budget else ""))
+        if result["heavy_modules"]:
+            print("    loads {}".format(", ".join(result["heavy_modules"])))
+        ok = ok and not over_budget and not result["heavy_modules"]
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    import_time_main()
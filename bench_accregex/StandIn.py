@@ -0,0 +1,202 @@
+import itertools
+from collections import OrderedDict
+
+"""
+A pure python stand-in for the parts of the gnucash bindings accregex uses
+(Session, Account, Split, Transaction, GncNumeric and GUID)
+so the functions in accregex.Account can be timed without gnucash installed
+
+Only the behaviour accregex relies on is modelled--there is no commodity handling,
+no rebalancing and nothing is ever written to disk
+"""
+
+_guid_counter = itertools.count(1)
+
+class GUID(object):
+    def __init__(self):
+        self._guid = "%032x" % next(_guid_counter)
+
+    def to_string(self):
+        return self._guid
+
+class GncNumeric(object):
+    def __init__(self, num=0, denom=1):
+        self._num = num
+        self._denom = denom
+
+    def num(self):
+        return self._num
+
+    def denom(self):
+        return self._denom
+
+    def negative_p(self):
+        return self._num < 0
+
+class Account(object):
+    def __init__(self, name, parent=None):
+        self.name = name
+        self._guid = GUID()
+        self._parent = parent
+        self._children = []
+        #keyed by split GUID so moving a split out of an account doesn't have to search a list
+        self._splits = OrderedDict()
+        self.edit_level = 0
+        self.commits = 0
+        if parent is not None:
+            parent._children.append(self)
+
+    def GetName(self):
+        return self.name
+
+    def GetGUID(self):
+        return self._guid
+
+    def get_children(self):
+        return list(self._children)
+
+    def get_parent(self):
+        return self._parent
+
+    def get_root(self):
+        account = self
+        while account._parent is not None:
+            account = account._parent
+        return account
+
+    def get_current_depth(self):
+        depth = 0
+        account = self._parent
+        while account is not None:
+            depth += 1
+            account = account._parent
+        return depth
+
+    #like gnc_account_lookup_by_name: children first, then their descendants
+    def lookup_by_name(self, name):
+        for child in self._children:
+            if child.name == name:
+                return child
+        for child in self._children:
+            found = child.lookup_by_name(name)
+            if found is not None:
+                return found
+        return None
+
+    #sorted by posted date like the real thing
+    def GetSplitList(self):
+        return sorted(self._splits.values(), key=lambda s: s.parent.GetDate())
+
+    def GetBalance(self):
+        total = 0
+        for s in self._splits.values():
+            #every amount in a synthetic book is in cents
+            total += s.GetAmount().num()
+        return GncNumeric(total, 100)
+
+    def BeginEdit(self):
+        self.edit_level += 1
+
+    def CommitEdit(self):
+        self.edit_level -= 1
+        self.commits += 1
+
+class Transaction(object):
+    def __init__(self, posted_timestamp, description, entered_timestamp=None):
+        self._guid = GUID()
+        self._date = posted_timestamp
+        #bank imports are entered when they're posted unless told otherwise
+        self._entered = posted_timestamp if entered_timestamp is None else entered_timestamp
+        self._description = description
+        self._splits = []
+        #split -> account it was in when the edit started
+        self._saved_accounts = None
+
+    def GetGUID(self):
+        return self._guid
+
+    def GetDate(self):
+        return self._date
+
+    def GetDateEntered(self):
+        return self._entered
+
+    def GetDescription(self):
+        return self._description
+
+    def GetSplitList(self):
+        return list(self._splits)
+
+    def BeginEdit(self):
+        if self._saved_accounts is None:
+            self._saved_accounts = [(s, s.GetAccount()) for s in self._splits]
+
+    def CommitEdit(self):
+        self._saved_accounts = None
+
+    def RollbackEdit(self):
+        if self._saved_accounts is not None:
+            for s, account in self._saved_accounts:
+                s.SetAccount(account)
+        self._saved_accounts = None
+
+class Split(object):
+    def __init__(self, trans, account, amount):
+        self.parent = trans
+        self._guid = GUID()
+        self._account = None
+        self._amount = amount
+        trans._splits.append(self)
+        self.SetAccount(account)
+
+    def GetGUID(self):
+        return self._guid
+
+    def GetParent(self):
+        return self.parent
+
+    def GetAmount(self):
+        return self._amount
+
+    def GetValue(self):
+        return self._amount
+
+    def GetAccount(self):
+        return self._account
+
+    def SetAccount(self, account):
+        key = self._guid.to_string()
+        if self._account is not None:
+            del self._account._splits[key]
+        self._account = account
+        account._splits[key] = self
+
+    #the other split of a 2-split transaction, None otherwise
+    def GetOtherSplit(self):
+        splits = self.parent._splits
+        if len(splits) != 2:
+            return None
+        if splits[0] is self:
+            return splits[1]
+        return splits[0]
+
+class Book(object):
+    def __init__(self, root_account):
+        self._root = root_account
+        self.saved = False
+
+    def get_root_account(self):
+        return self._root
+
+    def session_not_saved(self):
+        return not self.saved
+
+class Session(object):
+    def __init__(self, book):
+        self.book = book
+
+    def save(self):
+        self.book.saved = True
+
+    def end(self):
+        pass
@@ -0,0 +1,179 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+from .StandIn import Account, Transaction, Split, GncNumeric, Book, Session
+
+SOURCE_ACCOUNT_BASE = "Assets:Current Assets:"
+EXPENSE_ACCOUNT_BASE = "Expenses:"
+
+"""
+The shape of a generated book and rule file
+"""
+class BookParameters(object):
+    def __init__(self, expense_accounts=50, source_accounts=2, splits=10000, rules=200,
+            payees=400, undefined_fraction=0.3, debit_fraction=0.8, days=3650, seed=0,
+            recurring_fraction=0.0):
+        self.expense_accounts = expense_accounts
+        self.source_accounts = source_accounts
+        #number of transactions (each has one split in a source account)
+        self.splits = splits
+        self.rules = rules
+        #number of distinct payees the descriptions are made from
+        self.payees = payees
+        #fraction of transactions whose description is just the payee (e.g. a subscription)
+        #the rest have a reference number that makes almost every description unique
+        self.recurring_fraction = recurring_fraction
+        self.undefined_fraction = undefined_fraction
+        self.debit_fraction = debit_fraction
+        #the transactions are spread over this many days ending today
+        self.days = days
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+def source_account_name(i):
+    return SOURCE_ACCOUNT_BASE + "Checking Account {}".format(i)
+
+#expenses are grouped 10 to a parent account to give the tree some depth
+def expense_account_name(i):
+    return EXPENSE_ACCOUNT_BASE + "Group {}:Category {}".format(i // 10, i)
+
+def payee_name(i):
+    return "PAYEE{:05d}".format(i)
+
+#payee i is always classified into the same expense account
+def payee_expense_account(i, params):
+    return i % params.expense_accounts
+
+#make an account for every colon separated part of name that doesn't exist yet
+def _mk_account_path(root, accounts, name):
+    parent = root
+    path = []
+    for part in name.split(":"):
+        path.append(part)
+        full_name = ":".join(path)
+        if full_name not in accounts:
+            accounts[full_name] = Account(part, parent)
+        parent = accounts[full_name]
+    return parent
+
+#returns a stand-in Session whose book has the source accounts, expense accounts,
+#an Undefined account and params.splits 2-split transactions between them
+def generate_book(params):
+    rng = random.Random(params.seed)
+    root = Account("Root Account")
+    accounts = {}
+
+    sources = [_mk_account_path(root, accounts, source_account_name(i)) for i in range(params.source_accounts)]
+    expenses = [_mk_account_path(root, accounts, expense_account_name(i)) for i in range(params.expense_accounts)]
+    undefined = _mk_account_path(root, accounts, "Undefined")
+
+    first_day = date.today() - timedelta(days=params.days)
+    #generate the days in order since that's how bank imports arrive
+    days = sorted(rng.randrange(params.days + 1) for _ in range(params.splits))
+
+    for i, day in enumerate(days):
+        posted = first_day + timedelta(days=day)
+        payee = rng.randrange(params.payees)
+        #only draw for recurring descriptions if there are any so older seeds give the same books
+        if params.recurring_fraction > 0 and rng.random() < params.recurring_fraction:
+            description = "RECURRING {}".format(payee_name(payee))
+        else:
+            description = "POS PURCHASE {} #{:04d}".format(payee_name(payee), rng.randrange(10000))
+
+        cents = rng.randrange(1, 100000)
+        if rng.random() < params.debit_fraction:
+            cents = -cents
+
+        if rng.random() < params.undefined_fraction:
+            other_account = undefined
+        else:
+            other_account = expenses[payee_expense_account(payee, params)]
+
+        trans = Transaction(time.mktime(posted.timetuple()), description)
+        Split(trans, sources[i % len(sources)], GncNumeric(cents, 100))
+        Split(trans, other_account, GncNumeric(-cents, 100))
+
+    return Session(Book(root))
+
+#the tables of gnucash's SQL backend that accregex reads and writes
+#(column for column what gnucash 2.6 creates, minus the tables accregex doesn't use)
+SQLITE_SCHEMA = """
+CREATE TABLE accounts (guid text(32) PRIMARY KEY NOT NULL, name text(2048) NOT NULL,
+    account_type text(2048) NOT NULL, commodity_guid text(32), commodity_scu integer NOT NULL,
+    non_std_scu integer NOT NULL, parent_guid text(32), code text(2048), description text(2048),
+    hidden integer, placeholder integer);
+CREATE TABLE transactions (guid text(32) PRIMARY KEY NOT NULL, currency_guid text(32) NOT NULL,
+    num text(2048) NOT NULL, post_date text(19), enter_date text(19), description text(2048));
+CREATE INDEX tx_post_date_index ON transactions(post_date);
+CREATE TABLE splits (guid text(32) PRIMARY KEY NOT NULL, tx_guid text(32) NOT NULL,
+    account_guid text(32) NOT NULL, memo text(2048) NOT NULL, action text(2048) NOT NULL,
+    reconcile_state text(1) NOT NULL, reconcile_date text(19), value_num bigint NOT NULL,
+    value_denom bigint NOT NULL, quantity_num bigint NOT NULL, quantity_denom bigint NOT NULL,
+    lot_guid text(32));
+CREATE INDEX splits_tx_guid_index ON splits(tx_guid);
+CREATE INDEX splits_account_guid_index ON splits(account_guid);
+CREATE TABLE gnclock (Hostname varchar(255), PID int);
+"""
+
+def _sql_timestamp(seconds):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+#write a stand-in book (see generate_book) to a new SQLite file laid out like gnucash's
+def write_sqlite_book(session, path):
+    import sqlite3
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SQLITE_SCHEMA)
+        accounts = []
+        transactions = {}
+        splits = []
+        stack = [(session.book.get_root_account(), None)]
+        while stack:
+            account, parent_guid = stack.pop()
+            guid = account.GetGUID().to_string()
+            accounts.append((guid, account.GetName(), "ROOT" if parent_guid is None else "ASSET",
+                    None, 100, 0, parent_guid, "", "", 0, 0))
+            for this_split in account._splits.values():
+                trans = this_split.GetParent()
+                transactions[trans.GetGUID().to_string()] = (trans.GetGUID().to_string(), "", "",
+                        _sql_timestamp(trans.GetDate()), _sql_timestamp(trans.GetDateEntered()),
+                        trans.GetDescription())
+                amount = this_split.GetAmount()
+                splits.append((this_split.GetGUID().to_string(), trans.GetGUID().to_string(), guid,
+                        "", "", "n", None, amount.num(), amount.denom(), amount.num(), amount.denom(), None))
+            stack.extend((child, guid) for child in reversed(account.get_children()))
+
+        #stand-in GUIDs count up so this is the order the splits were made in,
+        #which is the order their transactions list them
+        splits.sort(key=lambda row: row[0])
+        conn.executemany("INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", accounts)
+        conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", list(transactions.values()))
+        conn.executemany("INSERT INTO splits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", splits)
+        conn.commit()
+    finally:
+        conn.close()
+
+#the contents of a rule file with params.rules rules
+#each rule matches a range of payees and sends them to that range's expense account
+def generate_rules(params):
+    rules = {}
+    for i in range(params.rules):
+        payee = i % params.payees
+        src = source_account_name(i % params.source_accounts)
+        rules["rule{}".format(i)] = {
+                "priority": i % 5,
+                #case insensitive like the rules people actually write
+                "regex": "(?i).*{}".format(payee_name(payee).lower()),
+                "dest": expense_account_name(payee_expense_account(payee, params)),
+                "src": src
+                }
+    return rules
+
+def write_rules(rules, path):
+    with open(path, "w") as f:
+        #comments are allowed in rule files--include one so the comment stripper has something to do
+        f.write("//generated by bench_accregex\n")
+        json.dump(rules, f, indent=4, sort_keys=True)
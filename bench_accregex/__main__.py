@@ -0,0 +1,3 @@
+if __name__ == '__main__':
+    from .Benchmark import bench_main
+    bench_main()
@@ -21,3 +21,34 @@ class AccregexTest(unittest.TestCase):
     match_all_unspecified_json = abs_from_here("res/match_all_unspecified.json")
     reg_doc_example = abs_from_here("res/reg_doc_example.gnucash")
     parking_fee_rule_json = abs_from_here("res/parking_fee_rule.json")
+
+    #a 2 split transaction from from_account to to_account built from bench_accregex.StandIn's objects
+    #posted at local midnight of posted_date like gnucash's posted dates
+    #returns the split in from_account, which has the negative amount (a debit)
+    @staticmethod
+    def standin_transaction(description, posted_date, from_account, to_account, num=1250, denom=100,
+            entered=None, transaction_class=None, split_class=None):
+        import time
+        from bench_accregex import StandIn
+        if transaction_class is None:
+            transaction_class = StandIn.Transaction
+        if split_class is None:
+            split_class = StandIn.Split
+        trans = transaction_class(time.mktime(posted_date.timetuple()), description, entered)
+        from_split = split_class(trans, from_account, StandIn.GncNumeric(-num, denom))
+        split_class(trans, to_account, StandIn.GncNumeric(num, denom))
+        return from_split
+
+    #(rules, session) of a bench_accregex.SyntheticBook built from BookParameters(**parameters)
+    @staticmethod
+    def synthetic_session(**parameters):
+        from bench_accregex.SyntheticBook import BookParameters, generate_book, generate_rules
+        from accregex.AccountRule import _account_rules_from_json
+        params = BookParameters(**parameters)
+        return (_account_rules_from_json(generate_rules(params)), generate_book(params))
+
+    #(rules, root account) of a synthetic book, see synthetic_session
+    @staticmethod
+    def synthetic_book(**parameters):
+        rules, session = AccregexTest.synthetic_session(**parameters)
+        return (rules, session.book.get_root_account())
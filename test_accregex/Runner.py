@@ -5,9 +5,41 @@ def run_all_test_suites():
     import TestReadSimpleJSON
     import TestChangeParking
     import TestReadAccountData
+    import TestCompiledRuleSet
+    import TestAccountUtil
+    import TestSplitDateIndex
+    import TestTransactionBatch
+    import TestStats
+    import TestRuleCache
+    import TestJsonComments
+    import TestWatermark
+    import TestXmlBackend
+    import TestGnucashEnv
+    import TestImportTime
+    import TestBackup
+    import TestUndefinedScan
+    import TestSqliteBackend
+    import TestSplitSnapshot
+    import TestBatchRun
     test_modules = [TestReadSimpleJSON,
                     TestChangeParking,
-                    TestReadAccountData]
+                    TestReadAccountData,
+                    TestCompiledRuleSet,
+                    TestAccountUtil,
+                    TestSplitDateIndex,
+                    TestTransactionBatch,
+                    TestStats,
+                    TestRuleCache,
+                    TestJsonComments,
+                    TestWatermark,
+                    TestXmlBackend,
+                    TestGnucashEnv,
+                    TestImportTime,
+                    TestBackup,
+                    TestUndefinedScan,
+                    TestSqliteBackend,
+                    TestSplitSnapshot,
+                    TestBatchRun]
     test_loader = unittest.defaultTestLoader
     combined_test_suite = unittest.TestSuite(map(test_loader.loadTestsFromModule, test_modules))
     text_test_runner = unittest.TextTestRunner()
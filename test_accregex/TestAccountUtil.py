@@ -0,0 +1,30 @@
+from decimal import Decimal
+from fractions import Fraction
+from AccregexTest import AccregexTest
+
+class TestNumericToDecimal(AccregexTest):
+    def runTest(self):
+        from accregex.AccountUtil import gnc_numeric_to_python_Decimal
+        from bench_accregex.StandIn import GncNumeric
+        #powers of ten keep their exponent
+        self.assertEqual(str(gnc_numeric_to_python_Decimal(GncNumeric(2500, 100))), "25.00")
+        self.assertEqual(str(gnc_numeric_to_python_Decimal(GncNumeric(-2500, 100))), "-25.00")
+        self.assertEqual(str(gnc_numeric_to_python_Decimal(GncNumeric(7, 1))), "7")
+        #other denominators used to fail an assert
+        self.assertEqual(gnc_numeric_to_python_Decimal(GncNumeric(3, 8)), Decimal("0.375"))
+        self.assertEqual(gnc_numeric_to_python_Decimal(GncNumeric(-1, 40)), Decimal("-0.025"))
+        self.assertEqual(gnc_numeric_to_python_Decimal(GncNumeric(3, -10)), Decimal(30))
+        #a malformed book mustn't hang the run
+        self.assertRaises(ValueError, gnc_numeric_to_python_Decimal, GncNumeric(3, 0))
+
+class TestNumericSignAndCompare(AccregexTest):
+    def runTest(self):
+        from accregex.AccountUtil import gnc_numeric_sign, gnc_numeric_compare, gnc_numeric_to_Fraction
+        from bench_accregex.StandIn import GncNumeric
+        self.assertEqual(gnc_numeric_sign(GncNumeric(-1, 100)), -1)
+        self.assertEqual(gnc_numeric_sign(GncNumeric(0, 100)), 0)
+        self.assertEqual(gnc_numeric_sign(GncNumeric(5, 3)), 1)
+        self.assertEqual(gnc_numeric_compare(GncNumeric(1, 3), GncNumeric(33, 100)), 1)
+        self.assertEqual(gnc_numeric_compare(GncNumeric(50, 100), GncNumeric(1, 2)), 0)
+        self.assertEqual(gnc_numeric_compare(GncNumeric(-2, 1), GncNumeric(1, -1)), -1)
+        self.assertEqual(gnc_numeric_to_Fraction(GncNumeric(1, 3)), Fraction(1, 3))
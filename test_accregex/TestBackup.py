@@ -0,0 +1,125 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from AccregexTest import AccregexTest
+
+def write_file(path, contents):
+    with open(path, "wb") as f:
+        f.write(contents)
+
+#save the way gnucash does, by renaming a new file over the old one
+def replace_file(path, contents):
+    write_file(path + ".tmp", contents)
+    os.rename(path + ".tmp", path)
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+class BackupTest(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        self.book_dir = tempfile.mkdtemp()
+        self.book = os.path.join(self.book_dir, "book.gnucash")
+        write_file(self.book, b"<gnc-v2>original</gnc-v2>")
+
+    def tearDown(self):
+        shutil.rmtree(self.book_dir)
+
+class TestCloneFile(BackupTest):
+    def runTest(self):
+        from accregex.Backup import clone_file, COPY
+        dest = os.path.join(self.book_dir, "clone")
+        method = clone_file(self.book, dest)
+        self.assertEqual(read_file(dest), read_file(self.book))
+        self.assertFalse(os.path.exists(dest + ".tmp"))
+
+        #the fallback always works
+        self.assertEqual(clone_file(self.book, dest, [COPY]), COPY)
+        self.assertNotEqual(os.stat(dest).st_ino, os.stat(self.book).st_ino)
+
+"""
+A hard link backup shares the book's inode but keeps the old contents
+once the book is saved by writing a new file and renaming it over the old one
+"""
+class TestHardlinkBackup(BackupTest):
+    def runTest(self):
+        from accregex.Backup import backup_book, HARDLINK
+        dest, method = backup_book(self.book, allow_hardlink=True)
+        self.assertEqual(dest, self.book + ".bak")
+        if method != HARDLINK:
+            #reflinks worked, which is even better
+            return
+        self.assertEqual(os.stat(dest).st_ino, os.stat(self.book).st_ino)
+
+        replace_file(self.book, b"<gnc-v2>changed</gnc-v2>")
+        self.assertEqual(read_file(dest), b"<gnc-v2>original</gnc-v2>")
+
+        #backing up again replaces the old backup
+        self.assertEqual(backup_book(self.book, allow_hardlink=True)[0], dest)
+        self.assertEqual(read_file(dest), b"<gnc-v2>changed</gnc-v2>")
+
+def lock_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM gnclock").fetchone()[0]
+    finally:
+        conn.close()
+
+"""
+A SQLite book is changed in place so it's never hard linked
+and the lock of whoever has it open stays out of the backup
+"""
+class TestSqliteNotHardlinked(BackupTest):
+    def runTest(self):
+        from accregex.Backup import backup_book, saved_by_replacing, HARDLINK
+        self.assertTrue(saved_by_replacing(self.book))
+        os.remove(self.book)
+        conn = sqlite3.connect(self.book)
+        conn.execute("CREATE TABLE gnclock (Hostname varchar(255), PID int)")
+        conn.execute("INSERT INTO gnclock (Hostname, PID) VALUES ('here', 1)")
+        conn.commit()
+        conn.close()
+        self.assertFalse(saved_by_replacing(self.book))
+
+        dest, method = backup_book(self.book)
+        self.assertNotEqual(method, HARDLINK)
+        self.assertNotEqual(os.stat(dest).st_ino, os.stat(self.book).st_ino)
+        self.assertEqual(lock_rows(self.book), 1)
+        self.assertEqual(lock_rows(dest), 0)
+
+"""
+A backup of a SQLite book taken while a session has it open can be restored and opened again
+"""
+class TestSqliteBackupOpens(BackupTest):
+    def runTest(self):
+        from accregex.Backup import backup_book
+        from accregex.SqliteBackend import SqliteSession, SqliteBookLockedException
+        from bench_accregex.SyntheticBook import write_sqlite_book
+        os.remove(self.book)
+        write_sqlite_book(AccregexTest.synthetic_session(splits=20, source_accounts=1)[1], self.book)
+
+        session = SqliteSession(self.book)
+        try:
+            self.assertRaises(SqliteBookLockedException, SqliteSession, self.book)
+            dest, _ = backup_book(self.book)
+        finally:
+            session.end()
+
+        shutil.move(dest, self.book)
+        SqliteSession(self.book).end()
+
+class TestRotateBackups(BackupTest):
+    def runTest(self):
+        from accregex.Backup import backup_book, numbered_backup
+        for i in range(4):
+            replace_file(self.book, "version {}".format(i).encode("ascii"))
+            dest, _ = backup_book(self.book, keep=3)
+            self.assertEqual(dest, numbered_backup(self.book, 1))
+
+        self.assertEqual(read_file(numbered_backup(self.book, 1)), b"version 3")
+        self.assertEqual(read_file(numbered_backup(self.book, 2)), b"version 2")
+        self.assertEqual(read_file(numbered_backup(self.book, 3)), b"version 1")
+        self.assertFalse(os.path.exists(numbered_backup(self.book, 4)))
+        self.assertRaises(ValueError, backup_book, self.book, 0)
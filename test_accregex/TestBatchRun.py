@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from AccregexTest import AccregexTest
+
+"""
+A batch runs the same rules over every book it finds
+and a book it can't open doesn't stop the others
+"""
+class TestBatchRun(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.books = []
+        for name in ["a.gnucash", "b.gnucash", "locked.gnucash"]:
+            book = os.path.join(self.tmp_dir, name)
+            shutil.copy(AccregexTest.reg_doc_example, book)
+            self.books.append(book)
+        #held by another program
+        open(self.books[2] + ".LCK", "w").close()
+        #not a book, so a directory shouldn't pick it up
+        open(os.path.join(self.tmp_dir, "notes.txt"), "w").close()
+
+    def tearDown(self):
+        AccregexTest.tearDown(self)
+        shutil.rmtree(self.tmp_dir)
+
+    def options(self, **kwargs):
+        from accregex.BatchRun import BatchOptions
+        from accregex.RuleSet import read_rule_plan
+        defaults = dict(rule_plan=read_rule_plan(AccregexTest.parking_fee_rule_json),
+                rule_hash=None, start_date=date(2000, 5, 1), end_date=None, backend="xml", scan="source",
+                dry_run=False, backups=1, backup_if_changed=False, incremental=False, jobs=1)
+        defaults.update(kwargs)
+        return BatchOptions(**defaults)
+
+    def runTest(self):
+        from accregex.BatchRun import find_books, run_batch, summary, OK, LOCKED, FAILED
+        self.assertEqual(find_books([self.tmp_dir]), sorted(self.books))
+        self.assertEqual(find_books([os.path.join(self.tmp_dir, "*.gnucash"), self.books[0]]), sorted(self.books))
+
+        missing = os.path.join(self.tmp_dir, "missing.gnucash")
+        books = self.books + [missing]
+        results = run_batch(books, self.options(), jobs=2)
+
+        self.assertEqual([r.book for r in results], books)
+        self.assertEqual([r.status for r in results], [OK, OK, LOCKED, FAILED])
+        self.assertEqual([r.changes for r in results], [1, 1, 0, 0])
+        self.assertEqual([r.error is None for r in results], [True, True, False, False])
+        self.assertTrue(all(r.seconds >= 0 for r in results))
+        self.assertTrue("2 changes, 2 not processed" in summary(results))
+
+        #only backed up once they're open, so the locked and missing books are left alone
+        self.assertEqual([os.path.exists(b + ".bak") for b in books], [True, True, False, False])
+        #the lock of the locked book belongs to someone else
+        self.assertTrue(os.path.exists(self.books[2] + ".LCK"))
+
+        #the changes were saved so there's nothing left to do
+        again = run_batch(self.books[:2], self.options(dry_run=True), jobs=1)
+        self.assertEqual([(r.status, r.changes) for r in again], [(OK, 0), (OK, 0)])
+
+class TestBatchMain(TestBatchRun):
+    def runTest(self):
+        from accregex.Accregex import batch_main
+        from accregex.Args import parse_cli_args
+        os.remove(self.books[2] + ".LCK")
+        args = parse_cli_args(["-q", "--no-rule-cache", "--backend", "xml", "--dry-run", "-j", "2",
+                "-b", self.tmp_dir, "-r", AccregexTest.parking_fee_rule_json, "-s", "2000-05-01",
+                "--stats-json", os.path.join(self.tmp_dir, "stats.json")])
+        self.assertEqual(batch_main(args), 0)
+
+        import json
+        with open(os.path.join(self.tmp_dir, "stats.json")) as f:
+            result = json.load(f)
+        self.assertEqual(result["changes"], 3)
+        self.assertEqual(result["failed"], 0)
+        #a dry run leaves the books alone
+        for book in self.books:
+            self.assertFalse(os.path.exists(book + ".bak"))
+
+"""
+A single book goes through the same run_book as each book of a batch
+"""
+class TestSingleBook(TestBatchRun):
+    def runTest(self):
+        from accregex.Accregex import accregex_main
+        from accregex.BatchRun import run_book
+        from accregex.XmlBackend import XmlBookLockedException
+        argv = ["--no-rule-cache", "--backend", "xml", "-r", AccregexTest.parking_fee_rule_json,
+                "-s", "2000-05-01", "-f"]
+        self.assertRaises(XmlBookLockedException, accregex_main, argv + [self.books[2]])
+        self.assertFalse(os.path.exists(self.books[2] + ".bak"))
+
+        accregex_main(argv + [self.books[0]])
+        self.assertTrue(os.path.exists(self.books[0] + ".bak"))
+        #the change was saved so there's nothing left to do
+        self.assertEqual(run_book(self.books[0], self.options(dry_run=True)), 0)
+
+"""
+The backup of a SQLite book is taken while the book is open
+but can still be restored and opened again, whichever way it's taken
+"""
+class TestSqliteBookBackup(TestBatchRun):
+    def runTest(self):
+        from accregex.BatchRun import run_book
+        from accregex.SqliteBackend import SqliteSession
+        from bench_accregex.SyntheticBook import write_sqlite_book
+        rules, session = AccregexTest.synthetic_session(splits=200, rules=20, payees=20, source_accounts=1, days=50)
+        book = os.path.join(self.tmp_dir, "book.sqlite.gnucash")
+        for backup_if_changed in [False, True]:
+            if os.path.exists(book):
+                os.remove(book)
+            write_sqlite_book(session, book)
+            changes = run_book(book, self.options(rule_plan=rules, start_date=date(2000, 1, 1), backend="sqlite",
+                    backup_if_changed=backup_if_changed))
+            self.assertTrue(changes > 0)
+            shutil.move(book + ".bak", book)
+            SqliteSession(book).end()
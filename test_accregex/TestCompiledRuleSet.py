@@ -0,0 +1,171 @@
+from AccregexTest import AccregexTest
+
+descriptions = ["Parking fee", "PARKING garage", "parking", "gas station", "Shell GAS #123",
+        "grocery store", "Coffee shop", "", "paycheck", "monthly parking"]
+
+#(name, regex, priority) tuples
+rule_specs = [("parking", "^parking.*(?i)", 1),
+        ("gas", "(?i).*gas", 2),
+        ("shell", "Shell (GAS|OIL)", 2),
+        ("grocery", "gro(c+)ery", 1),
+        ("coffee", r"(?P<what>Coffee) shop", 3),
+        ("backref", r"(p)a\1?ycheck", 1),
+        ("everything", ".*", 0),
+        ("monthly", "monthly (?:parking|rent)", 5)]
+
+class TestCompiledRuleSet(AccregexTest):
+    def mk_rules(self, specs):
+        from accregex.AccountRule import AccountRule
+        return [AccountRule(name, regex, priority, "Expenses", "Assets") for name, regex, priority in specs]
+
+    def assertSameAsPerRuleMatching(self, rules):
+        from accregex.AccountRule import get_most_urgent_priority_rule
+        from accregex.RuleSet import CompiledRuleSet
+        rule_set = CompiledRuleSet(rules)
+
+        for d in descriptions:
+            expected = [r for r in rules if r.regex.match(d) is not None]
+            self.assertEqual(rule_set.matching_rules(d), expected)
+            if expected:
+                self.assertIs(rule_set.most_urgent_rule(d), get_most_urgent_priority_rule(expected))
+            else:
+                self.assertIs(rule_set.most_urgent_rule(d), None)
+
+    def runTest(self):
+        self.assertSameAsPerRuleMatching(self.mk_rules(rule_specs))
+        self.assertSameAsPerRuleMatching(self.mk_rules(list(reversed(rule_specs))))
+        #without the catch-all some descriptions match nothing
+        self.assertSameAsPerRuleMatching(self.mk_rules([s for s in rule_specs if s[0] != "everything"]))
+
+class TestCompiledRuleSetManyRules(TestCompiledRuleSet):
+    #enough rules to need several alternations
+    def runTest(self):
+        specs = [("rule{}".format(i), "(x{})?{}".format(i, descriptions[i % len(descriptions)][:3]), i % 7) \
+                for i in range(300)]
+        self.assertSameAsPerRuleMatching(self.mk_rules(specs))
+
+class TestReadCompiledRules(AccregexTest):
+    def runTest(self):
+        from accregex.RuleSet import read_compiled_rules
+        rule_set = read_compiled_rules(AccregexTest.parking_fee_rule_json)
+        self.assertEqual(len(rule_set), 1)
+        #the rule ignores case
+        self.assertEqual(rule_set.most_urgent_rule("PARKING FEE").rule_name, "parking_rule")
+        self.assertIs(rule_set.most_urgent_rule("gas"), None)
+
+class TestParallelClassifier(TestCompiledRuleSet):
+    def runTest(self):
+        from accregex.ParallelClassifier import classify_descriptions
+        from accregex.RuleSet import CompiledRuleSet
+        rules = self.mk_rules(rule_specs)
+        rule_set = CompiledRuleSet(rules)
+        pairs = [(i, descriptions[i % len(descriptions)]) for i in range(100)]
+
+        expected = [(key, rule_set.most_urgent_rule(d).rule_name) for key, d in pairs \
+                if rule_set.most_urgent_rule(d) is not None]
+        #small chunks so the work is actually spread over the pool
+        self.assertEqual(classify_descriptions(pairs, rules, 2, chunk_size=7), expected)
+        self.assertEqual(classify_descriptions(pairs, rule_set, 1), expected)
+
+class TestRulePlan(TestCompiledRuleSet):
+    def runTest(self):
+        from accregex.AccountRule import AccountRule, get_most_urgent_priority_rule
+        from accregex.RuleSet import RulePlan
+        #the same rules split between two source accounts
+        rules = [AccountRule(name, regex, priority, "Expenses", "Assets:Checking" if i % 2 else "Assets:Savings") \
+                for i, (name, regex, priority) in enumerate(rule_specs)]
+        plan = RulePlan(rules)
+        self.assertEqual(len(plan), len(rules))
+        self.assertEqual(sorted(plan.sources()), ["Assets:Checking", "Assets:Savings"])
+
+        for src in plan.sources():
+            for d in descriptions:
+                expected = [r for r in rules if r.src == src and r.regex.match(d) is not None]
+                if expected:
+                    self.assertIs(plan.most_urgent_rule(src, d), get_most_urgent_priority_rule(expected))
+                else:
+                    self.assertIs(plan.most_urgent_rule(src, d), None)
+        self.assertIs(plan.most_urgent_rule("Assets:Cash", "parking"), None)
+
+class TestShadowedRules(TestCompiledRuleSet):
+    def runTest(self):
+        from accregex.RuleSet import RulePlan, is_catch_all, CATCH_ALL, DUPLICATE
+        import re
+        for pattern in [".*", "^", "(?i).*", "x*", "(?s).*"]:
+            self.assertTrue(is_catch_all(re.compile(pattern)), pattern)
+        for pattern in ["$", ".*$", "(?=x)", r"\b", "x", ".+"]:
+            self.assertFalse(is_catch_all(re.compile(pattern)), pattern)
+
+        #on a tie the later rule wins, so gas_again is checked before everything
+        rules = self.mk_rules([("gas", "(?i)gas", 2),
+                ("everything", ".*", 1),
+                ("gas_again", "gas(?i)", 1),
+                ("parking", "parking", 0),
+                ("urgent", "urgent", 3)])
+        plan = RulePlan(rules)
+        shadowed = dict((s.rule.rule_name, (s.by.rule_name, s.reason)) for s in plan.shadowed)
+        self.assertEqual(shadowed, {"gas_again": ("gas", DUPLICATE), "parking": ("everything", CATCH_ALL)})
+        self.assertEqual(sorted(r.rule_name for r in plan.unreachable_rules()), ["gas_again", "parking"])
+        self.assertEqual([r.rule_name for r in plan.for_source("Assets")], ["gas", "everything", "urgent"])
+        #the catch-all still wins when nothing more urgent matches
+        self.assertEqual(plan.most_urgent_rule("Assets", "parking").rule_name, "everything")
+
+        #rules for different source accounts never shadow each other
+        from accregex.AccountRule import AccountRule
+        self.assertEqual(RulePlan([AccountRule("a", ".*", 1, "Expenses", "Assets:Checking"),
+                AccountRule("b", "x", 0, "Expenses", "Assets:Savings")]).shadowed, [])
+
+class TestParallelClassifierBySource(TestCompiledRuleSet):
+    def runTest(self):
+        from accregex.AccountRule import AccountRule
+        from accregex.ParallelClassifier import classify_descriptions
+        from accregex.RuleSet import RulePlan
+        rules = [AccountRule(name, regex, priority, "Expenses", "Assets:Checking" if i % 2 else "Assets:Savings") \
+                for i, (name, regex, priority) in enumerate(rule_specs)]
+        plan = RulePlan(rules)
+        triples = [(i, "Assets:Checking" if i % 3 else "Assets:Savings", descriptions[i % len(descriptions)]) \
+                for i in range(100)]
+
+        expected = [(key, plan.most_urgent_rule(src, d).rule_name) for key, src, d in triples \
+                if plan.most_urgent_rule(src, d) is not None]
+        self.assertEqual(classify_descriptions(triples, plan, 2, chunk_size=7), expected)
+        self.assertEqual(classify_descriptions(triples, plan, 1), expected)
+
+class TestLruCache(AccregexTest):
+    def runTest(self):
+        from accregex.LruCache import LruCache
+        cache = LruCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        #b is now the least recently used
+        cache.put("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("b", "missing"), "missing")
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertEqual(len(cache), 2)
+        self.assertRaises(ValueError, LruCache, 0)
+
+class TestMatchCache(TestCompiledRuleSet):
+    def runTest(self):
+        from accregex.RuleSet import CompiledRuleSet
+        rules = self.mk_rules(rule_specs)
+        uncached = CompiledRuleSet(rules, 0)
+        #smaller than the number of distinct descriptions so some get evicted
+        rule_set = CompiledRuleSet(rules, 4)
+
+        repeated = descriptions * 3 + list(reversed(descriptions))
+        for d in repeated:
+            self.assertIs(rule_set.most_urgent_rule(d), uncached.most_urgent_rule(d))
+        self.assertEqual(rule_set.match_cache_hits + rule_set.match_cache_misses, len(repeated))
+        self.assertTrue(rule_set.regex_evaluations < uncached.regex_evaluations)
+        self.assertEqual(uncached.match_cache_hits, 0)
+
+        #descriptions no rule matches are cached too
+        rule_set = CompiledRuleSet(self.mk_rules([("gas", "gas", 1)]))
+        self.assertIs(rule_set.most_urgent_rule("parking"), None)
+        evaluations = rule_set.regex_evaluations
+        self.assertIs(rule_set.most_urgent_rule("parking"), None)
+        self.assertEqual(rule_set.regex_evaluations, evaluations)
+        self.assertEqual(rule_set.match_cache_hits, 1)
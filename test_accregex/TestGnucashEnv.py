@@ -0,0 +1,97 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from AccregexTest import AccregexTest
+
+#sets a couple of variables like the real gnucash-env does, counting how many times it's run
+fake_gnucash_env = """#!/bin/sh
+echo run >> "{runs}"
+export ACCREGEX_TEST_GNC_VAR=set-by-gnucash-env
+export PYTHONPATH="{python_path}"
+export ACCREGEX_TEST_GNC_PATH="/opt/gnucash/lib:$ACCREGEX_TEST_GNC_PATH"
+exec "$@"
+"""
+
+#ignores its arguments and fails
+failing_gnucash_env = """#!/bin/sh
+exit 3
+"""
+
+class TestGnucashEnv(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.runs = os.path.join(self.tmp_dir, "runs")
+        self.python_path = os.path.join(self.tmp_dir, "bindings")
+        self.cache_file = os.path.join(self.tmp_dir, "cache", "gnucash-env.json")
+        self.saved_environ = dict(os.environ)
+        self.saved_path = list(sys.path)
+
+    def tearDown(self):
+        AccregexTest.tearDown(self)
+        os.environ.clear()
+        os.environ.update(self.saved_environ)
+        sys.path[:] = self.saved_path
+        shutil.rmtree(self.tmp_dir)
+
+    def mk_script(self, contents):
+        path = os.path.join(self.tmp_dir, "gnucash-env")
+        with open(path, "w") as f:
+            f.write(contents)
+        os.chmod(path, stat.S_IRWXU)
+        return path
+
+    def run_count(self):
+        if not os.path.exists(self.runs):
+            return 0
+        with open(self.runs, "r") as f:
+            return len(f.readlines())
+
+    def runTest(self):
+        from accregex.GnucashEnv import gnucash_environment, apply_environment
+        gnucash_env = self.mk_script(fake_gnucash_env.format(runs=self.runs, python_path=self.python_path))
+
+        environment = gnucash_environment(gnucash_env, self.cache_file)
+        self.assertEqual(environment["ACCREGEX_TEST_GNC_VAR"], "set-by-gnucash-env")
+        self.assertEqual(environment["PYTHONPATH"], self.python_path)
+        self.assertFalse("PWD" in environment)
+        self.assertEqual(self.run_count(), 1)
+
+        #the second time comes from the cache
+        self.assertEqual(gnucash_environment(gnucash_env, self.cache_file), environment)
+        self.assertEqual(self.run_count(), 1)
+
+        apply_environment(environment)
+        self.assertEqual(os.environ["ACCREGEX_TEST_GNC_VAR"], "set-by-gnucash-env")
+        self.assertEqual(sys.path[0], self.python_path)
+
+"""
+Only what gnucash-env adds to a path list is cached
+so a later run from another environment keeps the rest of its own value
+"""
+class TestGnucashEnvRelative(TestGnucashEnv):
+    def runTest(self):
+        from accregex.GnucashEnv import gnucash_environment
+        gnucash_env = self.mk_script(fake_gnucash_env.format(runs=self.runs, python_path=self.python_path))
+
+        os.environ["ACCREGEX_TEST_GNC_PATH"] = "/first/lib"
+        environment = gnucash_environment(gnucash_env, self.cache_file)
+        self.assertEqual(environment["ACCREGEX_TEST_GNC_PATH"], "/opt/gnucash/lib:/first/lib")
+
+        os.environ["ACCREGEX_TEST_GNC_PATH"] = "/second/lib"
+        environment = gnucash_environment(gnucash_env, self.cache_file)
+        self.assertEqual(self.run_count(), 1)
+        self.assertEqual(environment["ACCREGEX_TEST_GNC_PATH"], "/opt/gnucash/lib:/second/lib")
+        self.assertEqual(environment["ACCREGEX_TEST_GNC_VAR"], "set-by-gnucash-env")
+
+        del os.environ["ACCREGEX_TEST_GNC_PATH"]
+        environment = gnucash_environment(gnucash_env, self.cache_file)
+        self.assertEqual(environment["ACCREGEX_TEST_GNC_PATH"], "/opt/gnucash/lib")
+
+class TestRelaunchExitStatus(TestGnucashEnv):
+    def runTest(self):
+        from accregex.Env import relauncher_main
+        gnucash_env = self.mk_script(failing_gnucash_env)
+        self.assertEqual(relauncher_main(["-f", "book.gnucash"], gnucash_env), 3)
@@ -0,0 +1,9 @@
+from AccregexTest import AccregexTest
+
+class TestImportTime(AccregexTest):
+    #only checks what gets loaded--timings are too noisy to test here
+    #(see python -m bench_accregex.ImportTime)
+    def runTest(self):
+        from bench_accregex.ImportTime import measure_import
+        for module in ("accregex.Env", "accregex.Args"):
+            self.assertEqual(measure_import(module, repeat=1)["heavy_modules"], [])
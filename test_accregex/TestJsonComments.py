@@ -0,0 +1,48 @@
+import io
+import mmap
+import random
+from AccregexTest import AccregexTest
+
+class TestJsonComments(AccregexTest):
+    def assertSameAsMinify(self, text):
+        from accregex.json_minify import json_minify
+        from accregex.JsonComments import strip_json_comments
+        self.assertEqual(strip_json_comments(text).text, json_minify(text, False), repr(text))
+
+    def runTest(self):
+        for rule_file in (AccregexTest.match_all_unspecified_json, AccregexTest.parking_fee_rule_json):
+            with io.open(rule_file, "r", encoding="utf-8") as f:
+                self.assertSameAsMinify(f.read())
+
+        #json_minify's quirks around tokens that share characters, escapes and unterminated comments
+        for text in [u'/*/ x */a', u'*//b\nc', u'///*/\nd', u'"\\\\"//e\nf', u'"\\"//"g',
+                u'"a\\\n"/*h*/', u'a//b\r\nc', u'a/*b', u'a//b*/c', u'"a\nb"\nc', u'a*/b']:
+            self.assertSameAsMinify(text)
+
+        rng = random.Random(0)
+        for _ in range(2000):
+            self.assertSameAsMinify(u"".join(rng.choice(u'"\\/*\n\r ab') for _ in range(rng.randrange(24))))
+
+class TestJsonCommentsMapped(AccregexTest):
+    def runTest(self):
+        from accregex.json_minify import json_minify
+        from accregex.JsonComments import strip_json_comments
+        with open(AccregexTest.parking_fee_rule_json, "rb") as f:
+            expected = json_minify(f.read().decode("utf-8"), False).encode("utf-8")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(strip_json_comments(mapped).text, expected)
+            finally:
+                mapped.close()
+
+class TestJsonCommentsErrorPosition(AccregexTest):
+    def runTest(self):
+        from accregex.JsonComments import loads_with_comments, RuleFileSyntaxError
+        text = u'//a comment\n{\n    /* another\n       one */ "a": 1,\n    "b" 2\n}\n'
+        try:
+            loads_with_comments(text)
+            self.fail("expected a syntax error")
+        except RuleFileSyntaxError as e:
+            self.assertEqual((e.line, e.column), (5, 9))
+
+        self.assertEqual(loads_with_comments(u'{"a": /* one */ 1} // done\n'), {u"a": 1})
@@ -68,3 +68,16 @@ class TestFindNonexistantRandomHierarchicalAccount(TestReadAccountData):
             return ret_str
 
         self.assertAccountDoesntExist(rand_hierarchical_string)
+
+class TestAccountIndex(TestReadAccountData):
+    #the index should agree with the recursive lookups
+    def runTest(self):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        index = AccountIndex(self.root)
+        for a in self.asset_accounts + self.expense_accounts:
+            this_account = index.lookup(a)
+            self.assertIsNotNone(this_account)
+            self.assertEqual(index.fully_qualified_name(this_account), a)
+            self.assertEqual(Account.get_account_fully_qualified_name(this_account), a)
+        self.assertIs(index.lookup(rand_string()), None)
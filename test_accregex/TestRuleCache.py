@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+from AccregexTest import AccregexTest
+
+class TestRuleCache(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        AccregexTest.tearDown(self)
+        shutil.rmtree(self.cache_dir)
+
+    def assertSameRules(self, a, b):
+        from accregex.AccountRule import _account_rule_to_tuple
+        self.assertEqual([_account_rule_to_tuple(r) for r in a], [_account_rule_to_tuple(r) for r in b])
+
+    def cache_files(self):
+        return [f for f in os.listdir(self.cache_dir) if f.endswith(".rules")]
+
+    def runTest(self):
+        from accregex.AccountRule import read_account_rules
+        from accregex.RuleCache import RuleCache
+        cache = RuleCache(self.cache_dir)
+        uncached = read_account_rules(AccregexTest.parking_fee_rule_json)
+
+        cold = read_account_rules(AccregexTest.parking_fee_rule_json, cache)
+        self.assertEqual(len(self.cache_files()), 1)
+        warm = read_account_rules(AccregexTest.parking_fee_rule_json, cache)
+        self.assertSameRules(uncached, cold)
+        self.assertSameRules(uncached, warm)
+        #the inline flag survives the round trip
+        self.assertTrue(warm[0].regex.match("PARKING") is not None)
+
+class TestCorruptRuleCache(TestRuleCache):
+    def runTest(self):
+        from accregex.AccountRule import read_account_rules
+        from accregex.RuleCache import RuleCache
+        cache = RuleCache(self.cache_dir)
+        expected = read_account_rules(AccregexTest.parking_fee_rule_json, cache)
+
+        entry = os.path.join(self.cache_dir, self.cache_files()[0])
+        for garbage in [b"", b"not marshal data", b"\x00" * 64]:
+            with open(entry, "wb") as f:
+                f.write(garbage)
+            #rebuilt from the rule file and written back
+            self.assertSameRules(read_account_rules(AccregexTest.parking_fee_rule_json, cache), expected)
+            self.assertTrue(cache.load(self.cache_files()[0][:-len(".rules")]) is not None)
+
+class TestRuleCacheKey(TestRuleCache):
+    def runTest(self):
+        from accregex.RuleCache import RuleCache
+        cache = RuleCache(self.cache_dir)
+        self.assertEqual(cache.key(b"{}"), cache.key(b"{}"))
+        self.assertNotEqual(cache.key(b"{}"), cache.key(b"{ }"))
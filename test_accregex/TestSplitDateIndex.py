@@ -0,0 +1,49 @@
+from datetime import date, datetime
+from AccregexTest import AccregexTest
+
+class TestSplitDateIndex(AccregexTest):
+    def setUp(self):
+        from bench_accregex.StandIn import Account
+        AccregexTest.setUp(self)
+        root = Account("Root Account")
+        self.checking = Account("Checking", root)
+        undefined = Account("Undefined", root)
+        #deliberately out of order, with two splits on the same day
+        self.splits = [AccregexTest.standin_transaction(name, posted, self.checking, undefined)
+                for name, posted in [("c", date(2016, 3, 1)),
+                    ("a", date(2016, 1, 1)),
+                    ("b1", date(2016, 2, 1)),
+                    ("d", date(2016, 4, 1)),
+                    ("b2", date(2016, 2, 1))]]
+
+    def names(self, splits):
+        return [s.GetParent().GetDescription() for s in splits]
+
+    def runTest(self):
+        from accregex.SplitDateIndex import SplitDateIndex
+        index = SplitDateIndex(self.splits)
+        self.assertEqual(self.names(index), ["a", "b1", "b2", "c", "d"])
+        #both ends are inclusive
+        self.assertEqual(self.names(index.between(date(2016, 2, 1), date(2016, 3, 1))), ["b1", "b2", "c"])
+        self.assertEqual(self.names(index.after(date(2016, 3, 1))), ["c", "d"])
+        self.assertEqual(self.names(index.before(date(2015, 12, 31))), [])
+        self.assertEqual(self.names(index.between()), ["a", "b1", "b2", "c", "d"])
+        #datetimes from the command line work too
+        self.assertEqual(self.names(index.after(datetime(2016, 3, 15))), ["d"])
+
+class TestSplitDateIndexCache(TestSplitDateIndex):
+    def runTest(self):
+        from accregex.SplitDateIndex import SplitDateIndexCache
+        checking = self.checking
+        list_calls = []
+        get_split_list = checking.GetSplitList
+        def counting_get_split_list():
+            list_calls.append(1)
+            return get_split_list()
+        checking.GetSplitList = counting_get_split_list
+
+        cache = SplitDateIndexCache()
+        first = cache.for_account(checking)
+        self.assertIs(cache.for_account(checking), first)
+        self.assertEqual(len(list_calls), 1)
+        self.assertEqual(len(first), len(self.splits))
@@ -0,0 +1,141 @@
+import pickle
+import unittest
+from datetime import date, timedelta
+from AccregexTest import AccregexTest
+
+#optional, only needed for TestSplitSnapshotNumpyFilter
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+A SplitSnapshot has to find and classify exactly the splits that filtering the live splits
+one step at a time and CompiledRuleSet.most_urgent_rule do
+"""
+class TestSplitSnapshot(AccregexTest):
+    def runTest(self):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        from accregex.RuleSet import CompiledRuleSet
+        from accregex.SplitDateIndex import SplitDateIndexCache
+        from accregex.SplitSnapshot import SplitSnapshot
+        from accregex.Stats import Stats
+
+        rules, root = AccregexTest.synthetic_book(splits=2000, rules=40, source_accounts=2, days=400, recurring_fraction=0.5)
+        index = AccountIndex(root)
+        rule_set = CompiledRuleSet(rules)
+        date_indexes = SplitDateIndexCache()
+
+        start_date = date.today() - timedelta(days=300)
+        end_date = date.today() - timedelta(days=100)
+        for src in Account.get_source_account_set(root, rules, index):
+            splits = list(src.GetSplitList())
+            dated = Account.splits_before_date(Account.splits_after_date(splits, start_date), end_date)
+            live = Account.get_undefined_splits(Account.splits_filter_debits(dated))
+            expected = [Account.guid_str(s) for s in live]
+            expected_rules = [rule_set.most_urgent_rule(s.GetParent().GetDescription()) for s in live]
+            not_debits = len(splits) - len(Account.splits_filter_debits(splits))
+
+            #with and without the posted dates known up front
+            for snapshot in [SplitSnapshot(splits),
+                    Account.get_split_snapshot(src, None, None, date_indexes)]:
+                snapshot_stats = Stats()
+                positions = snapshot.candidates(start_date, end_date, snapshot_stats)
+                self.assertEqual(expected,
+                        [Account.guid_str(s) for i in positions for s in snapshot.live_undefined_splits(i)])
+                self.assertEqual(expected_rules, snapshot.classify(positions, rule_set))
+                self.assertEqual(len(snapshot), len(splits))
+                self.assertEqual(snapshot_stats.counters["splits_scanned"], len(splits))
+                self.assertEqual(snapshot_stats.counters["splits_filtered_not_debit"], not_debits)
+
+"""
+Every filter engine that's installed finds the same candidates and counts the same splits
+(see TestSplitSnapshotNumpyFilter for the one that needs numpy)
+"""
+class TestSplitSnapshotFilterEngines(AccregexTest):
+    #every engine gives the same positions and counters as the first one for a few date ranges
+    def assertSameResults(self, engines):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        from accregex.SplitSnapshot import SplitSnapshot
+        from accregex.Stats import Stats
+
+        rules, root = AccregexTest.synthetic_book(splits=2000, rules=20, source_accounts=2, days=400)
+        today = date.today()
+        ranges = [(None, None), (today - timedelta(days=200), None), (None, today - timedelta(days=200)),
+                (today - timedelta(days=300), today - timedelta(days=100)), (today, today - timedelta(days=1))]
+        for src in Account.get_source_account_set(root, rules, AccountIndex(root)):
+            snapshot = SplitSnapshot(list(src.GetSplitList()))
+            for start_date, end_date in ranges:
+                results = []
+                for engine in engines:
+                    stats = Stats()
+                    results.append((snapshot.candidates(start_date, end_date, stats, engine),
+                            dict(stats.counters)))
+                for r in results[1:]:
+                    self.assertEqual(results[0], r)
+        for engine in engines:
+            self.assertEqual(SplitSnapshot([]).candidates(engine=engine), [])
+
+    def runTest(self):
+        from accregex.SplitSnapshot import SplitSnapshot, FILTER_ENGINES, PYTHON, available_filter_engines
+        engines = available_filter_engines()
+        self.assertTrue(PYTHON in engines)
+        for engine in FILTER_ENGINES:
+            if engine not in engines:
+                with self.assertRaises(ValueError):
+                    SplitSnapshot([]).candidates(engine=engine)
+        self.assertSameResults(engines)
+
+"""
+The numpy engine gives exactly what the plain python one does
+numpy is an optional dependency, so this only runs where it's installed
+"""
+@unittest.skipIf(numpy is None, "numpy isn't installed")
+class TestSplitSnapshotNumpyFilter(TestSplitSnapshotFilterEngines):
+    def runTest(self):
+        from accregex.SplitSnapshot import NUMPY, PYTHON
+        self.assertSameResults([PYTHON, NUMPY])
+
+"""
+Each distinct description is only matched once
+"""
+class TestSplitSnapshotClassifiesDescriptionsOnce(AccregexTest):
+    def runTest(self):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        from accregex.SplitSnapshot import SplitSnapshot
+
+        rules, root = AccregexTest.synthetic_book(splits=1000, rules=20, source_accounts=1, recurring_fraction=0.9)
+        src = list(Account.get_source_account_set(root, rules, AccountIndex(root)))[0]
+
+        class CountingRuleSet(object):
+            def __init__(self):
+                self.calls = []
+            def most_urgent_rule(self, description):
+                self.calls.append(description)
+                return None
+
+        snapshot = SplitSnapshot(list(src.GetSplitList()))
+        positions = snapshot.candidates()
+        counting = CountingRuleSet()
+        self.assertEqual(snapshot.classify(positions, counting), [None] * len(positions))
+        self.assertEqual(sorted(counting.calls), sorted(set(counting.calls)))
+        self.assertTrue(len(counting.calls) < len(positions))
+
+"""
+AccountRule keeps its fields in __slots__ and still pickles (ParallelClassifier sends rules to workers)
+"""
+class TestAccountRuleSlots(AccregexTest):
+    def runTest(self):
+        from accregex.AccountRule import AccountRule
+        rule = AccountRule("Parking", "(?i)parking", 2, "Expenses:Auto:Parking", "Assets:Checking")
+        self.assertFalse(hasattr(rule, "__dict__"))
+        with self.assertRaises(AttributeError):
+            rule.unknown = 1
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(rule, protocol))
+            self.assertEqual((copy.rule_name, copy.regex, copy.priority, copy.dest, copy.src),
+                    (rule.rule_name, rule.regex, rule.priority, rule.dest, rule.src))
@@ -0,0 +1,104 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+from AccregexTest import AccregexTest
+
+"""
+Runs accregex on a generated SQLite book and checks that the rows it changes
+are exactly the ones a run on the same book in memory changes
+"""
+class TestSqliteBackend(AccregexTest):
+    def setUp(self):
+        from bench_accregex.SyntheticBook import write_sqlite_book
+        AccregexTest.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.book_file = os.path.join(self.tmp_dir, "book.gnucash")
+        self.rules, self.session = AccregexTest.synthetic_session(splits=500, rules=30, payees=30,
+                source_accounts=2, days=100)
+        write_sqlite_book(self.session, self.book_file)
+
+    def tearDown(self):
+        AccregexTest.tearDown(self)
+        shutil.rmtree(self.tmp_dir)
+
+    def query(self, sql, params=()):
+        conn = sqlite3.connect(self.book_file)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def split_accounts(self):
+        return dict(self.query("SELECT guid, account_guid FROM splits"))
+
+    def runTest(self):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        from accregex.RuleSet import RulePlan
+        before = self.split_accounts()
+        start_date = date.today() - timedelta(days=50)
+        Account.run(self.book_file, self.rules, start_date, backend="sqlite")
+        after = self.split_accounts()
+        self.assertEqual(self.query("SELECT COUNT(*) FROM gnclock"), [(0,)])
+
+        #the same run on the book in memory
+        root = self.session.book.get_root_account()
+        index = AccountIndex(root)
+        plan = RulePlan(self.rules)
+        for src in Account.get_source_account_set(root, self.rules, index):
+            Account.process_source_account(src, plan, start_date, None, index)
+        in_memory = {}
+        for name in index.names():
+            account = index.lookup(name)
+            for split_guid in account._splits:
+                in_memory[split_guid] = account.GetGUID().to_string()
+
+        changed = dict((k, v) for k, v in after.items() if before[k] != v)
+        self.assertTrue(len(changed) > 0)
+        self.assertEqual(changed, dict((k, v) for k, v in in_memory.items() if before[k] != v))
+        #every change moved a split out of Undefined
+        undefined = self.query("SELECT guid FROM accounts WHERE name = 'Undefined'")[0][0]
+        self.assertEqual(set(before[k] for k in changed), set([undefined]))
+
+class TestSqliteLock(TestSqliteBackend):
+    def runTest(self):
+        from accregex.SqliteBackend import SqliteSession, SqliteBookLockedException
+        session = SqliteSession(self.book_file)
+        try:
+            self.assertRaises(SqliteBookLockedException, SqliteSession, self.book_file)
+            #read only sessions don't care about the lock
+            SqliteSession(self.book_file, read_only=True).end()
+        finally:
+            session.end()
+        SqliteSession(self.book_file).end()
+        self.assertEqual(self.query("SELECT COUNT(*) FROM gnclock"), [(0,)])
+
+class TestSqliteSaveIsAtomic(TestSqliteBackend):
+    def runTest(self):
+        from accregex import Account
+        from accregex.SqliteBackend import SqliteSession, SqliteBackendException
+        before = self.split_accounts()
+        session = SqliteSession(self.book_file)
+        try:
+            root = session.book.get_root_account()
+            dest = Account.get_account(root, "Undefined")
+            moved = [s for s in Account.get_account(root, "Expenses:Group 0:Category 0").GetSplitList()][:2]
+            self.assertEqual(len(moved), 2)
+            for this_split in moved:
+                this_split.SetAccount(dest)
+
+            #someone else moves one of the splits while the book is open
+            conn = sqlite3.connect(self.book_file)
+            conn.execute("UPDATE splits SET account_guid = ? WHERE guid = ?",
+                    (root.GetGUID().to_string(), moved[1].GetGUID().to_string()))
+            conn.commit()
+            conn.close()
+            self.assertRaises(SqliteBackendException, session.save)
+        finally:
+            session.end()
+
+        #the other change was rolled back
+        after = self.split_accounts()
+        self.assertEqual(after[moved[0].GetGUID().to_string()], before[moved[0].GetGUID().to_string()])
@@ -0,0 +1,41 @@
+import json
+from AccregexTest import AccregexTest
+
+class TestStats(AccregexTest):
+    def runTest(self):
+        from accregex.Stats import Stats
+        stats = Stats()
+        with stats.timer("stage"):
+            stats.count("splits_scanned", 10)
+            stats.count("splits_scanned", 5)
+            stats.count_rule("parking_rule")
+        with stats.timer("stage"):
+            pass
+
+        self.assertEqual(stats.counters["splits_scanned"], 15)
+        self.assertEqual(stats.rule_matches["parking_rule"], 1)
+        self.assertEqual(list(stats.timers.keys()), ["stage"])
+        self.assertTrue(stats.timers["stage"] >= 0)
+
+        parsed = json.loads(stats.to_json())
+        self.assertEqual(parsed["counters"]["splits_scanned"], 15)
+        self.assertTrue("splits_scanned" in stats.summary())
+
+class TestNoStats(AccregexTest):
+    def runTest(self):
+        from accregex.Stats import NO_STATS
+        with NO_STATS.timer("stage"):
+            NO_STATS.count("splits_scanned", 10)
+            NO_STATS.count_rule("parking_rule")
+        self.assertFalse(NO_STATS.enabled)
+        self.assertEqual(len(NO_STATS.timers), 0)
+        self.assertEqual(len(NO_STATS.counters), 0)
+        self.assertEqual(len(NO_STATS.rule_matches), 0)
+
+class TestLogger(AccregexTest):
+    def runTest(self):
+        from accregex.Logger import Logger
+        logger = Logger()
+        logger.write("first")
+        logger.write(2)
+        self.assertEqual(logger.get_log(), "first\n2\n")
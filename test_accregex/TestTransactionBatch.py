@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+from datetime import date
+from AccregexTest import AccregexTest
+
+#bench_accregex.StandIn objects that also record their edits and can be made to fail
+#built once the tests run since AccregexTest.setUpClass is what puts bench_accregex on the path
+def _recording_standins():
+    from bench_accregex import StandIn
+
+    class Account(StandIn.Account):
+        def __init__(self, name, parent=None):
+            StandIn.Account.__init__(self, name, parent)
+            self.edits = []
+
+        def BeginEdit(self):
+            StandIn.Account.BeginEdit(self)
+            self.edits.append("begin")
+
+        def CommitEdit(self):
+            StandIn.Account.CommitEdit(self)
+            self.edits.append("commit")
+
+    class Transaction(StandIn.Transaction):
+        def __init__(self, *args):
+            StandIn.Transaction.__init__(self, *args)
+            self.edits = []
+            self.fail_on_set = False
+            self.fail_on_commit = False
+
+        def BeginEdit(self):
+            StandIn.Transaction.BeginEdit(self)
+            self.edits.append("begin")
+
+        def CommitEdit(self):
+            if self.fail_on_commit:
+                raise ValueError("could not commit")
+            StandIn.Transaction.CommitEdit(self)
+            self.edits.append("commit")
+
+        def RollbackEdit(self):
+            StandIn.Transaction.RollbackEdit(self)
+            self.edits.append("rollback")
+
+    class Split(StandIn.Split):
+        def SetAccount(self, account):
+            #only the first time so rolling back can put the split back
+            if self.parent.fail_on_set:
+                self.parent.fail_on_set = False
+                raise ValueError("could not set account")
+            StandIn.Split.SetAccount(self, account)
+
+    return (Account, Transaction, Split)
+
+class TestTransactionBatch(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        Account, self.transaction_class, self.split_class = _recording_standins()
+        root = Account("Root Account")
+        self.checking = Account("Checking", root)
+        self.undefined = Account("Undefined", root)
+        self.parking = Account("Parking", root)
+        self.gas = Account("Gas", root)
+
+    #returns the checking side of a new 2-split transaction with the other side in Undefined
+    def mk_transaction(self, fail_on_set=False, fail_on_commit=False):
+        checking_split = AccregexTest.standin_transaction("PARKING GARAGE", date(2016, 5, 4),
+                self.checking, self.undefined, transaction_class=self.transaction_class,
+                split_class=self.split_class)
+        trans = checking_split.GetParent()
+        trans.fail_on_set = fail_on_set
+        trans.fail_on_commit = fail_on_commit
+        return checking_split
+
+    def other_side(self, split):
+        return [x for x in split.GetParent().GetSplitList() if x is not split][0]
+
+    def runTest(self):
+        from accregex.TransactionBatch import TransactionBatch
+        batch = TransactionBatch()
+        splits = [self.mk_transaction() for i in range(5)]
+        for i, s in enumerate(splits):
+            self.assertTrue(batch.add(s, self.parking if i % 2 == 0 else self.gas))
+        #queuing the same transaction again does nothing
+        self.assertFalse(batch.add(splits[0], self.gas))
+        self.assertEqual(len(batch), 5)
+
+        self.assertEqual(batch.apply(), 5)
+        #each account is opened once no matter how many splits move into it
+        self.assertEqual(self.parking.edits, ["begin", "commit"])
+        self.assertEqual(self.gas.edits, ["begin", "commit"])
+        for i, s in enumerate(splits):
+            self.assertIs(self.other_side(s).GetAccount(), self.parking if i % 2 == 0 else self.gas)
+            self.assertEqual(s.GetParent().edits, ["begin", "commit"])
+
+class TestTransactionBatchRollback(TestTransactionBatch):
+    def runTest(self):
+        from accregex.TransactionBatch import TransactionBatch
+        batch = TransactionBatch()
+        good = self.mk_transaction()
+        bad = self.mk_transaction(fail_on_set=True)
+        batch.add(good, self.parking)
+        batch.add(bad, self.parking)
+
+        self.assertRaises(ValueError, batch.apply)
+        #nothing was committed
+        self.assertEqual(good.GetParent().edits, ["begin", "rollback"])
+        self.assertEqual(bad.GetParent().edits, ["begin", "rollback"])
+        self.assertEqual(self.parking.edits, ["begin", "commit"])
+        for s in (good, bad):
+            self.assertIs(self.other_side(s).GetAccount(), self.undefined)
+
+        #this time the first transaction is committed before the second one fails
+        batch = TransactionBatch()
+        good = self.mk_transaction()
+        bad = self.mk_transaction(fail_on_commit=True)
+        batch.add(good, self.gas)
+        batch.add(bad, self.gas)
+
+        self.assertRaises(ValueError, batch.apply)
+        #the committed transaction was moved back and committed again
+        self.assertEqual(good.GetParent().edits, ["begin", "commit", "begin", "commit"])
+        self.assertEqual(bad.GetParent().edits, ["begin", "rollback"])
+        for s in (good, bad):
+            self.assertIs(self.other_side(s).GetAccount(), self.undefined)
+        self.assertEqual(self.undefined.edits, ["begin", "commit"])
+
+class TestTransactionBatchSplitTransaction(TestTransactionBatch):
+    def runTest(self):
+        from accregex.TransactionBatch import TransactionBatch
+        from accregex.SplitTransactionsNotSupportedException import SplitTransactionsNotSupportedException
+        from bench_accregex.StandIn import GncNumeric
+        checking_split = self.mk_transaction()
+        self.split_class(checking_split.GetParent(), self.gas, GncNumeric(0, 100))
+        self.assertRaises(SplitTransactionsNotSupportedException, TransactionBatch().add, checking_split, self.parking)
+
+class Rule:
+    def __init__(self, rule_name, dest):
+        self.rule_name = rule_name
+        self.dest = dest
+
+class TestDryRunBatch(TestTransactionBatch):
+    def runTest(self):
+        from accregex.Report import DryRunBatch, CsvReport, JsonReport
+        for report_class in (CsvReport, JsonReport):
+            #the csv and json modules write str, which is bytes on python 2
+            out = io.BytesIO() if str is bytes else io.StringIO()
+            batch = DryRunBatch(report_class(out))
+            splits = [self.mk_transaction() for i in range(2)]
+            self.assertTrue(batch.add(splits[0], self.parking, Rule("parking_rule", "Expenses:Parking")))
+            self.assertTrue(batch.add(splits[1], self.gas, Rule("gas_rule", "Expenses:Gas")))
+            self.assertFalse(batch.add(splits[0], self.gas, Rule("gas_rule", "Expenses:Gas")))
+            self.assertEqual(batch.apply(), 2)
+            batch.report.close()
+
+            #nothing was touched
+            for s in splits:
+                self.assertEqual(s.GetParent().edits, [])
+                self.assertIs(self.other_side(s).GetAccount(), self.undefined)
+            self.assertEqual(self.parking.edits, [])
+
+            text = out.getvalue()
+            if report_class is CsvReport:
+                rows = list(csv.DictReader(io.StringIO(text.decode("utf-8") if isinstance(text, bytes) else text)))
+            else:
+                rows = json.loads(text)
+            self.assertEqual([r["rule"] for r in rows], ["parking_rule", "gas_rule"])
+            self.assertEqual(rows[0]["split"], self.other_side(splits[0]).GetGUID().to_string())
+            self.assertEqual(rows[0]["date"], "2016-05-04")
+            self.assertEqual(rows[0]["amount"], "12.50")
+            self.assertEqual(rows[1]["dest"], "Expenses:Gas")
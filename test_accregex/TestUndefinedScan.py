@@ -0,0 +1,101 @@
+from datetime import date, timedelta
+from AccregexTest import AccregexTest
+
+"""
+Scanning from the Undefined accounts has to find exactly the splits
+that scanning every source account does
+"""
+class TestUndefinedScan(AccregexTest):
+    def candidates(self, scan, root, rules, start_date, end_date=None):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        index = AccountIndex(root)
+        sources = Account.get_source_account_set(root, rules, index)
+        return [(index.fully_qualified_name(src), Account.guid_str(s)) for src, s in
+                Account.iter_candidates(scan, sources, index, start_date, end_date)]
+
+    def assertSameCandidates(self, root, rules, start_date, end_date=None):
+        from accregex.Account import SCAN_SOURCE, SCAN_UNDEFINED
+        from_source = self.candidates(SCAN_SOURCE, root, rules, start_date, end_date)
+        from_undefined = self.candidates(SCAN_UNDEFINED, root, rules, start_date, end_date)
+        self.assertEqual(sorted(from_source), sorted(from_undefined))
+        return from_source
+
+    def runTest(self):
+        rules, root = AccregexTest.synthetic_book(splits=2000, rules=40, source_accounts=3, days=400)
+
+        self.assertTrue(len(self.assertSameCandidates(root, rules, None)) > 0)
+        self.assertSameCandidates(root, rules, date.today() - timedelta(days=100))
+        self.assertSameCandidates(root, rules, date.today() - timedelta(days=300), date.today() - timedelta(days=200))
+        #rules for only one of the source accounts
+        self.assertSameCandidates(root, [r for r in rules if r.src == rules[0].src], None)
+
+class TestUndefinedScanRun(AccregexTest):
+    def runTest(self):
+        from accregex import Account
+        from accregex.AccountRule import read_account_rules
+        from accregex.Report import CsvReport
+        from io import BytesIO, StringIO
+
+        rules = read_account_rules(AccregexTest.parking_fee_rule_json)
+        reports = []
+        for scan in Account.SCANS:
+            out = BytesIO() if str is bytes else StringIO()
+            Account.run(AccregexTest.reg_doc_example, rules, date(2000, 5, 1), report=CsvReport(out),
+                    backend="xml", scan=scan)
+            reports.append(out.getvalue())
+        self.assertEqual(reports[0], reports[1])
+        self.assertEqual(len(reports[0].splitlines()), 2)
+
+"""
+Matching in worker processes queues the same changes as matching in this one, for either scan
+"""
+class TestParallelScan(AccregexTest):
+    def changes(self, root, rules, scan, jobs):
+        from accregex import Account
+        from accregex.AccountIndex import AccountIndex
+        from accregex.Report import DryRunBatch
+        from accregex.RuleSet import RulePlan
+        class Rows(object):
+            def __init__(self):
+                self.rows = []
+            def write(self, row):
+                self.rows.append((row["split"], row["rule"]))
+
+        index = AccountIndex(root)
+        sources = Account.get_source_account_set(root, rules, index)
+        plan = RulePlan(rules)
+        batch = DryRunBatch(Rows())
+        if jobs > 1:
+            #small enough chunks that the descriptions really are spread over the workers
+            Account.process_source_accounts_parallel(sources, plan, None, None, index, None, jobs, batch,
+                    scan=scan, chunk_size=7)
+        elif scan == Account.SCAN_UNDEFINED:
+            Account.process_undefined_accounts(sources, plan, None, None, index, batch=batch)
+        else:
+            for src in sources:
+                Account.process_source_account(src, plan, None, None, index, batch=batch)
+        return sorted(batch.report.rows)
+
+    def runTest(self):
+        from accregex.Account import SCANS
+        rules, root = AccregexTest.synthetic_book(splits=2000, rules=40, source_accounts=3, days=400, recurring_fraction=0.5)
+
+        import multiprocessing
+        expected = self.changes(root, rules, SCANS[0], 1)
+        self.assertTrue(len(expected) > 0)
+
+        #count the pools so a run that quietly stays in this process fails
+        pools = []
+        real_pool = multiprocessing.Pool
+        def counting_pool(*args, **kwargs):
+            pools.append(args)
+            return real_pool(*args, **kwargs)
+        multiprocessing.Pool = counting_pool
+        try:
+            for scan in SCANS:
+                self.assertEqual(self.changes(root, rules, scan, 1), expected)
+                self.assertEqual(self.changes(root, rules, scan, 2), expected)
+        finally:
+            multiprocessing.Pool = real_pool
+        self.assertEqual(len(pools), len(SCANS))
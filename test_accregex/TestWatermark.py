@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from AccregexTest import AccregexTest
+
+class TestWatermark(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        self.state_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.state_dir, "book.gnucash.accregex-state")
+        from bench_accregex.StandIn import Account
+        root = Account("Root Account")
+        self.checking = Account("Checking", root)
+        self.undefined = Account("Undefined", root)
+
+    def tearDown(self):
+        AccregexTest.tearDown(self)
+        shutil.rmtree(self.state_dir)
+
+    def names(self, splits):
+        return sorted(s.GetParent().GetDescription() for s in splits)
+
+    def split(self, name, posted, entered):
+        return AccregexTest.standin_transaction(name, posted, self.checking, self.undefined, entered=entered)
+
+    def scan(self, watermark, splits, start_date=None):
+        from accregex.SplitDateIndex import SplitDateIndex
+        unseen = watermark.unseen(SplitDateIndex(splits), start_date, None)
+        watermark.record(unseen)
+        return unseen
+
+    def runTest(self):
+        from accregex.Watermark import load_watermark
+        splits = [self.split("old", date(2016, 1, 1), 100),
+                self.split("last1", date(2016, 2, 1), 200),
+                self.split("last2", date(2016, 2, 1), 200)]
+
+        first = load_watermark(self.state_file, "rules", None)
+        self.assertTrue(first.is_full_scan())
+        self.assertEqual(self.names(self.scan(first, splits)), ["last1", "last2", "old"])
+        first.advanced().save(self.state_file)
+
+        second = load_watermark(self.state_file, "rules", None)
+        self.assertFalse(second.is_full_scan())
+        self.assertEqual(self.scan(second, splits), [])
+
+        #a new transaction, one on the last day scanned, and an import of an old one
+        splits += [self.split("new", date(2016, 3, 1), 300),
+                self.split("last3", date(2016, 2, 1), 300),
+                self.split("backdated", date(2015, 6, 1), 300)]
+        self.assertEqual(self.names(self.scan(second, splits)), ["backdated", "last3", "new"])
+        second.advanced().save(self.state_file)
+
+        third = load_watermark(self.state_file, "rules", None)
+        self.assertEqual(self.scan(third, splits), [])
+        self.assertEqual(third.posted, date(2016, 3, 1))
+
+        #different rules or dates start over
+        self.assertTrue(load_watermark(self.state_file, "other rules", None).is_full_scan())
+        self.assertTrue(load_watermark(self.state_file, "rules", date(2016, 1, 1)).is_full_scan())
+
+class TestCorruptWatermark(TestWatermark):
+    def runTest(self):
+        from accregex.Watermark import load_watermark
+        with open(self.state_file, "w") as f:
+            f.write("{not json")
+        self.assertTrue(load_watermark(self.state_file, "rules", None).is_full_scan())
+        with open(self.state_file, "w") as f:
+            f.write('{"format": 1}')
+        self.assertTrue(load_watermark(self.state_file, "rules", None).is_full_scan())
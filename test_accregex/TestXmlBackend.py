@@ -0,0 +1,119 @@
+import gzip
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from AccregexTest import AccregexTest
+
+parking_expense_account_full_name = "Expenses:Auto:Parking"
+checking_account_full_name = "Assets:Current Assets:Checking Account"
+repair_account_full_name = "Expenses:Auto:Repair and Maintenance"
+
+class TestXmlBackend(AccregexTest):
+    def setUp(self):
+        AccregexTest.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.book_file = os.path.join(self.tmp_dir, "reg_doc_example.gnucash")
+        shutil.copy(AccregexTest.reg_doc_example, self.book_file)
+
+    def tearDown(self):
+        AccregexTest.tearDown(self)
+        shutil.rmtree(self.tmp_dir)
+
+    def read_lines(self, file_name):
+        with gzip.open(file_name, "rb") as f:
+            return f.readlines()
+
+    def runTest(self):
+        from accregex import Account
+        from accregex.AccountRule import read_account_rules
+        from accregex.AccountUtil import gnc_numeric_to_python_Decimal
+        from accregex.XmlBackend import XmlSession
+        rules = read_account_rules(AccregexTest.parking_fee_rule_json)
+        Account.run(self.book_file, rules, date(2000, 5, 1), backend="xml")
+        self.assertFalse(os.path.exists(self.book_file + ".LCK"))
+
+        session = XmlSession(self.book_file, read_only=True)
+        try:
+            root = session.book.get_root_account()
+            parking = Account.get_account(root, parking_expense_account_full_name)
+            self.assertEqual(gnc_numeric_to_python_Decimal(parking.GetBalance()), Decimal(25))
+            self.assertEqual(Account.get_account_fully_qualified_name(parking), parking_expense_account_full_name)
+            self.assertEqual(root.get_current_depth(), 0)
+        finally:
+            session.end()
+
+        #only the account of the parking split changed
+        changed = [(a, b) for a, b in zip(self.read_lines(AccregexTest.reg_doc_example), self.read_lines(self.book_file))
+                if a != b]
+        self.assertEqual(len(changed), 1)
+        self.assertTrue(b"<split:account" in changed[0][1])
+
+class TestXmlBackendSourceAccounts(TestXmlBackend):
+    def runTest(self):
+        from accregex.XmlBackend import XmlSession
+        from accregex.AccountIndex import AccountIndex
+        session = XmlSession(self.book_file, True, [repair_account_full_name])
+        try:
+            index = AccountIndex(session.book.get_root_account())
+            #only the car repair touches the repair account so it's the only transaction loaded
+            checking = index.lookup(checking_account_full_name)
+            self.assertEqual(["Car Repair"], [s.GetParent().GetDescription() for s in checking.GetSplitList()])
+            self.assertEqual(len(index.lookup(repair_account_full_name).GetSplitList()), 1)
+            self.assertEqual(len(checking.GetSplitList()[0].GetParent().GetSplitList()), 3)
+        finally:
+            session.end()
+
+class TestXmlBackendLocked(TestXmlBackend):
+    def runTest(self):
+        from accregex.XmlBackend import XmlSession, XmlBookLockedException
+        session = XmlSession(self.book_file)
+        try:
+            self.assertTrue(os.path.exists(self.book_file + ".LCK"))
+            self.assertRaises(XmlBookLockedException, XmlSession, self.book_file)
+            #read only sessions ignore the lock
+            XmlSession(self.book_file, read_only=True).end()
+        finally:
+            session.end()
+        self.assertFalse(os.path.exists(self.book_file + ".LCK"))
+
+"""
+Saving replaces the file, which mustn't change who can read the book
+"""
+class TestXmlBackendKeepsMode(TestXmlBackend):
+    def runTest(self):
+        import stat
+        from accregex import Account
+        from accregex.AccountRule import read_account_rules
+        os.chmod(self.book_file, 0o644)
+        rules = read_account_rules(AccregexTest.parking_fee_rule_json)
+        Account.run(self.book_file, rules, date(2000, 5, 1), backend="xml")
+        #the book really was rewritten
+        self.assertNotEqual(self.read_lines(AccregexTest.reg_doc_example), self.read_lines(self.book_file))
+        self.assertEqual(stat.S_IMODE(os.stat(self.book_file).st_mode), 0o644)
+
+"""
+Text that isn't ASCII comes back as UTF-8 str like the gnucash bindings give it
+so it can be written to a CSV report
+"""
+class TestXmlBackendUnicode(TestXmlBackend):
+    def runTest(self):
+        import csv
+        from StringIO import StringIO
+        from accregex import Account
+        from accregex.AccountRule import read_account_rules
+        from accregex.Report import open_report
+        with gzip.open(AccregexTest.reg_doc_example, "rb") as f:
+            contents = f.read()
+        with gzip.open(self.book_file, "wb") as f:
+            f.write(contents.replace(b"PARKING FEE", u"PARKING FEE Caf\xe9".encode("utf-8")))
+
+        out = StringIO()
+        report = open_report(out, "csv")
+        rules = read_account_rules(AccregexTest.parking_fee_rule_json)
+        Account.run(self.book_file, rules, date(2000, 5, 1), report=report, backend="xml")
+        report.close()
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], u"PARKING FEE Caf\xe9".encode("utf-8"))